@@ -1,9 +1,46 @@
 """A set of functions to retrieve and save Beersmith data into MongoDB.
+
+The public classes are imported lazily on first attribute access, so that
+importing the package does not pull in bs4, pymongo or the aracnid packages.
 """
-from importlib.metadata import version
+from importlib import import_module
+
+# public names and the modules that define them
+_LAZY_IMPORTS = {
+    'BeersmithInterface': 'beersmith_direct.i_beersmith',
+    'LibrarySync': 'beersmith_direct.libraries',
+    'Recipes': 'beersmith_direct.recipes',
+}
+
+__all__ = ['__version__', *_LAZY_IMPORTS]
+
+
+def __getattr__(name):
+    """Imports the public names of the package on first access.
+
+    Args:
+        name: Name of the requested attribute.
+
+    Returns:
+        The requested attribute.
+    """
+    if name == '__version__':
+        from importlib.metadata import version  # pylint: disable=import-outside-toplevel
+        value = version(__package__)
+
+    elif name in _LAZY_IMPORTS:
+        value = getattr(import_module(_LAZY_IMPORTS[name]), name)
+
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    # cache the value so that __getattr__ is only called once per name
+    globals()[name] = value
 
-from beersmith_direct.i_beersmith import BeersmithInterface
-from beersmith_direct.recipes import Recipes
+    return value
 
 
-__version__ = version(__package__)
+def __dir__():
+    """Lists the module attributes, including the lazily imported names.
+    """
+    return sorted(set(globals()) | set(__all__))
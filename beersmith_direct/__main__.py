@@ -0,0 +1,7 @@
+"""Runs the command line interface with python -m beersmith_direct.
+"""
+import sys
+
+from beersmith_direct.cli import main
+
+sys.exit(main())
@@ -0,0 +1,369 @@
+"""Streaming reader of BeerXML 1.0 recipe files.
+
+BeerXML files are read with ElementTree.iterparse(): each <RECIPE> element
+is mapped to the normalized recipe shape of BeersmithInterface.read_bsmx()
+as soon as it is complete, then cleared, so the memory of a read is bounded
+by one recipe whatever the size of the file.
+
+The values are converted to the BeerSmith units of the normalized recipes:
+
+    weights      kilograms -> ounces (yeast: grams)
+    volumes      liters -> fluid ounces
+    temperatures Celsius -> Fahrenheit
+
+and the BeerXML enumerations (hop use and form, fermentable type, ...) to
+the BeerSmith codes. The text values are returned as strings, the caller
+corrects their types like the values of a .bsmx file.
+"""
+from xml.etree.ElementTree import iterparse
+
+OZ_PER_KG = 35.27396195
+FL_OZ_PER_LITER = 33.8140227
+
+# BeerSmith codes of the BeerXML enumerations, by lowercased BeerXML value
+RECIPE_TYPES = {'extract': 0, 'partial mash': 1, 'all grain': 2}
+GRAIN_TYPES = {'grain': 0, 'extract': 1, 'sugar': 2, 'adjunct': 3, 'dry extract': 4}
+HOP_USES = {'boil': 0, 'dry hop': 1, 'mash': 2, 'first wort': 3, 'aroma': 4}
+HOP_FORMS = {'pellet': 0, 'plug': 1, 'leaf': 2}
+HOP_TYPES = {'bittering': 0, 'aroma': 1, 'both': 2}
+YEAST_TYPES = {'ale': 0, 'lager': 1, 'wheat': 2, 'wine': 3, 'champagne': 4}
+YEAST_FORMS = {'liquid': 0, 'dry': 1, 'slant': 2, 'culture': 3}
+FLOCCULATIONS = {'low': 0, 'medium': 1, 'high': 2, 'very high': 3}
+MISC_TYPES = {'spice': 0, 'fining': 1, 'herb': 2, 'flavor': 3, 'other': 4, 'water agent': 5}
+MISC_USES = {'boil': 0, 'mash': 1, 'primary': 2, 'secondary': 3, 'bottling': 4}
+MASH_STEP_TYPES = {'infusion': 0, 'temperature': 1, 'decoction': 2}
+BOOLEANS = {'true': 1, 'false': 0}
+
+# text of the BeerSmith subtype codes, as in process_ingredient()
+GRAIN_SUBTYPES = ['grain', 'extract', 'sugar', 'adjunct', 'dry extract']
+HOP_FORM_TEXTS = ['pellet', 'plug', 'leaf', 'extract (CO2)', 'extract (isomerized)']
+YEAST_FORM_TEXTS = ['liquid', 'dry', 'slant', 'culture']
+MISC_SUBTYPES = ['spice', 'fining', 'herb', 'flavor', 'other', 'water-agent']
+
+
+def _text(elem, tag):
+    """Returns the stripped text of a child element, or None.
+    """
+    child = elem.find(tag)
+    if child is None or child.text is None:
+        return None
+    text = child.text.strip()
+
+    return text or None
+
+
+def _float(elem, tag):
+    """Returns the leading number of a child element, or None.
+
+    Values like '12.0 SRM' or '1.050 sg' of the display fields are read
+    as their number.
+    """
+    text = _text(elem, tag)
+    if text is None:
+        return None
+    try:
+        return float(text.split()[0])
+    except ValueError:
+        return None
+
+
+def _scaled(factor, offset=0.0):
+    """Returns a converter that scales a number.
+    """
+    def convert(value):
+        return round(value * factor + offset, 7)
+
+    return convert
+
+
+kg_to_oz = _scaled(OZ_PER_KG)
+kg_to_g = _scaled(1000.0)
+liters_to_fl_oz = _scaled(FL_OZ_PER_LITER)
+celsius_to_fahrenheit = _scaled(1.8, 32.0)
+minutes_to_days = _scaled(1 / 1440.0)
+
+# (BeerXML tag, normalized key, conversion) of each record type, where the
+# conversion is TEXT, a dictionary of codes for an enumeration, or a
+# function of the number (NUMBER keeps it)
+TEXT = None
+NUMBER = float
+
+RECIPE_FIELDS = (
+    ('NAME', 'name', TEXT), ('BREWER', 'brewer', TEXT), ('ASST_BREWER', 'asst_brewer', TEXT),
+    ('DATE', 'date', TEXT), ('TYPE', 'type', RECIPE_TYPES),
+    ('VERSION', 'version', NUMBER), ('NOTES', 'notes', TEXT),
+    ('TASTE_NOTES', 'description', TEXT), ('TASTE_RATING', 'rating', NUMBER),
+    ('EST_OG', 'desired_og', NUMBER), ('OG', 'og_measured', NUMBER),
+    ('FG', 'fg_measured', NUMBER), ('IBU', 'desired_ibu', NUMBER),
+    ('EST_COLOR', 'desired_color', NUMBER), ('CARBONATION', 'carb_vols', NUMBER),
+)
+
+EQUIPMENT_FIELDS = (
+    ('NAME', 'name', TEXT), ('BATCH_SIZE', 'batch_vol', liters_to_fl_oz),
+    ('BOIL_SIZE', 'boil_vol', liters_to_fl_oz), ('BOIL_TIME', 'boil_time', NUMBER),
+    ('TUN_VOLUME', 'mash_vol', liters_to_fl_oz), ('TUN_WEIGHT', 'tun_mass', kg_to_oz),
+    ('TUN_SPECIFIC_HEAT', 'tun_specific_heat', NUMBER),
+    ('TOP_UP_WATER', 'top_up', liters_to_fl_oz),
+    ('TRUB_CHILLER_LOSS', 'trub_loss', liters_to_fl_oz),
+    ('LAUTER_DEADSPACE', 'tun_deadspace', liters_to_fl_oz),
+    ('TOP_UP_KETTLE', 'top_up_kettle', liters_to_fl_oz),
+    ('HOP_UTILIZATION', 'hop_util', NUMBER), ('NOTES', 'notes', TEXT),
+)
+
+STYLE_FIELDS = (
+    ('NAME', 'name', TEXT), ('CATEGORY', 'category', TEXT), ('STYLE_GUIDE', 'guide', TEXT),
+    ('STYLE_LETTER', 'letter', TEXT), ('CATEGORY_NUMBER', 'number', TEXT),
+    ('OG_MIN', 'min_og', NUMBER), ('OG_MAX', 'max_og', NUMBER),
+    ('FG_MIN', 'min_fg', NUMBER), ('FG_MAX', 'max_fg', NUMBER),
+    ('IBU_MIN', 'min_ibu', NUMBER), ('IBU_MAX', 'max_ibu', NUMBER),
+    ('COLOR_MIN', 'min_color', NUMBER), ('COLOR_MAX', 'max_color', NUMBER),
+    ('CARB_MIN', 'min_carb', NUMBER), ('CARB_MAX', 'max_carb', NUMBER),
+    ('ABV_MIN', 'min_abv', NUMBER), ('ABV_MAX', 'max_abv', NUMBER),
+    ('NOTES', 'description', TEXT), ('PROFILE', 'profile', TEXT),
+    ('INGREDIENTS', 'ingredients', TEXT), ('EXAMPLES', 'examples', TEXT),
+)
+
+MASH_FIELDS = (
+    ('NAME', 'name', TEXT), ('GRAIN_TEMP', 'grain_temp', celsius_to_fahrenheit),
+    ('TUN_TEMP', 'tun_temp', celsius_to_fahrenheit),
+    ('SPARGE_TEMP', 'sparge_temp', celsius_to_fahrenheit), ('PH', 'ph', NUMBER),
+    ('TUN_WEIGHT', 'tun_mass', kg_to_oz), ('TUN_SPECIFIC_HEAT', 'tun_hc', NUMBER),
+    ('NOTES', 'notes', TEXT),
+)
+
+MASH_STEP_FIELDS = (
+    ('NAME', 'name', TEXT), ('TYPE', 'type', MASH_STEP_TYPES),
+    ('INFUSE_AMOUNT', 'infusion', liters_to_fl_oz),
+    ('STEP_TEMP', 'step_temp', celsius_to_fahrenheit), ('STEP_TIME', 'step_time', NUMBER),
+    ('RAMP_TIME', 'rise_time', NUMBER),
+    ('INFUSE_TEMP', 'infusion_temp', celsius_to_fahrenheit),
+)
+
+FERMENT_FIELDS = (
+    ('PRIMARY_AGE', 'prim_days', NUMBER), ('PRIMARY_TEMP', 'prim_temp', celsius_to_fahrenheit),
+    ('SECONDARY_AGE', 'sec_days', NUMBER),
+    ('SECONDARY_TEMP', 'sec_temp', celsius_to_fahrenheit),
+    ('TERTIARY_AGE', 'tert_days', NUMBER), ('TERTIARY_TEMP', 'tert_temp', celsius_to_fahrenheit),
+    ('AGE', 'age', NUMBER), ('AGE_TEMP', 'age_temp', celsius_to_fahrenheit),
+)
+
+GRAIN_FIELDS = (
+    ('NAME', 'name', TEXT), ('ORIGIN', 'origin', TEXT), ('SUPPLIER', 'supplier', TEXT),
+    ('TYPE', 'type', GRAIN_TYPES), ('AMOUNT', 'amount', kg_to_oz),
+    ('COLOR', 'color', NUMBER), ('YIELD', 'yield', NUMBER),
+    ('COARSE_FINE_DIFF', 'coarse_fine_diff', NUMBER), ('MOISTURE', 'moisture', NUMBER),
+    ('DIASTATIC_POWER', 'diastatic_power', NUMBER), ('PROTEIN', 'protein', NUMBER),
+    ('MAX_IN_BATCH', 'max_in_batch', NUMBER), ('IBU_GAL_PER_LB', 'ibu_gal_per_lb', NUMBER),
+    ('RECOMMEND_MASH', 'recommend_mash', BOOLEANS), ('ADD_AFTER_BOIL', 'add_after_boil', BOOLEANS),
+    ('NOTES', 'notes', TEXT),
+)
+
+HOP_FIELDS = (
+    ('NAME', 'name', TEXT), ('ORIGIN', 'origin', TEXT), ('ALPHA', 'alpha', NUMBER),
+    ('BETA', 'beta', NUMBER), ('AMOUNT', 'amount', kg_to_oz),
+    ('USE', 'use', HOP_USES), ('FORM', 'form', HOP_FORMS),
+    ('TYPE', 'type', HOP_TYPES), ('HSI', 'hsi', NUMBER), ('NOTES', 'notes', TEXT),
+)
+
+YEAST_FIELDS = (
+    ('NAME', 'name', TEXT), ('LABORATORY', 'lab', TEXT), ('PRODUCT_ID', 'product_id', TEXT),
+    ('TYPE', 'type', YEAST_TYPES), ('FORM', 'form', YEAST_FORMS),
+    ('FLOCCULATION', 'flocculation', FLOCCULATIONS),
+    ('ATTENUATION', 'min_attenuation', NUMBER), ('ATTENUATION', 'max_attenuation', NUMBER),
+    ('MIN_TEMPERATURE', 'min_temp', celsius_to_fahrenheit),
+    ('MAX_TEMPERATURE', 'max_temp', celsius_to_fahrenheit),
+    ('BEST_FOR', 'best_for', TEXT), ('TIMES_CULTURED', 'times_cultured', NUMBER),
+    ('MAX_REUSE', 'max_reuse', NUMBER), ('ADD_TO_SECONDARY', 'add_to_secondary', BOOLEANS),
+    ('NOTES', 'notes', TEXT),
+)
+
+MISC_FIELDS = (
+    ('NAME', 'name', TEXT), ('TYPE', 'type', MISC_TYPES),
+    ('USE', 'use', MISC_USES), ('TIME', 'time', NUMBER),
+    ('USE_FOR', 'use_for', TEXT), ('NOTES', 'notes', TEXT),
+)
+
+WATER_FIELDS = (
+    ('NAME', 'name', TEXT), ('AMOUNT', 'amount', liters_to_fl_oz),
+    ('CALCIUM', 'calcium', NUMBER), ('BICARBONATE', 'bicarbonate', NUMBER),
+    ('SULFATE', 'sulfate', NUMBER), ('CHLORIDE', 'chloride', NUMBER),
+    ('SODIUM', 'sodium', NUMBER), ('MAGNESIUM', 'magnesium', NUMBER),
+    ('PH', 'ph', NUMBER), ('NOTES', 'notes', TEXT),
+)
+
+# (list tag, record tag, ingredient type, units, fields) of the ingredients,
+# in the order of their types in ingredients_by_type
+INGREDIENT_LISTS = (
+    ('FERMENTABLES', 'FERMENTABLE', 'grain', 'oz', GRAIN_FIELDS),
+    ('HOPS', 'HOP', 'hops', 'oz', HOP_FIELDS),
+    ('MISCS', 'MISC', 'misc', '', MISC_FIELDS),
+    ('YEASTS', 'YEAST', 'yeast', 'g', YEAST_FIELDS),
+    ('WATERS', 'WATER', 'water', 'oz', WATER_FIELDS),
+)
+
+
+def read_fields(elem, fields):
+    """Returns the values of the fields of a BeerXML record.
+
+    Args:
+        elem: The record element.
+        fields: Tuple of (BeerXML tag, normalized key, conversion) tuples.
+
+    Returns:
+        Dictionary of the values, without the missing fields.
+    """
+    props = {}
+    if elem is None:
+        return props
+
+    for tag, key, conversion in fields:
+        if conversion is TEXT:
+            value = _text(elem, tag)
+        elif isinstance(conversion, dict):
+            value = _text(elem, tag)
+            if value is not None:
+                value = conversion.get(value.lower())
+        else:
+            value = _float(elem, tag)
+            if value is not None:
+                value = conversion(value)
+
+        if value is not None:
+            props[key] = value
+
+    return props
+
+
+def ingredient_from_element(elem, ingredient_type, units, fields):
+    """Returns the normalized ingredient of a BeerXML record.
+
+    Args:
+        elem: The FERMENTABLE, HOP, MISC, YEAST or WATER element.
+        ingredient_type: The normalized ingredient type.
+        units: The units of the amount.
+        fields: The fields of the record type.
+
+    Returns:
+        The ingredient dictionary.
+    """
+    props = {'units': units}
+    props.update(read_fields(elem, fields))
+
+    if ingredient_type == 'grain':
+        props['subtype'] = GRAIN_SUBTYPES[props.get('type') or 0]
+
+    elif ingredient_type == 'hops':
+        props['form_text'] = HOP_FORM_TEXTS[props.get('form') or 0]
+        props['subtype'] = f'{props["form_text"]} hops'
+        if props.get('use') == HOP_USES['dry hop']:
+            props['dry_hop_time'] = minutes_to_days(_float(elem, 'TIME') or 0.0)
+        else:
+            props['boil_time'] = _float(elem, 'TIME')
+
+    elif ingredient_type == 'yeast':
+        props['form_text'] = YEAST_FORM_TEXTS[props.get('form') or 0]
+        props['subtype'] = f'{props["form_text"]} yeast'
+        amount = _float(elem, 'AMOUNT')
+        if amount is not None:
+            # liters of liquid yeast are read as milliliters
+            props['amount'] = kg_to_g(amount)
+            if _text(elem, 'AMOUNT_IS_WEIGHT') != 'TRUE':
+                props['units'] = 'ml'
+
+    elif ingredient_type == 'misc':
+        props['subtype'] = MISC_SUBTYPES[props.get('type') or 0]
+        amount = _float(elem, 'AMOUNT')
+        if amount is not None:
+            is_weight = _text(elem, 'AMOUNT_IS_WEIGHT') == 'TRUE'
+            props['amount'] = kg_to_oz(amount) if is_weight else liters_to_fl_oz(amount)
+            props['units'] = 'oz' if is_weight else 'fl oz'
+
+    else:
+        props['subtype'] = None
+
+    props.setdefault('notes', None)
+    props['in_recipe'] = 1
+    props['ingredient_type'] = ingredient_type
+
+    return props
+
+
+def recipe_from_element(elem, folder_name):
+    """Returns the normalized recipe of a BeerXML RECIPE element.
+
+    Args:
+        elem: The RECIPE element.
+        folder_name: Name of the folder of the recipe.
+
+    Returns:
+        The recipe dictionary, with text values.
+    """
+    props = {'_type': 'recipe'}
+    props.update(read_fields(elem, RECIPE_FIELDS))
+    props['_id'] = props.get('name')
+    props['folder_name'] = f'/{folder_name}/'
+    props.setdefault('notes', None)
+
+    ingredients_by_type = {}
+    ingredients = []
+    for list_tag, record_tag, ingredient_type, units, fields in INGREDIENT_LISTS:
+        for ingredient_elem in elem.iterfind(f'{list_tag}/{record_tag}'):
+            ingredient = ingredient_from_element(ingredient_elem, ingredient_type, units, fields)
+            ingredient['order'] = len(ingredients) + 1
+            ingredients.append(ingredient)
+            ingredients_by_type.setdefault(ingredient_type, []).append(ingredient)
+    props['ingredients'] = ingredients
+    props['ingredients_by_type'] = ingredients_by_type
+
+    mash_elem = elem.find('MASH')
+    props['mash'] = read_fields(mash_elem, MASH_FIELDS)
+    props['mash']['mashsteps'] = [
+        read_fields(step_elem, MASH_STEP_FIELDS)
+        for step_elem in elem.iterfind('MASH/MASH_STEPS/MASH_STEP')
+    ]
+
+    props['equipment'] = read_fields(elem.find('EQUIPMENT'), EQUIPMENT_FIELDS)
+    for tag, key, conversion in (
+        ('BATCH_SIZE', 'batch_vol', liters_to_fl_oz),
+        ('BOIL_SIZE', 'boil_vol', liters_to_fl_oz),
+        ('BOIL_TIME', 'boil_time', float),
+        ('EFFICIENCY', 'efficiency', float),
+    ):
+        value = _float(elem, tag)
+        if value is not None:
+            props['equipment'][key] = conversion(value)
+
+    props['style'] = read_fields(elem.find('STYLE'), STYLE_FIELDS)
+    props['carb'] = {}
+    props['base_grain'] = (
+        dict(ingredients_by_type['grain'][0]) if 'grain' in ingredients_by_type else {}
+    )
+    props['ferment'] = read_fields(elem, FERMENT_FIELDS)
+    props['ferment']['readings'] = []
+
+    return props
+
+
+def iter_beerxml(source, folder_name='BeerXML'):
+    """Yields the normalized recipes of a BeerXML file.
+
+    Args:
+        source: Path or binary file object of the BeerXML file.
+        folder_name: Name of the folder of the recipes.
+
+    Yields:
+        The recipe dictionaries, with text values.
+    """
+    root = None
+    for event, elem in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag == 'RECIPE':
+            yield recipe_from_element(elem, folder_name)
+
+        # release the complete records of the root, recipes or not
+        if root is not None and elem in root:
+            root.remove(elem)
@@ -0,0 +1,382 @@
+"""Benchmarks of the recipe parsing and sync paths.
+
+The benchmarks run against a synthetic corpus (see beersmith_direct.corpus)
+and an in-memory MongoDB stand-in (see beersmith_direct.memory), so they need
+neither BeerSmith files nor a MongoDB server. Results are reported as
+throughput and peak memory, and can be compared with stored baselines.
+"""
+# pylint: disable=import-outside-toplevel
+
+from copy import deepcopy
+from dataclasses import asdict, dataclass
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+from beersmith_direct.budget import peak_rss
+from beersmith_direct.corpus import CorpusSpec, write_archive, write_library
+from beersmith_direct.i_beersmith import BeersmithInterface
+
+LIBRARY_FILENAME = 'Recipe.bsmx'
+ARCHIVE_FILENAME = 'Archive.bsmx'
+
+# default relative tolerance of the baseline checks
+BENCH_TOLERANCE_DEFAULT = 0.5
+
+# default number of runs of each benchmark
+BENCH_REPEAT_DEFAULT = 3
+
+
+@dataclass
+class BenchmarkResult:
+    """Result of one benchmark.
+
+    Attributes:
+        name: Name of the benchmark.
+        items: Number of items processed (recipes or archive actions).
+        bytes: Number of input bytes processed.
+        seconds: Elapsed time, in seconds.
+        peak_rss: Peak resident set size of the process, in bytes.
+        peak_alloc: Peak traced Python allocations, in bytes, if traced.
+    """
+    name: str
+    items: int
+    bytes: int
+    seconds: float
+    peak_rss: int = None
+    peak_alloc: int = None
+
+    @property
+    def items_per_sec(self):
+        """Returns the item throughput.
+        """
+        return self.items / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_sec(self):
+        """Returns the input throughput, in megabytes per second.
+        """
+        return self.bytes / 1e6 / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        """Returns the result, with the throughputs, as a dictionary.
+        """
+        result = asdict(self)
+        result['items_per_sec'] = self.items_per_sec
+        result['mb_per_sec'] = self.mb_per_sec
+
+        return result
+
+
+def measure(name, func, items, nbytes, trace_memory=False):
+    """Runs a function and measures its duration and memory.
+
+    As with timeit, garbage is collected before the run and the garbage
+    collector is disabled during the run, so the garbage left by earlier
+    code is not collected on the clock.
+
+    Args:
+        name: Name of the benchmark.
+        func: Function to run, without arguments.
+        items: Number of items processed by the function.
+        nbytes: Number of input bytes processed by the function.
+        trace_memory: If True, traces the peak Python allocations, which
+            slows down the function.
+
+    Returns:
+        The BenchmarkResult.
+    """
+    if trace_memory:
+        tracemalloc.start()
+
+    gc.collect()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    peak_alloc = None
+    if trace_memory:
+        _, peak_alloc = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        name=name, items=items, bytes=nbytes, seconds=seconds,
+        peak_rss=peak_rss(), peak_alloc=peak_alloc
+    )
+
+
+def write_corpus(spec, path):
+    """Writes the library and archive files of a corpus.
+
+    Args:
+        spec: The corpus specification.
+        path: Directory of the corpus files.
+
+    Returns:
+        List of archive actions.
+    """
+    write_library(spec, path, LIBRARY_FILENAME)
+
+    return write_archive(spec, path, ARCHIVE_FILENAME)
+
+
+def raw_recipes(dict_items):
+    """Returns the unprocessed recipe dictionaries of a parsed library.
+
+    Args:
+        dict_items: The parsed library, from BeersmithInterface.parse_xml().
+
+    Returns:
+        List of recipe dictionaries, in library order.
+    """
+    recipes = []
+    stack = [dict_items]
+    while stack:
+        folder = stack.pop()
+        data = folder.get('data') or {}
+        items = []
+        for key in ('recipe', 'table'):
+            value = data.get(key, [])
+            items.extend(value if isinstance(value, list) else [value])
+        for item in items:
+            if item.get('xname') == 'Folder':
+                stack.append(item)
+            else:
+                recipes.append(item)
+
+    return recipes
+
+
+def _read_file(path, filename):
+    """Returns the contents of a corpus file.
+    """
+    with open(os.path.join(path, filename), 'r', encoding='UTF-8') as bsmx_file:
+        return bsmx_file.read()
+
+
+def _library_recipe_count(path):
+    """Returns the number of recipes of the library file.
+    """
+    bsm = BeersmithInterface()
+    xml_string = bsm.replace_tags(_read_file(path, LIBRARY_FILENAME))
+
+    return sum(1 for _ in bsm.split_recipes(xml_string))
+
+
+def bench_read_bsmx(path, trace_memory=False):
+    """Benchmarks reading the library file.
+    """
+    bsm = BeersmithInterface()
+    nbytes = os.path.getsize(os.path.join(path, LIBRARY_FILENAME))
+
+    return measure(
+        'read_bsmx', lambda: bsm.read_bsmx(LIBRARY_FILENAME, path),
+        _library_recipe_count(path), nbytes, trace_memory
+    )
+
+
+def bench_process_recipe(path, trace_memory=False):
+    """Benchmarks normalizing the parsed recipes.
+    """
+    bsm = BeersmithInterface()
+    xml_string = _read_file(path, LIBRARY_FILENAME)
+    recipes = raw_recipes(bsm.parse_xml(bsm.replace_tags(xml_string)))
+    recipes = deepcopy(recipes)
+
+    def process():
+        for recipe in recipes:
+            bsm.process_recipe(recipe, folder_name='bench')
+
+    return measure('process_recipe', process, len(recipes), len(xml_string), trace_memory)
+
+
+def bench_correct_type(path, trace_memory=False):
+    """Benchmarks correcting the data types of the parsed recipes.
+    """
+    bsm = BeersmithInterface()
+    xml_string = _read_file(path, LIBRARY_FILENAME)
+    recipes = raw_recipes(bsm.parse_xml(bsm.replace_tags(xml_string)))
+
+    def correct():
+        for recipe in recipes:
+            bsm.correct_type(recipe)
+
+    return measure('correct_type', correct, len(recipes), len(xml_string), trace_memory)
+
+
+def _memory_recipes():
+    """Returns a Recipes connector on an in-memory database.
+    """
+    from beersmith_direct.memory import MemoryDatabase
+    from beersmith_direct.recipes import Recipes
+
+    return Recipes(collection_name='bench_recipes', mdb=MemoryDatabase('bench'))
+
+
+def bench_update_recipes(path, trace_memory=False):
+    """Benchmarks the full library sync into an in-memory database.
+    """
+    recipes = _memory_recipes()
+    nbytes = os.path.getsize(os.path.join(path, LIBRARY_FILENAME))
+
+    return measure(
+        'update_recipes', lambda: recipes.update_recipes(LIBRARY_FILENAME, path),
+        _library_recipe_count(path), nbytes, trace_memory
+    )
+
+
+def bench_update_recipes_from_archive(path, trace_memory=False):
+    """Benchmarks the archive replay into an in-memory database.
+    """
+    recipes = _memory_recipes()
+    recipes.update_recipes(LIBRARY_FILENAME, path)
+
+    archive_list = recipes.read_archive(ARCHIVE_FILENAME, path)
+    nbytes = os.path.getsize(os.path.join(path, ARCHIVE_FILENAME))
+    nbytes += sum(os.path.getsize(os.path.join(path, archive['file'])) for archive in archive_list)
+
+    return measure(
+        'update_recipes_from_archive',
+        lambda: recipes.update_recipes_from_archive(ARCHIVE_FILENAME, path),
+        len(archive_list), nbytes, trace_memory
+    )
+
+
+BENCHMARKS = {
+    'read_bsmx': bench_read_bsmx,
+    'process_recipe': bench_process_recipe,
+    'correct_type': bench_correct_type,
+    'update_recipes': bench_update_recipes,
+    'update_recipes_from_archive': bench_update_recipes_from_archive,
+}
+
+
+def run_benchmarks(spec=None, path=None, names=None, trace_memory=False, repeat=None):
+    """Writes a corpus and runs the benchmarks on it.
+
+    Each benchmark runs repeat times and the fastest run is kept, which
+    filters out the noise of short runs.
+
+    Args:
+        spec: The corpus specification. Defaults to CorpusSpec().
+        path: Directory of the corpus files. The files are written to a
+            temporary directory if not supplied.
+        names: Names of the benchmarks to run. Defaults to all benchmarks.
+        trace_memory: If True, traces the peak Python allocations.
+        repeat: Number of runs of each benchmark. Defaults to the
+            BEERSMITH_BENCH_REPEAT environment variable, or 3.
+
+    Returns:
+        List of BenchmarkResult objects.
+    """
+    if spec is None:
+        spec = CorpusSpec()
+    if repeat is None:
+        repeat = int(os.environ.get('BEERSMITH_BENCH_REPEAT', BENCH_REPEAT_DEFAULT))
+
+    if path is None:
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp_path:
+            return run_benchmarks(spec, tmp_path, names, trace_memory, repeat)
+
+    write_corpus(spec, path)
+
+    return [
+        min(
+            (BENCHMARKS[name](path, trace_memory=trace_memory)
+             for _ in range(max(repeat, 1))),
+            key=lambda result: result.seconds
+        )
+        for name in (names or BENCHMARKS)
+    ]
+
+
+def save_baselines(results, filepath, spec=None):
+    """Writes benchmark results as the baselines file.
+
+    Args:
+        results: List of BenchmarkResult objects.
+        filepath: Path of the baselines file.
+        spec: The corpus specification of the results.
+    """
+    baselines = {
+        'spec': asdict(spec) if spec else None,
+        'results': {
+            result.name: {
+                'items_per_sec': round(result.items_per_sec, 1),
+                'mb_per_sec': round(result.mb_per_sec, 3),
+                'peak_rss': result.peak_rss,
+            }
+            for result in results
+        },
+    }
+    with open(filepath, 'w', encoding='UTF-8') as baselines_file:
+        json.dump(baselines, baselines_file, indent=4)
+        baselines_file.write('\n')
+
+
+def load_baselines(filepath):
+    """Reads the baselines file.
+
+    Args:
+        filepath: Path of the baselines file.
+
+    Returns:
+        Dictionary with the corpus 'spec' and the baseline 'results'.
+    """
+    with open(filepath, 'r', encoding='UTF-8') as baselines_file:
+        return json.load(baselines_file)
+
+
+def check_baselines(results, baselines, tolerance=None, check_rss=True):
+    """Compares benchmark results with the baselines.
+
+    The baselines are absolute measures of the machine they were saved on,
+    and the peak RSS is the peak of the whole process: the results are only
+    comparable when run on the same machine, in a process of their own (as
+    by the bench command).
+
+    Args:
+        results: List of BenchmarkResult objects.
+        baselines: Baselines, from load_baselines().
+        tolerance: Allowed relative regression. Defaults to the
+            BEERSMITH_BENCH_TOLERANCE environment variable, or 0.5.
+        check_rss: If False, only the throughputs are compared.
+
+    Returns:
+        List of regression messages, empty if there are no regressions.
+    """
+    if tolerance is None:
+        tolerance = float(os.environ.get('BEERSMITH_BENCH_TOLERANCE', BENCH_TOLERANCE_DEFAULT))
+
+    regressions = []
+    for result in results:
+        baseline = baselines['results'].get(result.name)
+        if not baseline:
+            continue
+
+        min_throughput = baseline['items_per_sec'] * (1 - tolerance)
+        if result.items_per_sec < min_throughput:
+            regressions.append(
+                f'{result.name}: {result.items_per_sec:.1f} items/sec, '
+                f'baseline {baseline["items_per_sec"]:.1f}'
+            )
+
+        if check_rss and result.peak_rss and baseline.get('peak_rss'):
+            max_rss = baseline['peak_rss'] * (1 + tolerance)
+            if result.peak_rss > max_rss:
+                regressions.append(
+                    f'{result.name}: peak RSS {result.peak_rss / 1e6:.1f} MB, '
+                    f'baseline {baseline["peak_rss"] / 1e6:.1f} MB'
+                )
+
+    return regressions
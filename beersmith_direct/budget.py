@@ -0,0 +1,129 @@
+"""Class module for the memory target of a sync.
+
+In the streaming sync mode, a rebuild streams the recipes from the file to
+the normalization and to the batched writes, parsing one recipe at a time
+(see BeersmithInterface.iter_bsmx()), and a MemoryBudget adapts the size of
+the write batches to the resident set size (RSS) of the process:
+
+    rss > 80% of the target: collect garbage, then halve the batch size
+    rss < 50% of the target: double the batch size, up to batch_size
+
+The target is not a ceiling: the batches are the only memory it adjusts.
+The memory of the interpreter, of the loaded modules and of the parse of
+one recipe is not limited, and a warning is logged when the RSS goes over
+the target. The RSS is read from /proc: on other systems the batches keep
+their full size.
+"""
+# pylint: disable=logging-fstring-interpolation
+
+import gc
+import logging
+import os
+import sys
+
+# initialize logging
+logger = logging.getLogger(__name__)
+
+# fractions of the budget where the batches shrink and grow
+HIGH_WATER = 0.8
+LOW_WATER = 0.5
+
+MB = 1024 * 1024
+
+
+def current_rss():
+    """Returns the resident set size of the process, in bytes.
+
+    Returns:
+        The current RSS, or None where it is not available (it is read from
+        /proc on Linux). The peak RSS is not a substitute: it never drops, so
+        the batches would only shrink.
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """Returns the peak resident set size of the process, in bytes.
+
+    On Linux, the peak is read from /proc (VmHWM), which starts over when
+    a process is executed. ru_maxrss keeps the peak of the parent process a
+    subprocess was forked from.
+
+    Returns:
+        The peak RSS, or None where neither is available.
+    """
+    try:
+        with open('/proc/self/status', 'rb') as status_file:
+            for line in status_file:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class MemoryBudget:
+    """Adapts the write batches of a sync to a memory target.
+
+    Attributes:
+        limit: The target, in bytes.
+        max_batch_size: The largest batch size.
+        batch_size: The current batch size.
+        peak: The largest RSS seen, in bytes.
+    """
+    def __init__(self, limit_mb, max_batch_size):
+        """Initializes the budget.
+
+        Args:
+            limit_mb: The target, in megabytes.
+            max_batch_size: The largest batch size.
+        """
+        self.limit = int(float(limit_mb) * MB)
+        self.max_batch_size = max_batch_size
+        self.batch_size = max_batch_size
+        self.peak = 0
+        self._warned = False
+
+    def batch_limit(self, stats=None):
+        """Returns the batch size for the current memory use.
+
+        Args:
+            stats: SyncStats object that records the batch size changes.
+
+        Returns:
+            The number of queued writes to send in one batch.
+        """
+        rss = current_rss()
+        if rss is None:
+            return self.batch_size
+
+        if rss > HIGH_WATER * self.limit and self.batch_size > 1:
+            gc.collect()
+            rss = current_rss()
+            if rss > HIGH_WATER * self.limit:
+                self.batch_size = max(1, self.batch_size // 2)
+                if stats is not None:
+                    stats.add('batch_shrinks')
+
+        elif rss < LOW_WATER * self.limit and self.batch_size < self.max_batch_size:
+            self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+
+        if rss > self.limit and not self._warned:
+            logger.warning(f'memory target exceeded: {rss / MB:.0f} MB > {self.limit / MB:.0f} MB')
+            self._warned = True
+        self.peak = max(self.peak, rss)
+
+        return self.batch_size
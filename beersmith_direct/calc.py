@@ -0,0 +1,363 @@
+"""Batch brewing calculations across many recipes.
+
+The ingredients of many recipes are loaded into an IngredientTable, a set of
+typed NumPy columns (recipe index, ingredient type, units, amount, color,
+potential, alpha acid, boil time, use), and the per-recipe aggregates are
+computed in vectorized form:
+
+    table = IngredientTable.from_recipes(bsm.read_bsmx())
+    totals = table.aggregates()
+    totals['og'][table.recipe_ids.index('2021-11-16_Reston Red Ale')]
+
+BeerSmith stores weights in ounces and volumes in fluid ounces. Normalized
+amounts follow get_ingredient_amount(): grain in pounds, other ingredients
+in their stored units. The estimates use the usual homebrewing formulas
+(points per pound per gallon for OG, Tinseth for IBU, Morey for SRM), so
+they are close to, but not always equal to, the values shown by BeerSmith.
+
+recipe_aggregates() is the scalar reference implementation of the same
+calculations, one recipe at a time. NumPy is an optional dependency:
+
+    pip install beersmith-direct[calc]
+"""
+# pylint: disable=import-outside-toplevel
+
+import math
+
+# ingredient types and their codes in the ingredient_type column
+INGREDIENT_TYPES = ('grain', 'hops', 'yeast', 'misc', 'water')
+
+# grain subtypes that are mashed, subject to the mash efficiency
+MASHED_SUBTYPES = ('grain', 'adjunct')
+
+# gravity points per pound per gallon of sucrose
+SUCROSE_PPG = 46.214
+
+# BeerSmith hop use code of a boil addition
+HOP_USE_BOIL = 0
+
+FL_OZ_PER_GALLON = 128.0
+OZ_PER_LB = 16.0
+
+# aggregates of recipe_aggregates() and IngredientTable.aggregates()
+AGGREGATES = (
+    'grist_lbs', 'hops_oz', 'boil_hops_oz', 'yeast_count', 'og', 'ibu', 'srm',
+)
+
+
+def _numpy():
+    """Returns the numpy module, or raises an ImportError with a hint.
+    """
+    try:
+        import numpy
+    except ImportError as err:
+        raise ImportError(
+            'batch calculations require numpy, install beersmith-direct[calc]'
+        ) from err
+
+    return numpy
+
+
+def _float(value, default=0.0):
+    """Returns a float value, or the default for missing values.
+
+    Ingredient notes can replace numeric fields with text, which is treated
+    as missing.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def normalize_amount(amount, units, ingredient_type):
+    """Returns the normalized amount and units of an ingredient.
+
+    Same conversion as BeersmithInterface.get_ingredient_amount(): grain
+    ounces are converted to pounds.
+    """
+    amount = _float(amount)
+    if ingredient_type == 'grain' and units == 'oz':
+        return amount / OZ_PER_LB, 'lbs'
+
+    return amount, units
+
+
+def batch_gallons(recipe):
+    """Returns the batch volume of a recipe, in gallons.
+    """
+    equipment = recipe.get('equipment') or {}
+
+    return _float(equipment.get('batch_vol')) / FL_OZ_PER_GALLON
+
+
+def efficiency(recipe):
+    """Returns the mash efficiency of a recipe, as a fraction.
+    """
+    equipment = recipe.get('equipment') or {}
+
+    return _float(equipment.get('efficiency'), 100.0) / 100.0
+
+
+def tinseth_utilization(og, boil_time):
+    """Returns the Tinseth hop utilization.
+
+    Args:
+        og: Original gravity, for example 1.050.
+        boil_time: Boil time, in minutes.
+    """
+    return 1.65 * 0.000125 ** (og - 1.0) * (1.0 - math.exp(-0.04 * boil_time)) / 4.15
+
+
+def recipe_aggregates(recipe):
+    """Computes the aggregates of one recipe with scalar arithmetic.
+
+    This is the reference implementation of IngredientTable.aggregates().
+
+    Args:
+        recipe: Normalized recipe.
+
+    Returns:
+        Dictionary of the AGGREGATES values.
+    """
+    gallons = batch_gallons(recipe)
+    mash_efficiency = efficiency(recipe)
+    totals = dict.fromkeys(AGGREGATES, 0.0)
+    points = 0.0
+    mcu = 0.0
+
+    ingredients = recipe.get('ingredients') or []
+    for ingredient in ingredients:
+        ingredient_type = ingredient.get('ingredient_type')
+        amount, _ = normalize_amount(
+            ingredient.get('amount'), ingredient.get('units'), ingredient_type
+        )
+
+        if ingredient_type == 'grain':
+            totals['grist_lbs'] += amount
+            ppg = _float(ingredient.get('yield')) / 100.0 * SUCROSE_PPG
+            if ingredient.get('subtype') in MASHED_SUBTYPES:
+                ppg *= mash_efficiency
+            points += amount * ppg
+            mcu += amount * _float(ingredient.get('color'))
+        elif ingredient_type == 'hops':
+            totals['hops_oz'] += amount
+            if _float(ingredient.get('use'), -1) == HOP_USE_BOIL:
+                totals['boil_hops_oz'] += amount
+        elif ingredient_type == 'yeast':
+            totals['yeast_count'] += 1
+
+    if gallons > 0:
+        totals['og'] = 1.0 + points / gallons / 1000.0
+        totals['srm'] = 1.4922 * (mcu / gallons) ** 0.6859
+        for ingredient in ingredients:
+            if ingredient.get('ingredient_type') != 'hops':
+                continue
+            if _float(ingredient.get('use'), -1) != HOP_USE_BOIL:
+                continue
+            utilization = tinseth_utilization(
+                totals['og'], _float(ingredient.get('boil_time'))
+            )
+            alpha = _float(ingredient.get('alpha')) / 100.0
+            totals['ibu'] += utilization * alpha * _float(ingredient.get('amount')) \
+                * 7490.0 / gallons
+    else:
+        totals['og'] = 1.0
+
+    return totals
+
+
+class IngredientTable:
+    """Typed NumPy columns of the ingredients of many recipes.
+
+    Missing numeric values are stored as NaN.
+
+    Attributes:
+        recipe_ids: List of recipe identifiers, indexed by recipe_index.
+        recipe_index: int32 array, index of the recipe of each ingredient.
+        ingredient_type: int8 array of INGREDIENT_TYPES codes, -1 if unknown.
+        units: int16 array of codes into units_labels.
+        units_labels: List of the units strings.
+        mashed: bool array, True for grain subject to the mash efficiency.
+        amount, color, potential, alpha, boil_time, use: float64 arrays.
+        batch_gallons: float64 array of the batch volume of each recipe.
+        efficiency: float64 array of the mash efficiency of each recipe.
+    """
+    def __init__(self):
+        """Initializes an empty table.
+        """
+        numpy = _numpy()
+
+        self.recipe_ids = []
+        self.units_labels = []
+        self.recipe_index = numpy.zeros(0, dtype=numpy.int32)
+        self.ingredient_type = numpy.zeros(0, dtype=numpy.int8)
+        self.units = numpy.zeros(0, dtype=numpy.int16)
+        self.mashed = numpy.zeros(0, dtype=bool)
+        self.amount = numpy.zeros(0, dtype=numpy.float64)
+        self.color = numpy.zeros(0, dtype=numpy.float64)
+        self.potential = numpy.zeros(0, dtype=numpy.float64)
+        self.alpha = numpy.zeros(0, dtype=numpy.float64)
+        self.boil_time = numpy.zeros(0, dtype=numpy.float64)
+        self.use = numpy.zeros(0, dtype=numpy.float64)
+        self.batch_gallons = numpy.zeros(0, dtype=numpy.float64)
+        self.efficiency = numpy.zeros(0, dtype=numpy.float64)
+
+    def __len__(self):
+        return len(self.recipe_index)
+
+    @classmethod
+    def from_recipes(cls, recipes):
+        """Loads the ingredients of normalized recipes.
+
+        Args:
+            recipes: Iterable of normalized recipes.
+
+        Returns:
+            The IngredientTable object.
+        """
+        numpy = _numpy()
+        nan = float('nan')
+
+        table = cls()
+        type_codes = {name: code for code, name in enumerate(INGREDIENT_TYPES)}
+        units_codes = {}
+        columns = {
+            'recipe_index': [], 'ingredient_type': [], 'units': [], 'mashed': [],
+            'amount': [], 'color': [], 'potential': [], 'alpha': [],
+            'boil_time': [], 'use': [],
+        }
+        gallons = []
+        efficiencies = []
+
+        for recipe_num, recipe in enumerate(recipes):
+            table.recipe_ids.append(recipe.get('_id', recipe.get('name')))
+            gallons.append(batch_gallons(recipe))
+            efficiencies.append(efficiency(recipe))
+
+            for ingredient in recipe.get('ingredients') or []:
+                units = str(ingredient.get('units'))
+                if units not in units_codes:
+                    units_codes[units] = len(units_codes)
+                    table.units_labels.append(units)
+
+                columns['recipe_index'].append(recipe_num)
+                columns['ingredient_type'].append(
+                    type_codes.get(ingredient.get('ingredient_type'), -1)
+                )
+                columns['units'].append(units_codes[units])
+                columns['mashed'].append(ingredient.get('subtype') in MASHED_SUBTYPES)
+                columns['amount'].append(_float(ingredient.get('amount'), nan))
+                columns['color'].append(_float(ingredient.get('color'), nan))
+                columns['potential'].append(_float(ingredient.get('yield'), nan))
+                columns['alpha'].append(_float(ingredient.get('alpha'), nan))
+                columns['boil_time'].append(_float(ingredient.get('boil_time'), nan))
+                columns['use'].append(_float(ingredient.get('use'), nan))
+
+        table.recipe_index = numpy.array(columns['recipe_index'], dtype=numpy.int32)
+        table.ingredient_type = numpy.array(columns['ingredient_type'], dtype=numpy.int8)
+        table.units = numpy.array(columns['units'], dtype=numpy.int16)
+        table.mashed = numpy.array(columns['mashed'], dtype=bool)
+        table.amount = numpy.array(columns['amount'], dtype=numpy.float64)
+        table.color = numpy.array(columns['color'], dtype=numpy.float64)
+        table.potential = numpy.array(columns['potential'], dtype=numpy.float64)
+        table.alpha = numpy.array(columns['alpha'], dtype=numpy.float64)
+        table.boil_time = numpy.array(columns['boil_time'], dtype=numpy.float64)
+        table.use = numpy.array(columns['use'], dtype=numpy.float64)
+        table.batch_gallons = numpy.array(gallons, dtype=numpy.float64)
+        table.efficiency = numpy.array(efficiencies, dtype=numpy.float64)
+
+        return table
+
+    def type_mask(self, ingredient_type):
+        """Returns the boolean mask of an ingredient type.
+        """
+        return self.ingredient_type == INGREDIENT_TYPES.index(ingredient_type)
+
+    def normalized_amounts(self):
+        """Returns the normalized amounts and units codes.
+
+        Grain ounces are converted to pounds; a 'lbs' label is added to
+        units_labels if needed.
+
+        Returns:
+            Tuple of the float64 amounts and the int16 units codes.
+        """
+        numpy = _numpy()
+
+        amounts = self.amount.copy()
+        units = self.units.copy()
+        if 'oz' in self.units_labels:
+            if 'lbs' not in self.units_labels:
+                self.units_labels.append('lbs')
+            grain_oz = self.type_mask('grain') & (units == self.units_labels.index('oz'))
+            amounts[grain_oz] /= OZ_PER_LB
+            units[grain_oz] = self.units_labels.index('lbs')
+
+        return numpy.nan_to_num(amounts), units
+
+    def _sum(self, weights, mask):
+        """Returns the per-recipe sums of the masked weights.
+        """
+        numpy = _numpy()
+
+        return numpy.bincount(
+            self.recipe_index[mask], weights=weights[mask], minlength=len(self.recipe_ids)
+        )
+
+    def aggregates(self):
+        """Computes the per-recipe aggregates in vectorized form.
+
+        Returns:
+            Dictionary of float64 arrays, indexed like recipe_ids, keyed by
+            the AGGREGATES names.
+        """
+        numpy = _numpy()
+
+        amounts, _ = self.normalized_amounts()
+        grain = self.type_mask('grain')
+        hops = self.type_mask('hops')
+        boil_hops = hops & (self.use == HOP_USE_BOIL)
+        gallons = self.batch_gallons
+        has_volume = gallons > 0
+        safe_gallons = numpy.where(has_volume, gallons, 1.0)
+
+        # gravity points of the grain, the mash efficiency applies to mashed grain
+        ppg = numpy.nan_to_num(self.potential) / 100.0 * SUCROSE_PPG
+        ppg = numpy.where(self.mashed, ppg * self.efficiency[self.recipe_index], ppg)
+        points = self._sum(amounts * ppg, grain)
+        og = numpy.where(has_volume, 1.0 + points / safe_gallons / 1000.0, 1.0)
+
+        # Morey color
+        mcu = self._sum(amounts * numpy.nan_to_num(self.color), grain) / safe_gallons
+        srm = numpy.where(has_volume, 1.4922 * mcu ** 0.6859, 0.0)
+
+        # Tinseth bitterness of the boil additions
+        boil_time = numpy.nan_to_num(self.boil_time)
+        utilization = 1.65 * 0.000125 ** (og[self.recipe_index] - 1.0) \
+            * (1.0 - numpy.exp(-0.04 * boil_time)) / 4.15
+        ibu_ingredient = utilization * numpy.nan_to_num(self.alpha) / 100.0 * amounts \
+            * 7490.0 / safe_gallons[self.recipe_index]
+        ibu = numpy.where(has_volume, self._sum(ibu_ingredient, boil_hops), 0.0)
+
+        return {
+            'grist_lbs': self._sum(amounts, grain),
+            'hops_oz': self._sum(amounts, hops),
+            'boil_hops_oz': self._sum(amounts, boil_hops),
+            'yeast_count': numpy.bincount(
+                self.recipe_index[self.type_mask('yeast')], minlength=len(self.recipe_ids)
+            ).astype(numpy.float64),
+            'og': og,
+            'ibu': ibu,
+            'srm': srm,
+        }
+
+    def aggregates_by_recipe(self):
+        """Returns the aggregates as dictionaries, keyed by recipe identifier.
+        """
+        aggregates = self.aggregates()
+
+        return {
+            recipe_id: {name: float(values[num]) for name, values in aggregates.items()}
+            for num, recipe_id in enumerate(self.recipe_ids)
+        }
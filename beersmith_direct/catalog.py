@@ -0,0 +1,254 @@
+"""Class module for the deduplicated ingredient catalog of a recipe collection.
+
+Every recipe holds the full ingredient dictionaries of its ingredients, for
+every use. The catalog stores each distinct ingredient once, in a collection
+named after the recipe collection (for example recipes_ingredients), with
+its usage count and the recipes that use it:
+
+    {'_id': '9c1e...', 'ingredient_type': 'hops', 'name': 'cascade hops',
+     'form': 2, 'props': {'name': 'Cascade Hops', 'origin': 'US', ...},
+     'usage_count': 3, 'recipes': ['Pale Ale', 'IPA']}
+
+An ingredient is identified by its normalized name (case folded, with single
+spaces), its ingredient type (grain, hops, yeast, misc or water) and its
+form (None for the types that have no form). The _id is the content address
+of this key (see beersmith_direct.references.content_id()). The props are
+the ingredient dictionary of the last recipe written that uses it, without
+the keys of the use (amount, order, use, boil time).
+
+The catalog is maintained incrementally from the recipe writes: the
+ingredients of the stored versions of a batch of recipes are read with one
+query, and the differences with the written versions are applied with one
+bulk write of $inc, $addToSet and $pull updates. The entries that are no
+longer used are deleted. The catalog queries read the catalog collection
+only.
+"""
+from collections import Counter
+
+from pymongo import DeleteMany, UpdateOne
+
+from beersmith_direct.references import content_id
+
+# keys of an ingredient dictionary that describe its use in a recipe
+USAGE_KEYS = ('order', 'f_order', 'amount', 'use', 'boil_time', 'last_modified')
+
+# fields of the recipe documents read to compute the catalog changes
+INGREDIENT_FIELDS = ('ingredients.name', 'ingredients.ingredient_type', 'ingredients.form')
+
+
+def normalize_name(name):
+    """Returns the normalized name of an ingredient.
+    """
+    return ' '.join(str(name or '').split()).casefold()
+
+
+def ingredient_key(ingredient):
+    """Returns the catalog key of an ingredient.
+
+    Args:
+        ingredient: Ingredient dictionary of a recipe.
+
+    Returns:
+        Tuple of the ingredient type, the normalized name and the form.
+    """
+    return (
+        ingredient.get('ingredient_type'),
+        normalize_name(ingredient.get('name')),
+        ingredient.get('form'),
+    )
+
+
+def _key_id(key):
+    """Returns the _id of a catalog key.
+    """
+    ingredient_type, name, form = key
+
+    return content_id({'ingredient_type': ingredient_type, 'name': name, 'form': form})
+
+
+def _recipe_keys(recipe):
+    """Returns the number of uses of each catalog key in a recipe.
+    """
+    if not recipe:
+        return Counter()
+
+    return Counter(ingredient_key(ingredient) for ingredient in recipe.get('ingredients') or [])
+
+
+class IngredientCatalog:
+    """Deduplicated catalog of the ingredients of the recipes.
+
+    Changes are computed by record(), before the recipe writes, and written
+    by flush(), after them, with one bulk write.
+
+    Attributes:
+        collection: The catalog collection.
+    """
+    def __init__(self, mdb, prefix):
+        """Initializes the catalog.
+
+        Args:
+            mdb: The database.
+            prefix: Prefix of the collection name, usually the name of the
+                recipe collection.
+        """
+        self.collection = mdb.read_collection(f'{prefix}_ingredients')
+        self._pending = []
+
+    def record(self, recipe_collection, writes, stats=None):
+        """Queues the catalog changes of a batch of recipe writes.
+
+        Must be called before the recipe writes, to read the stored versions.
+
+        Args:
+            recipe_collection: The recipe collection.
+            writes: List of (action, recipe_id, recipe) tuples, where action
+                is 'upsert' or 'delete' and recipe is None for a deletion.
+            stats: SyncStats object that records the reads.
+
+        Returns:
+            The number of queued catalog updates.
+        """
+        # the last write of each recipe is the version after the batch
+        final = {}
+        for action, recipe_id, recipe in writes:
+            final[recipe_id] = recipe if action == 'upsert' else None
+        if not final:
+            return 0
+
+        doc_filter = {'_id': {'$in': list(final)}}
+        if stats is not None:
+            with stats.stage('mongodb_read'):
+                stored = list(recipe_collection.find(doc_filter, projection=INGREDIENT_FIELDS))
+        else:
+            stored = list(recipe_collection.find(doc_filter, projection=INGREDIENT_FIELDS))
+        before = {recipe['_id']: _recipe_keys(recipe) for recipe in stored}
+
+        changes = {}
+        for recipe_id, recipe in final.items():
+            old_keys = before.get(recipe_id, Counter())
+            new_keys = _recipe_keys(recipe)
+            props = {}
+            for ingredient in (recipe or {}).get('ingredients') or []:
+                props.setdefault(ingredient_key(ingredient), {
+                    key: value for key, value in ingredient.items() if key not in USAGE_KEYS
+                })
+
+            for key in old_keys.keys() | new_keys.keys():
+                change = changes.setdefault(key, {'inc': 0, 'add': [], 'pull': [], 'props': None})
+                change['inc'] += new_keys[key] - old_keys[key]
+                if new_keys[key] and not old_keys[key]:
+                    change['add'].append(recipe_id)
+                elif old_keys[key] and not new_keys[key]:
+                    change['pull'].append(recipe_id)
+                if key in props:
+                    change['props'] = props[key]
+
+        self._pending.extend(self._requests(changes))
+
+        return len(self._pending)
+
+    @staticmethod
+    def _requests(changes):
+        """Returns the bulk write requests of the catalog changes.
+        """
+        requests = []
+        removed = []
+        for key, change in changes.items():
+            key_id = _key_id(key)
+            if change['props'] is not None:
+                ingredient_type, name, form = key
+                update = {
+                    '$setOnInsert': {
+                        'ingredient_type': ingredient_type, 'name': name, 'form': form,
+                    },
+                    '$set': {'props': change['props']},
+                    '$inc': {'usage_count': change['inc']},
+                }
+                if change['add']:
+                    update['$addToSet'] = {'recipes': {'$each': change['add']}}
+                requests.append(UpdateOne({'_id': key_id}, update, upsert=True))
+            elif change['inc']:
+                requests.append(
+                    UpdateOne({'_id': key_id}, {'$inc': {'usage_count': change['inc']}})
+                )
+
+            # the recipes are added and removed in separate updates of a key
+            if change['pull']:
+                requests.append(
+                    UpdateOne({'_id': key_id}, {'$pull': {'recipes': {'$in': change['pull']}}})
+                )
+                removed.append(key_id)
+
+        if removed:
+            requests.append(DeleteMany({'_id': {'$in': removed}, 'usage_count': {'$lte': 0}}))
+
+        return requests
+
+    def pending_count(self):
+        """Returns the number of queued catalog updates.
+        """
+        return len(self._pending)
+
+    def flush(self, stats=None):
+        """Writes the queued catalog updates with one ordered bulk write.
+
+        Args:
+            stats: SyncStats object that records the writes.
+
+        Returns:
+            The number of catalog updates written.
+        """
+        if not self._pending:
+            return 0
+
+        pending = self._pending
+        self._pending = []
+        if stats is not None:
+            with stats.stage('mongodb_write'):
+                self.collection.bulk_write(pending, ordered=True)
+            stats.add('catalog_updates', len(pending))
+        else:
+            self.collection.bulk_write(pending, ordered=True)
+
+        return len(pending)
+
+    def find(self, ingredient_type=None, name=None):
+        """Returns the catalog entries, the most used first.
+
+        Args:
+            ingredient_type: Type of the ingredients, all if None.
+            name: Name of the ingredients, normalized before the query, all
+                if None.
+
+        Returns:
+            List of catalog entries.
+        """
+        doc_filter = {}
+        if ingredient_type:
+            doc_filter['ingredient_type'] = ingredient_type
+        if name:
+            doc_filter['name'] = normalize_name(name)
+
+        return list(self.collection.find(doc_filter, sort=[('usage_count', -1), ('name', 1)]))
+
+    def recipes_using(self, name, ingredient_type=None):
+        """Returns the identifiers of the recipes that use an ingredient.
+
+        Args:
+            name: Name of the ingredient.
+            ingredient_type: Type of the ingredient, all if None.
+
+        Returns:
+            Sorted list of recipe identifiers, in any form of the ingredient.
+        """
+        return sorted({
+            recipe_id for entry in self.find(ingredient_type, name)
+            for recipe_id in entry.get('recipes', [])
+        })
+
+    def drop(self):
+        """Drops the catalog collection.
+        """
+        self.collection.drop()
+        self._pending = []
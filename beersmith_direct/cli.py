@@ -0,0 +1,396 @@
+"""Command line interface of beersmith-direct.
+
+Usage:
+    beersmith-direct sync [--collection NAME] [--file FILE] [--path PATH]
+    beersmith-direct rebuild [--collection NAME] [--file FILE] [--path PATH]
+    beersmith-direct sync --libraries FILE [--library-workers N]
+    beersmith-direct parse FILE [--path PATH]
+    beersmith-direct export FILE --out DIR [--format ndjson columnar]
+    beersmith-direct indexes [--collection NAME]
+    beersmith-direct ingredients [--collection NAME] [--type TYPE] [--name NAME]
+    beersmith-direct bench [--recipes N] [--baselines FILE] [--save]
+
+The sync and rebuild commands accept --dry-run, which parses the files and
+reports the throughput without connecting to MongoDB. All commands accept
+--workers, --batch-size, --checkpoint-interval, --cache-dir and --database.
+"""
+# pylint: disable=import-outside-toplevel
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+from beersmith_direct.i_beersmith import BeersmithInterface
+from beersmith_direct.stats import SyncStats
+from beersmith_direct.workers import read_files
+
+
+def common_options(default=None):
+    """Returns the parser of the options shared by all commands.
+
+    Args:
+        default: Default value of the options.
+    """
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument(
+        '-v', '--verbose', action='count', default=default or 0,
+        help='log at INFO level, or DEBUG when repeated')
+    options.add_argument(
+        '--workers', type=int, default=default,
+        help='number of processes that parse the recipe files')
+    options.add_argument(
+        '--batch-size', type=int, default=default,
+        help='number of queued writes per MongoDB bulk write')
+    options.add_argument(
+        '--checkpoint-interval', type=int, default=default,
+        help='number of records between checkpoints, 0 for the end of the run')
+    options.add_argument(
+        '--cache-dir', default=default,
+        help='directory of the parsed file cache, only writable by the user: '
+             'its pickle files are loaded')
+    options.add_argument(
+        '--database', default=default,
+        help='database URL, sqlite:///PATH for a local file, MongoDB if not set or mongodb')
+
+    return options
+
+
+def build_parser():
+    """Returns the argument parser.
+    """
+    # the options are accepted before and after the command, the command
+    # parsers suppress their defaults to keep the values given before it
+    options = common_options()
+    command_options = common_options(argparse.SUPPRESS)
+
+    parser = argparse.ArgumentParser(
+        prog='beersmith-direct', description='Syncs BeerSmith recipes into MongoDB.',
+        parents=[options])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in (
+        ('sync', 'apply the archive actions since the last sync'),
+        ('rebuild', 'reload the recipe collection from the recipe library'),
+    ):
+        command = commands.add_parser(name, parents=[command_options], help=help_text)
+        command.add_argument('--collection', help='name of the recipe collection')
+        command.add_argument('--file', help='name of the archive or library file')
+        command.add_argument('--path', help='location of the BeerSmith files')
+        command.add_argument(
+            '--dry-run', action='store_true',
+            help='parse the files and report the throughput, without MongoDB')
+        command.add_argument(
+            '--memory-budget', type=float,
+            help='RSS target in MB that sizes the write batches, '
+                 'parses and writes the recipes one at a time')
+        command.add_argument(
+            '--libraries', help='JSON file of library definitions to sync concurrently')
+        command.add_argument(
+            '--library-workers', type=int, help='number of libraries synced at the same time')
+
+    command = commands.add_parser('parse', parents=[command_options], help='parse a .bsmx file')
+    command.add_argument('file', help='name of the .bsmx file')
+    command.add_argument('--path', help='location of the file')
+
+    command = commands.add_parser(
+        'export', parents=[command_options], help='export recipes to NDJSON and columnar files')
+    command.add_argument('file', help='name of the recipe file')
+    command.add_argument('--path', help='location of the file')
+    command.add_argument('--out', required=True, help='output directory')
+    command.add_argument(
+        '--format', nargs='+', choices=('ndjson', 'columnar'), default=['ndjson', 'columnar'],
+        help='layouts to write')
+    command.add_argument(
+        '--compression', choices=('gzip', 'bz2', 'xz'), help='compression of the files')
+    command.add_argument('--chunk-rows', type=int, default=10000, help='rows per chunk')
+
+    command = commands.add_parser(
+        'indexes', parents=[command_options], help='create the indexes and report their usage')
+    command.add_argument('--collection', help='name of the recipe collection')
+
+    command = commands.add_parser(
+        'ingredients', parents=[command_options], help='list the ingredient catalog')
+    command.add_argument('--collection', help='name of the recipe collection')
+    command.add_argument(
+        '--type', choices=('grain', 'hops', 'yeast', 'misc', 'water'), help='ingredient type')
+    command.add_argument('--name', help='ingredient name')
+
+    command = commands.add_parser('bench', parents=[command_options], help='run the benchmarks')
+    command.add_argument('--recipes', type=int, default=100, help='recipes in the corpus')
+    command.add_argument(
+        '--archive-actions', type=int, default=50, help='archive actions in the corpus')
+    command.add_argument('--folder-depth', type=int, default=1, help='folder depth')
+    command.add_argument('--path', help='directory of the corpus, temporary if not set')
+    command.add_argument('--names', nargs='*', help='benchmarks to run')
+    command.add_argument('--baselines', help='baselines file to compare with')
+    command.add_argument(
+        '--save', action='store_true', help='save the results as the baselines')
+
+    return parser
+
+
+def parse_report(filenames, path, workers=1, cache_dir=None):
+    """Parses files without MongoDB and measures the throughput.
+
+    Args:
+        filenames: List of file names.
+        path: Location of the files.
+        workers: Number of parsing processes.
+        cache_dir: Directory of the parsed file cache.
+
+    Returns:
+        Dictionary with the files, records, bytes, seconds, records_per_sec
+        and mb_per_sec, and the parsed lists keyed by file name.
+    """
+    stats = SyncStats(enabled=True)
+    start = time.perf_counter()
+    parsed = read_files(filenames, path, workers=workers, cache_dir=cache_dir, stats=stats)
+    seconds = time.perf_counter() - start
+
+    nbytes = sum(os.path.getsize(os.path.join(path, filename)) for filename in filenames)
+    records = sum(len(parsed_list) for parsed_list in parsed.values())
+
+    return {
+        'files': len(filenames),
+        'records': records,
+        'bytes': nbytes,
+        'seconds': seconds,
+        'records_per_sec': records / seconds if seconds else 0.0,
+        'mb_per_sec': nbytes / 1e6 / seconds if seconds else 0.0,
+        'parsed': parsed,
+    }
+
+
+def print_report(label, report):
+    """Prints the throughput of a parse report.
+    """
+    print(
+        f'{label}: {report["files"]} files, {report["records"]} records, '
+        f'{report["bytes"] / 1e6:.3f} MB in {report["seconds"]:.3f}s '
+        f'({report["records_per_sec"]:.1f} recipes/sec, {report["mb_per_sec"]:.3f} MB/sec)'
+    )
+
+
+def default_path(path):
+    """Returns the path, or the default BeerSmith location.
+    """
+    return path or BeersmithInterface(stats=SyncStats(enabled=False), profile=False).default_path
+
+
+def checked_path(parser, path, filename):
+    """Returns the location of the file of a command.
+
+    Exits with a usage error if the location is not set or the file does not
+    exist.
+
+    Args:
+        parser: The argument parser, which reports the error.
+        path: The supplied location, or None for the default location.
+        filename: Name of the file.
+    """
+    path = default_path(path)
+    if not path:
+        parser.error('the file location is not set, use --path or BEERSMITH_DEFAULT_PATH')
+
+    filepath = os.path.join(path, filename)
+    if not os.path.isfile(filepath):
+        parser.error(f'file not found: {filepath}')
+
+    return path
+
+
+def dry_run(args):
+    """Parses the files of a sync or rebuild and reports the throughput.
+    """
+    path = default_path(args.path)
+    workers = args.workers or 1
+
+    if args.command == 'rebuild':
+        report = parse_report([args.file or 'Recipe.bsmx'], path, 1, args.cache_dir)
+        print_report('rebuild (dry run)', report)
+        return 0
+
+    archive_report = parse_report([args.file or 'Archive.bsmx'], path, 1, args.cache_dir)
+    print_report('archive', archive_report)
+    archive_list = next(iter(archive_report['parsed'].values()))
+    filenames = list(dict.fromkeys(
+        archive['file'] for archive in archive_list
+        if archive['action'] in ('Add Recipe', 'Insert/Paste', 'Edit', 'Move')
+    ))
+    print_report('sync (dry run)', parse_report(filenames, path, workers, args.cache_dir))
+
+    return 0
+
+
+def run_sync(args, mdb=None):
+    """Runs a sync or rebuild.
+    """
+    from beersmith_direct.recipes import Recipes
+
+    if args.libraries:
+        return run_libraries(args, mdb)
+
+    recipes = Recipes(
+        collection_name=args.collection, mdb=mdb, batch_size=args.batch_size,
+        checkpoint_interval=args.checkpoint_interval, workers=args.workers,
+        cache_dir=args.cache_dir, memory_budget=args.memory_budget
+    )
+    recipes.stats.enabled = True
+    if args.command == 'rebuild':
+        stats = recipes.rebuild(args.file or 'Recipe.bsmx', args.path)
+    else:
+        stats = recipes.pull(args.file, args.path)
+    print(f'{args.command}: {stats.summary()}')
+
+    return 1 if stats.errors else 0
+
+
+def run_libraries(args, mdb=None):
+    """Runs a sync or rebuild of several libraries.
+    """
+    from beersmith_direct.libraries import LibrarySync, read_libraries
+
+    library_sync = LibrarySync(
+        read_libraries(args.libraries), mdb=mdb, library_workers=args.library_workers,
+        batch_size=args.batch_size, checkpoint_interval=args.checkpoint_interval,
+        workers=args.workers, cache_dir=args.cache_dir, memory_budget=args.memory_budget
+    )
+    stats = library_sync.run(rebuild=args.command == 'rebuild')
+    print(library_sync.report())
+
+    return 1 if stats.errors else 0
+
+
+def run_parse(args):
+    """Parses one file and reports the throughput.
+    """
+    path = default_path(args.path)
+    print_report('parse', parse_report([args.file], path, 1, args.cache_dir))
+
+    return 0
+
+
+def run_export(args):
+    """Exports the recipes of a file.
+    """
+    from beersmith_direct.export import export_bsmx
+
+    start = time.perf_counter()
+    rows = export_bsmx(
+        args.file, default_path(args.path), args.out, formats=args.format,
+        chunk_rows=args.chunk_rows, compression=args.compression
+    )
+    seconds = time.perf_counter() - start
+    tables = ', '.join(f'{table}={count}' for table, count in rows.items())
+    print(f'export: {tables} in {seconds:.3f}s')
+
+    return 0
+
+
+def run_indexes(args, mdb=None):
+    """Creates the missing indexes and reports their usage.
+    """
+    from beersmith_direct.recipes import Recipes
+
+    recipes = Recipes(collection_name=args.collection, mdb=mdb, manage_indexes=True)
+    unused = set(recipes.indexes.unused())
+    for collection_name, usage in recipes.indexes.usage().items():
+        for name, ops in usage.items():
+            label = ' (unused)' if f'{collection_name}.{name}' in unused else ''
+            print(f'{collection_name}.{name}: {ops} ops{label}')
+
+    return 0
+
+
+def run_ingredients(args, mdb=None):
+    """Prints the entries of the ingredient catalog.
+    """
+    from beersmith_direct.recipes import Recipes
+
+    recipes = Recipes(collection_name=args.collection, mdb=mdb, catalog=True)
+    for entry in recipes.find_ingredients(args.type, args.name):
+        form = f' (form {entry["form"]})' if entry['form'] is not None else ''
+        print(
+            f'{entry["ingredient_type"]}: {entry["props"].get("name", entry["name"])}{form}: '
+            f'{entry["usage_count"]} uses in {len(entry["recipes"])} recipes'
+        )
+
+    return 0
+
+
+def run_bench(args):
+    """Runs the benchmarks.
+    """
+    from beersmith_direct.bench import (
+        check_baselines, load_baselines, run_benchmarks, save_baselines
+    )
+    from beersmith_direct.corpus import CorpusSpec
+
+    spec = CorpusSpec(
+        recipe_count=args.recipes, archive_actions=args.archive_actions,
+        folder_depth=args.folder_depth
+    )
+    results = run_benchmarks(spec, args.path, args.names)
+    for result in results:
+        print(
+            f'{result.name}: {result.items} items in {result.seconds:.3f}s '
+            f'({result.items_per_sec:.1f} items/sec, {result.mb_per_sec:.3f} MB/sec)'
+        )
+
+    if args.baselines and args.save:
+        save_baselines(results, args.baselines, spec)
+    elif args.baselines:
+        regressions = check_baselines(results, load_baselines(args.baselines))
+        for regression in regressions:
+            print(f'regression: {regression}')
+        if regressions:
+            return 1
+
+    return 0
+
+
+def main(argv=None, mdb=None):
+    """Runs the command line interface.
+
+    Args:
+        argv: List of arguments. Defaults to sys.argv.
+        mdb: Database object to use instead of connecting to MongoDB.
+
+    Returns:
+        The exit status.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command in ('parse', 'export'):
+        args.path = checked_path(parser, args.path, args.file)
+    elif args.command in ('sync', 'rebuild') and args.dry_run:
+        default_file = 'Recipe.bsmx' if args.command == 'rebuild' else 'Archive.bsmx'
+        args.path = checked_path(parser, args.path, args.file or default_file)
+
+    logging.basicConfig(
+        level={0: logging.WARNING, 1: logging.INFO}.get(args.verbose, logging.DEBUG)
+    )
+    if mdb is None and args.command in ('sync', 'rebuild', 'indexes', 'ingredients'):
+        from beersmith_direct.storage import open_database
+        mdb = open_database(args.database)
+
+    if args.command in ('sync', 'rebuild'):
+        if args.dry_run:
+            return dry_run(args)
+        return run_sync(args, mdb)
+    if args.command == 'parse':
+        return run_parse(args)
+    if args.command == 'export':
+        return run_export(args)
+    if args.command == 'indexes':
+        return run_indexes(args, mdb)
+    if args.command == 'ingredients':
+        return run_ingredients(args, mdb)
+
+    return run_bench(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""Class module that caches configuration properties.
+
+The configuration properties live in a MongoDB collection, through
+aracnid_config. Without a cache, every Connector reads the configuration set
+when it is created and every property assignment writes the whole set back.
+The CachedConfig class keeps the properties in memory for a time-to-live,
+collects property assignments, and writes them back as one update on flush().
+
+The caches are shared per configuration set and database (see
+cached_config()), and nothing notifies a cache of the writes of other
+processes: a property written by another process, such as the rebuild flag
+set by a sync that found a rename, is seen once the time-to-live expires
+(BEERSMITH_CONFIG_TTL seconds), or on the next read after invalidate(). A
+process that must act on the flag at once calls invalidate() before reading
+it. On a reload, the properties assigned and not flushed yet by this process
+are kept over the stored values.
+
+flush() writes the assigned properties only, with one $set update, so the
+stale values of the cache never overwrite the properties that other
+processes wrote meanwhile.
+"""
+# pylint: disable=logging-fstring-interpolation
+# pylint: disable=import-outside-toplevel
+
+import logging
+import os
+import time
+
+# initialize logging
+logger = logging.getLogger(__name__)
+
+# default time-to-live of the cached properties, in seconds
+CONFIG_TTL_DEFAULT = 60.0
+
+# shared caches of the default database, keyed by configuration set name;
+# the caches of an injected database are kept by the database object
+_cache_registry = {}
+
+# attribute of an injected database that holds its shared caches
+_CACHES_ATTRIBUTE = '_beersmith_config_caches'
+
+
+class CachedConfig:
+    """Caches a configuration set and coalesces property writes.
+
+    Properties are read and assigned as attributes, like an aracnid_config
+    Config object. Assignments are held as dirty properties until flush() (or
+    update()) is called, so that several assignments result in one write.
+
+    Environment Variables:
+        BEERSMITH_CONFIG_TTL: Time-to-live of the cached properties, in seconds.
+
+    Attributes:
+        name: The name of the configuration set.
+        ttl: Time-to-live of the cached properties, in seconds.
+        metrics: Dictionary of cache counters.
+    """
+
+    reserved = [
+        'name',
+        'ttl',
+        'metrics',
+    ]
+
+    def __init__(self, name, ttl=None, config=None, mdb=None):
+        """Initializes the cache without reading the configuration set.
+
+        Args:
+            name: The name of the configuration set.
+            ttl: Time-to-live of the cached properties, in seconds.
+            config: Configuration object to wrap. If not supplied, an
+                aracnid_config Config object is created on first access.
+            mdb: MongoDB database used to create the Config object.
+        """
+        self.name = name
+        if ttl is None:
+            ttl = float(os.environ.get('BEERSMITH_CONFIG_TTL', CONFIG_TTL_DEFAULT))
+        self.ttl = ttl
+        self.metrics = {
+            'hits': 0,
+            'loads': 0,
+            'assignments': 0,
+            'flushes': 0,
+            'coalesced': 0,
+        }
+
+        self._config = config
+        self._mdb = mdb
+        self._dirty = {}
+        self._assignments = 0
+        self._loaded_at = None if config is None else time.monotonic()
+
+    def _get_config(self):
+        """Returns the wrapped configuration object, reading it if expired.
+        """
+        now = time.monotonic()
+
+        if self._config is None:
+            from aracnid_config import Config
+
+            self._config = Config(self.name, mdb=self._mdb)
+            self._config.auto_update = False
+            self._loaded_at = now
+            self.metrics['loads'] += 1
+
+        elif self._loaded_at is None or now - self._loaded_at > self.ttl:
+            self._config.load_properties(self.name)
+            self._config.props.update(self._dirty)
+            self._loaded_at = now
+            self.metrics['loads'] += 1
+
+        else:
+            self.metrics['hits'] += 1
+
+        return self._config
+
+    @property
+    def props(self):
+        """Returns the entire configuration set.
+        """
+        return self._get_config().props
+
+    @property
+    def dirty(self):
+        """Returns the names of properties assigned since the last flush.
+        """
+        return set(self._dirty)
+
+    def __getattr__(self, prop_name):
+        """Reads the specified configuration property.
+
+        Args:
+            prop_name: The property name.
+
+        Returns:
+            The value of the specified property, or None if not set.
+        """
+        if prop_name.startswith('_'):
+            raise AttributeError(prop_name)
+
+        return self.props.get(prop_name)
+
+    def __getitem__(self, prop_name):
+        """Reads a specific configuration property, via subscripting.
+
+        Args:
+            prop_name: The property name.
+
+        Returns:
+            The value of the specified property, or None if not set.
+        """
+        return self.__getattr__(prop_name)
+
+    def __setattr__(self, prop_name, val):
+        """Sets a configuration property without writing it.
+
+        Args:
+            prop_name: The property name.
+            val: The value of the specified property.
+        """
+        if prop_name in CachedConfig.reserved or prop_name.startswith('_'):
+            super().__setattr__(prop_name, val)
+            return
+
+        self.props[prop_name] = val
+        self._dirty[prop_name] = val
+        self._assignments += 1
+        self.metrics['assignments'] += 1
+
+    def __setitem__(self, prop_name, val):
+        """Sets a configuration property, via subscripting.
+
+        Args:
+            prop_name: The property name.
+            val: The value of the specified property.
+        """
+        self.__setattr__(prop_name, val)
+
+    def flush(self):
+        """Writes the dirty properties in one update.
+
+        Only the dirty properties are set in the stored configuration set,
+        the other properties are left as they are.
+
+        Returns:
+            True if the configuration set was written.
+        """
+        if not self._dirty:
+            return False
+
+        config = self._get_config()
+        collection = getattr(config, '_collection', None)
+        if collection is None:
+            config.update()
+        else:
+            collection.update_one(
+                {'_id': self.name},
+                {'$set': {f'props.{prop_name}': val for prop_name, val in self._dirty.items()}},
+                upsert=True
+            )
+        logger.debug(f'flushed config properties: {sorted(self._dirty)}')
+        self.metrics['coalesced'] += self._assignments - 1
+        self.metrics['flushes'] += 1
+        self._dirty = {}
+        self._assignments = 0
+
+        return True
+
+    def update(self):
+        """Writes the dirty properties, same as flush().
+
+        Kept for compatibility with the aracnid_config Config interface.
+        """
+        self.flush()
+
+    def delete(self):
+        """Deletes the entire configuration set and clears the cache.
+        """
+        self._get_config().delete()
+        self._dirty = {}
+        self._assignments = 0
+
+    def invalidate(self):
+        """Forces the next read to reload the configuration set.
+        """
+        self._loaded_at = None
+
+
+def cached_config(name, ttl=None, mdb=None):
+    """Returns the shared CachedConfig object for a configuration set.
+
+    Connectors created for the same configuration set and database share one
+    cache, so short-lived connectors do not each read the configuration
+    collection. A connector on another database gets its own cache, created
+    with that database. The caches of an injected database are kept by the
+    database object, so they are released with it.
+
+    Args:
+        name: The name of the configuration set.
+        ttl: Time-to-live of the cached properties, in seconds.
+        mdb: MongoDB database used to create the Config object.
+
+    Returns:
+        The CachedConfig object.
+    """
+    registry = _cache_registry
+    if mdb is not None:
+        registry = getattr(mdb, _CACHES_ATTRIBUTE, None)
+        if registry is None:
+            registry = {}
+            setattr(mdb, _CACHES_ATTRIBUTE, registry)
+
+    config = registry.get(name)
+    if config is None:
+        config = CachedConfig(name, ttl=ttl, mdb=mdb)
+        registry[name] = config
+
+    return config
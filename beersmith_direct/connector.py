@@ -1,22 +1,21 @@
 """Class module that connects to both Beersmith and MongoDB.
 """
 # pylint: disable=logging-fstring-interpolation
+# pylint: disable=import-outside-toplevel
 
 from datetime import datetime
 import os
 
-from aracnid_config import Config
 from aracnid_logger import Logger
-from aracnid_utils import timespan as ts
 from i_mongodb import MongoDBInterface
 
+from beersmith_direct.config_cache import cached_config
 from beersmith_direct.i_beersmith import BeersmithInterface
+from beersmith_direct.storage import open_database
 
 # initialize logging
 logger = Logger(__name__).get_logger()
 
-logger.debug('module installed')
-
 
 class Connector(MongoDBInterface):
     """Provides interfaces to Beersmith and MongoDB to enable data exchange.
@@ -26,28 +25,99 @@ class Connector(MongoDBInterface):
     type. The attributes and instance methods help with this.
 
     Environment Variables:
-        TBD
+        BEERSMITH_DATABASE: URL or path of the database, for example
+            sqlite:///recipes.db, MongoDB if not set (see
+            beersmith_direct.storage).
 
     Attributes:
         config_name: Name of the configuration object in MongoDB.
-        props: Configuration Properties object.
+        props: Cached configuration properties object.
+        stats: SyncStats object of the current run, shared with bsm.
+        profile: ProfileSettings object of the profiling mode, shared with bsm.
     """
 
-    def __init__(self, config_name=None):
+    def __init__(self, config_name=None, mdb=None, profile=None):
         """Initializes the interfaces and instance attributes.
-        """
-        self.bsm = BeersmithInterface()
-        MongoDBInterface.__init__(self)
-        self.mdb = MongoDBInterface().get_mdb()
 
-        # initialize configuration properties
+        Args:
+            config_name: Name of the configuration object in MongoDB.
+            mdb: Database object to use instead of connecting to MongoDB,
+                for example a beersmith_direct.memory.MemoryDatabase.
+                Defaults to the database of BEERSMITH_DATABASE.
+            profile: ProfileSettings object, or a boolean to enable profiling.
+                Defaults to the settings from the environment.
+        """
+        self.bsm = BeersmithInterface(profile=profile)
+        self.stats = self.bsm.stats
+        self.profile = self.bsm.profile
+        if mdb is None:
+            mdb = open_database()
+        if mdb is None:
+            MongoDBInterface.__init__(self)
+            self.mdb = MongoDBInterface().get_mdb()
+        else:
+            self.mdb = mdb
+            self.db_name = mdb.name
+        self._mdb_injected = mdb is not None
+
+        # initialize configuration properties, read on first access
         self.config_name = config_name
+        self._props = None
         if config_name:
             logger.debug(f'config_name: {self.config_name}')
-            self.props = Config(self.config_name)
 
         self.set_start_min()
 
+    @property
+    def props(self):
+        """Returns the cached configuration properties.
+
+        The configuration set is shared by all connectors with the same
+        config_name and database and is read from MongoDB on first access.
+        The writes of other processes are seen once the cache expires (see
+        beersmith_direct.config_cache).
+        """
+        if self._props is None and self.config_name:
+            self._props = cached_config(
+                self.config_name, mdb=self.mdb if self._mdb_injected else None
+            )
+
+        return self._props
+
+    def start_stats(self):
+        """Starts new statistics for a run.
+
+        The new statistics keep the settings and hooks of the previous ones.
+
+        Returns:
+            The new SyncStats object.
+        """
+        self.stats = self.stats.new_run()
+        self.bsm.stats = self.stats
+
+        return self.stats
+
+    def finish_stats(self):
+        """Logs the statistics of a run and writes the metrics file, if set.
+
+        Environment Variables:
+            BEERSMITH_STATS_FILE: Path of a Prometheus metrics file that is
+                written after each run.
+
+        Returns:
+            The SyncStats object of the run.
+        """
+        if self.stats.enabled:
+            logger.debug(f'sync stats: {self.stats.summary()}')
+
+            stats_file = os.environ.get('BEERSMITH_STATS_FILE')
+            if stats_file:
+                self.stats.write_prometheus(
+                    stats_file, labels={'config': self.config_name or ''}
+                )
+
+        return self.stats
+
     def set_start_min(self):
         """Sets an attribute for the minimum start time.
 
@@ -57,7 +127,9 @@ class Connector(MongoDBInterface):
             None
         """
         start_str = os.environ.get('BEERSMITH_START_STR')
-        self.start_min = datetime.fromisoformat(start_str).astimezone()
+        self.start_min = None
+        if start_str:
+            self.start_min = datetime.fromisoformat(start_str).astimezone()
 
     def timespan(self, **kwargs):
         """Calculates the endpoints of a timespan.
@@ -72,6 +144,8 @@ class Connector(MongoDBInterface):
         Returns:
             The start and end datetime objects that define the timespan.
         """
+        from aracnid_utils import timespan as ts
+
         begin = kwargs.get('begin')
         begin_str = kwargs.get('begin_str')
         week_str = kwargs.get('week_str')
@@ -0,0 +1,414 @@
+"""Generator of synthetic BeerSmith libraries and archives.
+
+The generated files follow the layout of the .bsmx files written by BeerSmith
+(see the fixtures in the tests directory), so they exercise the same parsing
+and normalization code as real libraries. The output is deterministic for a
+given CorpusSpec.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import os
+import random
+from xml.sax.saxutils import escape
+
+# default mix of archive actions, as relative weights
+DEFAULT_ACTION_MIX = {
+    'Add Recipe': 2,
+    'Edit': 6,
+    'Move': 1,
+    'Delete/Cut': 1,
+}
+
+ARCHIVE_START = datetime(2021, 1, 1, 8, 0, 0)
+
+GRAINS = [
+    ('Pale Malt (2-Row)', 2.0, 79.0, 0),
+    ('Pilsner (2 Row) Ger', 2.0, 81.0, 0),
+    ('Munich Malt', 9.0, 80.0, 0),
+    ('Caramel/Crystal Malt - 60L', 60.0, 74.0, 0),
+    ('Chocolate Malt', 350.0, 60.0, 0),
+    ('White Wheat Malt', 2.4, 86.0, 0),
+    ('Light Dry Extract', 8.0, 95.0, 4),
+    ('Corn Sugar (Dextrose)', 0.0, 100.0, 2),
+    ('Flaked Oats', 1.0, 80.0, 3),
+]
+HOPS = [
+    ('Cascade', 6.3), ('Centennial', 9.9), ('Citra', 12.0), ('Mosaic', 12.3),
+    ('Simcoe', 13.0), ('Saaz', 3.8), ('Hallertauer', 4.8), ('Magnum', 14.0),
+]
+YEASTS = [
+    ('SafAle American Ale Yeast', 'DCL/Fermentis', 'US-05'),
+    ('London Ale', 'Wyeast Labs', '1028'),
+    ('California Ale', 'White Labs', 'WLP001'),
+    ('Saflager Lager', 'DCL/Fermentis', 'W-34/70'),
+]
+MISCS = [
+    ('Calcium Carbonate', 5), ('Whirlfloc Tablet', 1), ('Coriander Seed', 0),
+    ('Orange Peel, Bitter', 0), ('Gypsum (Calcium Sulfate)', 5), ('Vanilla Bean', 3),
+]
+STYLES = [
+    ('American Amber Ale', 'Amber and Brown American Beer', 19, 1),
+    ('American IPA', 'IPA', 21, 1),
+    ('German Pils', 'Pale Bitter European Beer', 5, 4),
+    ('Sweet Stout', 'Dark British Beer', 16, 1),
+    ('Witbier', 'Belgian Ale', 24, 1),
+    ('Kolsch', 'Pale Bitter European Beer', 5, 2),
+]
+PROSE = [
+    'Base malt for all beer styles',
+    'Adds body, color and improves head retention.',
+    'Used for: General purpose bittering, aroma in American ales',
+    'Clean, crisp flavor with low diacetyl',
+]
+
+
+@dataclass
+class CorpusSpec:
+    """Parameters of a synthetic corpus.
+
+    Attributes:
+        recipe_count: Number of recipes in the library.
+        folder_depth: Nesting depth of folders, 0 puts all recipes in the root.
+        folders_per_level: Number of subfolders in each folder.
+        ingredients_per_recipe: Number of ingredients in each recipe.
+        mash_steps: Number of mash steps in each recipe.
+        readings_per_recipe: Number of fermentation readings in each recipe.
+        notes_density: Fraction of recipes and ingredients with hjson notes.
+        equipment_profiles: Number of distinct equipment profiles.
+        style_profiles: Number of distinct styles, at most len(STYLES).
+        archive_actions: Number of actions in the archive.
+        action_mix: Relative weights of the archive actions.
+        seed: Seed of the random generator.
+    """
+    recipe_count: int = 100
+    folder_depth: int = 1
+    folders_per_level: int = 2
+    ingredients_per_recipe: int = 12
+    mash_steps: int = 2
+    readings_per_recipe: int = 0
+    notes_density: float = 0.3
+    equipment_profiles: int = 3
+    style_profiles: int = 5
+    archive_actions: int = 0
+    action_mix: dict = field(default_factory=lambda: dict(DEFAULT_ACTION_MIX))
+    seed: int = 0
+
+
+def recipe_name(index):
+    """Returns the name of the generated recipe with the given index.
+
+    Args:
+        index: Index of the recipe in the library.
+
+    Returns:
+        The recipe name.
+    """
+    return f'Recipe {index:06d}'
+
+
+def folder_paths(spec):
+    """Returns the paths of the leaf folders, in library order.
+
+    Args:
+        spec: The corpus specification.
+
+    Returns:
+        List of folder name tuples, one per leaf folder.
+    """
+    paths = [()]
+    for level in range(spec.folder_depth):
+        paths = [
+            path + (f'folder-{level + 1}-{num + 1}',)
+            for path in paths
+            for num in range(spec.folders_per_level)
+        ]
+
+    return paths
+
+
+def _fields(prefix, values):
+    """Returns the tagged fields of a record.
+    """
+    return ''.join(
+        f'<{prefix}{key}>{escape(str(val))}</{prefix}{key}>\n'
+        for key, val in values.items()
+    )
+
+
+def _table(name, xname, items, size):
+    """Returns a BeerSmith table wrapping the given items.
+    """
+    return (
+        f'<_MOD_>2021-11-17</_MOD_>\n<Name>{escape(name)}</Name>\n'
+        f'<Type>7372</Type>\n<Dirty>0</Dirty>\n<Owndata>1</Owndata>\n'
+        f'<TID>1</TID>\n<Size>{size}</Size>\n<_XName>{xname}</_XName>\n'
+        f'<Allocinc>16</Allocinc>\n<Data>{items}</Data>\n<_TExpanded>1</_TExpanded>\n'
+    )
+
+
+def _notes(rng, spec, hjson_fields):
+    """Returns notes text, hjson fields for a fraction of the records.
+    """
+    if rng.random() < spec.notes_density:
+        return '\n'.join(f'{key}: {val}' for key, val in hjson_fields.items())
+
+    return rng.choice(PROSE) if rng.random() < 0.5 else ''
+
+
+def _ingredient_xml(rng, spec, order):
+    """Returns the markup of one random ingredient.
+    """
+    kind = rng.choices(['Grain', 'Hops', 'Yeast', 'Misc'], weights=[5, 4, 1, 2])[0]
+
+    if kind == 'Grain':
+        name, color, yield_pct, grain_type = rng.choice(GRAINS)
+        body = _fields('F_G_', {
+            'NAME': name, 'ORIGIN': 'US', 'SUPPLIER': 'Briess', 'TYPE': grain_type,
+            'AMOUNT': f'{rng.uniform(8, 200):.7f}', 'COLOR': f'{color:.7f}',
+            'YIELD': f'{yield_pct:.7f}', 'PRICE': f'{rng.uniform(0.02, 0.2):.7f}',
+            'NOTES': _notes(rng, spec, {'supplier': 'Briess', 'lot': rng.randint(1, 999)}),
+        })
+    elif kind == 'Hops':
+        name, alpha = rng.choice(HOPS)
+        body = _fields('F_H_', {
+            'NAME': f'{name} Hops', 'ORIGIN': 'US', 'TYPE': rng.randint(0, 2),
+            'FORM': rng.choice([0, 0, 0, 1, 2]), 'ALPHA': f'{alpha:.7f}',
+            'AMOUNT': f'{rng.uniform(0.25, 4):.7f}',
+            'BOIL_TIME': f'{rng.choice([60, 30, 15, 5, 0]):.7f}',
+            'USE': rng.randint(0, 2), 'PRICE': f'{rng.uniform(1, 3):.7f}',
+            'NOTES': _notes(rng, spec, {'crop': 2021, 'farm': 'Yakima'}),
+        })
+    elif kind == 'Yeast':
+        name, lab, product_id = rng.choice(YEASTS)
+        body = _fields('F_Y_', {
+            'NAME': name, 'LAB': lab, 'PRODUCT_ID': product_id, 'TYPE': 0,
+            'FORM': rng.randint(0, 3), 'AMOUNT': f'{rng.uniform(10, 200):.7f}',
+            'MIN_ATTENUATION': '73.0000000', 'MAX_ATTENUATION': '80.0000000',
+            'NOTES': _notes(rng, spec, {'units': 'g', 'origin': 'US', 'producer': lab}),
+        })
+    else:
+        name, misc_type = rng.choice(MISCS)
+        body = _fields('F_M_', {
+            'NAME': name, 'TYPE': misc_type, 'AMOUNT': f'{rng.uniform(0.1, 10):.7f}',
+            'USE': rng.randint(0, 3), 'TIME': '10.0000000',
+            'NOTES': _notes(rng, spec, {'use': 'boil'}),
+        })
+
+    return f'<{kind}><_MOD_>2021-11-16</_MOD_>\n{body}<F_ORDER>{order}</F_ORDER>\n</{kind}>\n'
+
+
+def recipe_xml(spec, index, folder='', brewer='Brewer', rng=None):
+    """Returns the markup of one generated recipe.
+
+    Args:
+        spec: The corpus specification.
+        index: Index of the recipe in the library.
+        folder: The BeerSmith folder name of the recipe.
+        brewer: The brewer of the recipe.
+        rng: Random generator. If not supplied, a generator is seeded from the
+            spec and the recipe index.
+
+    Returns:
+        The recipe markup.
+    """
+    if rng is None:
+        rng = random.Random(f'{spec.seed}:{index}')
+
+    equipment_num = index % max(spec.equipment_profiles, 1)
+    style_count = max(min(spec.style_profiles, len(STYLES)), 1)
+    style_name, category, number, letter = STYLES[index % style_count]
+
+    ingredients = ''.join(
+        _ingredient_xml(rng, spec, order) for order in range(spec.ingredients_per_recipe)
+    )
+    mash_steps = ''.join(
+        '<MashStep><_MOD_>2021-11-17</_MOD_>\n' + _fields('F_MS_', {
+            'NAME': f'Step {num + 1}', 'TYPE': 0, 'STEP_TEMP': f'{148 + num * 4:.7f}',
+            'STEP_TIME': f'{60 - num * 10:.7f}', 'INFUSION': '5680.0000000',
+        }) + '</MashStep>\n'
+        for num in range(spec.mash_steps)
+    )
+    readings = ''.join(
+        '<AgeData><_MOD_>2021-11-17</_MOD_>\n' + _fields('F_AD_', {
+            'DATE': (ARCHIVE_START + timedelta(days=num)).date().isoformat(),
+            'GRAVITY': f'{1.050 - num * 0.004:.7f}', 'TEMP': f'{rng.uniform(62, 70):.7f}',
+        }) + '</AgeData>\n'
+        for num in range(spec.readings_per_recipe)
+    )
+
+    return (
+        '<Recipe><_MOD_>2021-11-17</_MOD_>\n'
+        + _fields('F_R_', {
+            'NAME': recipe_name(index), 'BREWER': brewer, 'ASST_BREWER': '',
+            'DATE': '2021-11-16', 'FOLDER_NAME': folder, 'BOIL_TIMER': 0,
+        })
+        + '<F_R_EQUIPMENT><_MOD_>2021-11-16</_MOD_>\n' + _fields('F_E_', {
+            'NAME': f'Brew House {equipment_num + 1}', 'MASH_VOL': '10240.0000000',
+            'BOIL_VOL': f'{9000 + equipment_num * 256:.7f}', 'BOIL_TIME': '60.0000000',
+            'BATCH_VOL': f'{8448 + equipment_num * 128:.7f}', 'EFFICIENCY': '70.0000000',
+            'HOP_UTIL': '125.0000000', 'NOTES': '',
+        }) + '</F_R_EQUIPMENT>\n'
+        + '<F_R_STYLE><_MOD_>2021-11-16</_MOD_>\n' + _fields('F_S_', {
+            'NAME': style_name, 'CATEGORY': category, 'GUIDE': 'BJCP 2015',
+            'LETTER': letter, 'NUMBER': number, 'MIN_OG': '1.0450000', 'MAX_OG': '1.0600000',
+            'MIN_IBU': '25.0000000', 'MAX_IBU': '40.0000000',
+        }) + '</F_R_STYLE>\n'
+        + '<F_R_MASH><_MOD_>2021-11-16</_MOD_>\n' + _fields('F_MH_', {
+            'NAME': 'Infusion_150', 'GRAIN_WEIGHT': '2272.0000000', 'PH': '5.4000000',
+        })
+        + '<steps>' + _table('steps', 'steps', mash_steps, spec.mash_steps) + '</steps>\n'
+        + '</F_R_MASH>\n'
+        + '<F_R_BASE_GRAIN><_MOD_>2021-11-16</_MOD_>\n' + _fields('F_G_', {
+            'NAME': 'Malt', 'TYPE': 0, 'AMOUNT': '16.0000000', 'COLOR': '3.0000000',
+        }) + '</F_R_BASE_GRAIN>\n'
+        + '<F_R_CARB><_MOD_>2021-11-16</_MOD_>\n' + _fields('F_C_', {
+            'NAME': 'Keg, Brew House Standard', 'TEMPERATURE': '37.0000000', 'TYPE': 1,
+        }) + '</F_R_CARB>\n'
+        + '<F_R_AGE><_MOD_>2021-11-17</_MOD_>\n' + _fields('F_A_', {
+            'NAME': 'Ale: Dry Hop', 'PRIM_TEMP': '67.0000000', 'PRIM_DAYS': '7.0000000',
+        }) + '</F_R_AGE>\n'
+        + '<Ingredients>' + _table('Ingredients', 'Ingredients', ingredients,
+                                   spec.ingredients_per_recipe) + '</Ingredients>\n'
+        + '<AgeData>' + _table('AgeData', 'AgeData', readings,
+                               spec.readings_per_recipe) + '</AgeData>\n'
+        + _fields('F_R_', {
+            'TYPE': 2, 'OG_MEASURED': '0.0000000',
+            'NOTES': _notes(rng, spec, {'batch': index, 'tank': f'FV{index % 8 + 1}'}),
+            'RATING': '30.0000000', 'CARB_VOLS': '2.5000000', 'VERSION': '1.0000000',
+            'DESIRED_IBU': f'{rng.uniform(15, 70):.7f}',
+        })
+        + '</Recipe>\n'
+    )
+
+
+def library_xml(spec):
+    """Returns the markup of a generated recipe library.
+
+    The recipes are spread round-robin over the leaf folders.
+
+    Args:
+        spec: The corpus specification.
+
+    Returns:
+        The library markup.
+    """
+    leaves = folder_paths(spec)
+    recipes_by_leaf = {leaf: [] for leaf in leaves}
+    for index in range(spec.recipe_count):
+        leaf = leaves[index % len(leaves)]
+        recipes_by_leaf[leaf].append(recipe_xml(spec, index, folder='/'.join(leaf)))
+
+    def folder_xml(path):
+        if len(path) == spec.folder_depth:
+            items = recipes_by_leaf[path]
+            return ''.join(items), len(items)
+
+        children = [path + (f'folder-{len(path) + 1}-{num + 1}',)
+                    for num in range(spec.folders_per_level)]
+        items = ''.join(
+            '<Table>' + _table(child[-1], 'Folder', *folder_xml(child)) + '</Table>\n'
+            for child in children
+        )
+        return items, len(children)
+
+    items, size = folder_xml(())
+
+    return '<Selections>' + _table('Selections', 'Selections', items, size) + '</Selections>'
+
+
+def selection_xml(spec, index, brewer='Brewer'):
+    """Returns the markup of a selection file with one recipe.
+
+    Args:
+        spec: The corpus specification.
+        index: Index of the recipe.
+        brewer: The brewer of the recipe.
+
+    Returns:
+        The selection markup.
+    """
+    return '<Selections>' + _table(
+        'Selections', 'Selections', recipe_xml(spec, index, brewer=brewer), 1
+    ) + '</Selections>'
+
+
+def write_library(spec, path, filename='Recipe.bsmx'):
+    """Writes a generated recipe library.
+
+    Args:
+        spec: The corpus specification.
+        path: Directory of the library file.
+        filename: Name of the library file.
+
+    Returns:
+        Path of the written file.
+    """
+    filepath = os.path.join(path, filename)
+    with open(filepath, 'w', encoding='UTF-8') as bsmx_file:
+        bsmx_file.write(library_xml(spec))
+
+    return filepath
+
+
+def write_archive(spec, path, filename='Archive.bsmx'):
+    """Writes a generated archive and the recipe files of its actions.
+
+    The actions refer to the recipes of the library written with the same
+    spec. Added recipes get indexes after the library recipes, deleted
+    recipes are not referenced by later actions.
+
+    Args:
+        spec: The corpus specification.
+        path: Directory of the archive and recipe files.
+        filename: Name of the archive file.
+
+    Returns:
+        List of archive actions, as dictionaries.
+    """
+    rng = random.Random(f'{spec.seed}:archive')
+    actions = list(spec.action_mix)
+    weights = [spec.action_mix[action] for action in actions]
+
+    live = list(range(spec.recipe_count))
+    next_index = spec.recipe_count
+    archive_list = []
+    for num in range(spec.archive_actions):
+        action = rng.choices(actions, weights=weights)[0]
+        if action != 'Add Recipe' and not live:
+            action = 'Add Recipe'
+
+        if action in ('Add Recipe', 'Insert/Paste'):
+            index = next_index
+            next_index += 1
+            live.append(index)
+        else:
+            index = rng.choice(live)
+            if action == 'Delete/Cut':
+                live.remove(index)
+
+        # write the recipe file of the action
+        recipe_file = f'archive-{num:06d}.bsmx'
+        with open(os.path.join(path, recipe_file), 'w', encoding='UTF-8') as bsmx_file:
+            bsmx_file.write(selection_xml(spec, index, brewer=f'Brewer {num}'))
+
+        archive_list.append({
+            'name': recipe_name(index),
+            'date': (ARCHIVE_START + timedelta(minutes=num)).strftime('%Y-%m-%d %H:%M:%S'),
+            'action': action,
+            'directory': '/',
+            'file': recipe_file,
+        })
+
+    with open(os.path.join(path, filename), 'w', encoding='UTF-8') as bsmx_file:
+        for archive in archive_list:
+            bsmx_file.write(
+                f'<Archive><_MOD_>{archive["date"][:10]}</_MOD_>\n'
+                f'<F_AR_NAME>{escape(archive["name"])}</F_AR_NAME>\n'
+                f'<Date>{archive["date"]}</Date>\n'
+                f'<F_AR_ACTION>{archive["action"]}</F_AR_ACTION>\n'
+                f'<F_AR_DIRECTORY>{archive["directory"]}</F_AR_DIRECTORY>\n'
+                f'<F_AR_FILE>{archive["file"]}</F_AR_FILE>\n'
+                '</Archive>\n'
+            )
+
+    return archive_list
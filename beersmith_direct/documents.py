@@ -0,0 +1,559 @@
+"""Documents and collections of the storage backends.
+
+The functions implement the MongoDB document semantics shared by the
+backends (beersmith_direct.memory and beersmith_direct.sqlite): filters
+support equality on (dotted) fields, matching array elements, and the $in,
+$nin, $ne, $gt, $gte, $lt, $lte and $exists operators; updates support
+$set, $unset, $inc, $max, $setOnInsert, $addToSet and $pull.
+
+DocumentCollection implements the pymongo collection methods on the
+storage methods of a backend (_find_docs(), _insert(), _replace(),
+_update(), _delete() and the index methods), which run in the
+_transaction() of the call. The documents returned by _find_docs() are not
+copies: the collection methods copy them (see _project()) before returning
+them.
+"""
+# pylint: disable=redefined-builtin,unused-argument
+
+from contextlib import nullcontext
+from copy import deepcopy
+import operator
+
+_COMPARISONS = {
+    '$gt': operator.gt,
+    '$gte': operator.ge,
+    '$lt': operator.lt,
+    '$lte': operator.le,
+}
+
+
+def _get_field(doc, key):
+    """Returns the values of a dotted field, descending into arrays.
+    """
+    values = [doc]
+    for part in key.split('.'):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    next_values.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    next_values.append(value[int(part)])
+                else:
+                    next_values.extend(
+                        item[part] for item in value
+                        if isinstance(item, dict) and part in item
+                    )
+        values = next_values
+
+    return values
+
+
+def _match_value(values, condition):
+    """Returns True if any value of a field satisfies the condition.
+    """
+    # expand arrays, so that a condition matches the array or any element
+    candidates = []
+    for value in values:
+        candidates.append(value)
+        if isinstance(value, list):
+            candidates.extend(value)
+
+    if isinstance(condition, dict) and condition and next(iter(condition)).startswith('$'):
+        for op, arg in condition.items():
+            if op == '$in':
+                if not any(value in arg for value in candidates):
+                    return False
+            elif op == '$nin':
+                if any(value in arg for value in candidates):
+                    return False
+            elif op == '$ne':
+                if arg in candidates:
+                    return False
+            elif op == '$exists':
+                if bool(values) != bool(arg):
+                    return False
+            elif op in _COMPARISONS:
+                if not any(
+                    _comparable(value, arg) and _COMPARISONS[op](value, arg)
+                    for value in candidates
+                ):
+                    return False
+            else:
+                raise NotImplementedError(f'unsupported filter operator: {op}')
+        return True
+
+    if condition is None and not values:
+        return True
+
+    return condition in candidates
+
+
+def _comparable(value, arg):
+    """Returns True if two values can be ordered.
+    """
+    try:
+        value < arg  # pylint: disable=pointless-statement
+    except TypeError:
+        return False
+    return True
+
+
+def match(doc, doc_filter):
+    """Returns True if the document matches the filter.
+
+    Args:
+        doc: The document.
+        doc_filter: The MongoDB-style filter.
+
+    Returns:
+        True if the document matches.
+    """
+    for key, condition in (doc_filter or {}).items():
+        if key == '$or':
+            if not any(match(doc, sub_filter) for sub_filter in condition):
+                return False
+        elif key == '$and':
+            if not all(match(doc, sub_filter) for sub_filter in condition):
+                return False
+        elif not _match_value(_get_field(doc, key), condition):
+            return False
+
+    return True
+
+
+def _project(doc, projection):
+    """Returns a copy of the document limited to the projection.
+    """
+    if not projection:
+        return deepcopy(doc)
+
+    if isinstance(projection, (list, tuple)):
+        projection = {key: 1 for key in projection}
+
+    include = {key for key, val in projection.items() if val}
+    exclude = {key for key, val in projection.items() if not val}
+    if include:
+        include.add('_id')
+        include -= exclude
+        return _project_include(doc, include)
+
+    return {key: deepcopy(val) for key, val in doc.items() if key not in exclude}
+
+
+def _project_include(value, paths):
+    """Returns the dotted paths of a document, projecting through arrays.
+    """
+    if isinstance(value, list):
+        return [
+            _project_include(item, paths) for item in value if isinstance(item, dict)
+        ]
+
+    subpaths = {}
+    for path in paths:
+        head, _, rest = path.partition('.')
+        subpaths.setdefault(head, set()).add(rest)
+
+    result = {}
+    for key, rests in subpaths.items():
+        if key not in value:
+            continue
+        if '' in rests or not isinstance(value[key], (dict, list)):
+            result[key] = deepcopy(value[key])
+        else:
+            result[key] = _project_include(value[key], rests)
+
+    return result
+
+
+def _set_field(doc, key, value):
+    """Sets a dotted field of a document.
+    """
+    *parents, last = key.split('.')
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _apply_update(doc, update, inserting=False):
+    """Applies update operators to a document in place.
+    """
+    for op, fields in update.items():
+        for key, value in fields.items():
+            if op == '$set' or (op == '$setOnInsert' and inserting):
+                _set_field(doc, key, deepcopy(value))
+            elif op == '$unset':
+                doc.pop(key, None)
+            elif op == '$inc':
+                current = _get_field(doc, key)
+                _set_field(doc, key, (current[0] if current else 0) + value)
+            elif op == '$max':
+                current = _get_field(doc, key)
+                if not current or value > current[0]:
+                    _set_field(doc, key, value)
+            elif op == '$addToSet':
+                current = _get_field(doc, key)
+                items = list(current[0]) if current else []
+                new_items = value['$each'] if isinstance(value, dict) and '$each' in value \
+                    else [value]
+                items.extend(item for item in new_items if item not in items)
+                _set_field(doc, key, items)
+            elif op == '$pull':
+                current = _get_field(doc, key)
+                if current:
+                    pull = value['$in'] if isinstance(value, dict) and '$in' in value \
+                        else [value]
+                    _set_field(doc, key, [item for item in current[0] if item not in pull])
+            elif op != '$setOnInsert':
+                raise NotImplementedError(f'unsupported update operator: {op}')
+
+
+class WriteResult:
+    """Result of a write operation, with the pymongo attribute names.
+    """
+    def __init__(self, matched=0, modified=0, deleted=0, inserted=0,
+                 upserted_ids=None, inserted_ids=None):
+        self.matched_count = matched
+        self.modified_count = modified
+        self.deleted_count = deleted
+        self.inserted_count = inserted
+        self.upserted_ids = upserted_ids or {}
+        self.upserted_count = len(self.upserted_ids)
+        self.inserted_ids = inserted_ids or []
+        self.inserted_id = self.inserted_ids[0] if self.inserted_ids else None
+        self.upserted_id = next(iter(self.upserted_ids.values()), None)
+        self.acknowledged = True
+
+
+class DocumentCollection:
+    """Base of the collections of the storage backends, with the pymongo
+    methods.
+
+    The keyword arguments of the pymongo signatures that a backend does not
+    support are accepted and ignored.
+
+    Attributes:
+        name: Name of the collection.
+        indexes: Dictionary of index specifications, keyed by index name.
+        op_counts: Dictionary of operation counters, keyed by method name.
+    """
+    def __init__(self, name):
+        """Initializes the collection.
+
+        Args:
+            name: Name of the collection.
+        """
+        self.name = name
+        self.indexes = {'_id_': {'key': [('_id', 1)]}}
+        self.op_counts = {}
+
+    def _count(self, op):
+        """Increments an operation counter.
+        """
+        self.op_counts[op] = self.op_counts.get(op, 0) + 1
+
+    def _transaction(self):
+        """Returns the context of the writes of a call, none by default.
+        """
+        return nullcontext()
+
+    def _find_docs(self, doc_filter, limit=None):
+        """Returns the matching documents, in insertion order.
+        """
+        raise NotImplementedError
+
+    def _document_count(self):
+        """Returns the number of documents.
+        """
+        raise NotImplementedError
+
+    def _insert(self, document):
+        """Inserts a document.
+        """
+        raise NotImplementedError
+
+    def _replace(self, doc_filter, replacement, upsert):
+        """Replaces or upserts a document.
+        """
+        raise NotImplementedError
+
+    def _update(self, doc_filter, update, upsert, limit=None):
+        """Updates or upserts documents.
+        """
+        raise NotImplementedError
+
+    def _delete(self, doc_filter, limit=None):
+        """Deletes documents.
+        """
+        raise NotImplementedError
+
+    def _create_index(self, name, spec):
+        """Creates an index.
+        """
+        raise NotImplementedError
+
+    def _drop_index(self, name):
+        """Drops an index.
+        """
+        raise NotImplementedError
+
+    def _drop(self):
+        """Deletes all documents and indexes.
+        """
+        raise NotImplementedError
+
+    def _find_sorted(self, doc_filter, sort, limit):
+        """Returns the matching documents, sorted and limited.
+        """
+        docs = self._find_docs(doc_filter, limit=None if sort else limit or None)
+        for key, direction in reversed(sort):
+            docs.sort(key=lambda doc, key=key: _get_field(doc, key)[:1], reverse=direction < 0)
+
+        return docs[:limit] if limit else docs
+
+    def find_one(self, filter=None, projection=None, **kwargs):
+        """Returns the first matching document, or None.
+        """
+        self._count('find_one')
+        docs = self._find_docs(filter, limit=1)
+        return _project(docs[0], projection) if docs else None
+
+    def find(self, filter=None, projection=None, sort=None, limit=0, **kwargs):
+        """Returns a list of the matching documents.
+        """
+        self._count('find')
+        docs = self._find_sorted(filter, list(sort or []), limit)
+
+        return [_project(doc, projection) for doc in docs]
+
+    def count_documents(self, filter, **kwargs):
+        """Returns the number of matching documents.
+        """
+        self._count('count_documents')
+        if filter:
+            return len(self._find_docs(filter))
+
+        return self._document_count()
+
+    def estimated_document_count(self, **kwargs):
+        """Returns the number of documents.
+        """
+        return self._document_count()
+
+    def distinct(self, key, filter=None, **kwargs):
+        """Returns the distinct values of a field.
+        """
+        self._count('distinct')
+        values = []
+        for doc in self._find_docs(filter):
+            for value in _get_field(doc, key):
+                for item in value if isinstance(value, list) else [value]:
+                    if item not in values:
+                        values.append(item)
+
+        return values
+
+    def insert_one(self, document, **kwargs):
+        """Inserts a document.
+        """
+        self._count('insert_one')
+        with self._transaction():
+            return self._insert(document)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        """Inserts several documents.
+        """
+        self._count('insert_many')
+        with self._transaction():
+            ids = [self._insert(document).inserted_id for document in documents]
+
+        return WriteResult(inserted=len(ids), inserted_ids=ids)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        """Replaces the first matching document.
+        """
+        self._count('replace_one')
+        with self._transaction():
+            return self._replace(filter, replacement, upsert)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        """Updates the first matching document.
+        """
+        self._count('update_one')
+        with self._transaction():
+            return self._update(filter, update, upsert, limit=1)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        """Updates the matching documents.
+        """
+        self._count('update_many')
+        with self._transaction():
+            return self._update(filter, update, upsert)
+
+    def delete_one(self, filter, **kwargs):
+        """Deletes the first matching document.
+        """
+        self._count('delete_one')
+        with self._transaction():
+            return self._delete(filter, limit=1)
+
+    def delete_many(self, filter, **kwargs):
+        """Deletes the matching documents.
+        """
+        self._count('delete_many')
+        with self._transaction():
+            return self._delete(filter)
+
+    def find_one_and_replace(self, filter, replacement, upsert=False,
+                             return_document=False, projection=None, **kwargs):
+        """Replaces a document and returns it.
+
+        Returns the document before the replacement, or after it if
+        return_document is ReturnDocument.AFTER (True).
+        """
+        self._count('find_one_and_replace')
+        with self._transaction():
+            return self._find_and_modify(
+                filter, lambda: self._replace(filter, replacement, upsert),
+                return_document, projection
+            )
+
+    def find_one_and_update(self, filter, update, upsert=False,
+                            return_document=False, projection=None, **kwargs):
+        """Updates a document and returns it.
+
+        Returns the document before the update, or after it if
+        return_document is ReturnDocument.AFTER (True).
+        """
+        self._count('find_one_and_update')
+        with self._transaction():
+            return self._find_and_modify(
+                filter, lambda: self._update(filter, update, upsert, limit=1),
+                return_document, projection
+            )
+
+    def _find_and_modify(self, doc_filter, modify, return_document, projection):
+        """Applies a write to the first matching document and returns it.
+        """
+        docs = self._find_docs(doc_filter, limit=1)
+        before = _project(docs[0], projection) if docs else None
+        result = modify()
+        if not return_document:
+            return before
+
+        doc_id = docs[0]['_id'] if docs else result.upserted_id
+        after = self._find_docs({'_id': doc_id}, limit=1) if doc_id is not None else []
+
+        return _project(after[0], projection) if after else None
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        """Applies a list of pymongo write operations, in one transaction of
+        the backend.
+
+        Supports InsertOne, ReplaceOne, UpdateOne, UpdateMany, DeleteOne and
+        DeleteMany requests.
+        """
+        self._count('bulk_write')
+        totals = {'matched': 0, 'modified': 0, 'deleted': 0, 'inserted': 0}
+        upserted_ids = {}
+        with self._transaction():
+            for num, request in enumerate(requests):
+                kind = type(request).__name__
+                # pylint: disable=protected-access
+                if kind == 'InsertOne':
+                    result = self._insert(request._doc)
+                elif kind == 'ReplaceOne':
+                    result = self._replace(request._filter, request._doc, request._upsert)
+                elif kind in ('UpdateOne', 'UpdateMany'):
+                    result = self._update(request._filter, request._doc, request._upsert,
+                                          limit=1 if kind == 'UpdateOne' else None)
+                elif kind in ('DeleteOne', 'DeleteMany'):
+                    result = self._delete(request._filter,
+                                          limit=1 if kind == 'DeleteOne' else None)
+                else:
+                    raise NotImplementedError(f'unsupported bulk request: {kind}')
+
+                totals['matched'] += result.matched_count
+                totals['modified'] += result.modified_count
+                totals['deleted'] += result.deleted_count
+                totals['inserted'] += result.inserted_count
+                for doc_id in result.upserted_ids.values():
+                    upserted_ids[num] = doc_id
+
+        return WriteResult(upserted_ids=upserted_ids, **totals)
+
+    def create_index(self, keys, name=None, **kwargs):
+        """Creates an index.
+
+        Returns:
+            The name of the index.
+        """
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = list(keys)
+        if not name:
+            name = '_'.join(f'{key}_{direction}' for key, direction in keys)
+        self._create_index(name, {'key': keys, **kwargs})
+
+        return name
+
+    def drop_index(self, index_or_name, **kwargs):
+        """Drops an index.
+        """
+        self._drop_index(index_or_name)
+
+    def index_information(self):
+        """Returns the index specifications, keyed by index name.
+        """
+        return deepcopy(self.indexes)
+
+    def list_indexes(self):
+        """Returns the index specifications, with their names.
+        """
+        return [{'name': name, **spec} for name, spec in self.index_information().items()]
+
+    def _index_accesses(self, name):
+        """Returns the number of queries that used an index, 0 by default.
+        """
+        return 0
+
+    def aggregate(self, pipeline, **kwargs):
+        """Supports the $indexStats stage only.
+        """
+        if pipeline == [{'$indexStats': {}}]:
+            return [
+                {'name': name, 'key': dict(spec['key']),
+                 'accesses': {'ops': self._index_accesses(name)}}
+                for name, spec in self.indexes.items()
+            ]
+
+        raise NotImplementedError('unsupported aggregation pipeline')
+
+    def drop(self, **kwargs):
+        """Deletes all documents and indexes.
+        """
+        self._drop()
+
+
+class DocumentDatabase:
+    """Base of the databases of the storage backends, with the i_mongodb
+    methods.
+    """
+    def read_collection(self, name):
+        """Returns the specified collection, creating it if needed.
+        """
+        raise NotImplementedError
+
+    def create_collection(self, name):
+        """Creates and returns the specified collection.
+        """
+        return self.read_collection(name)
+
+    def __getattr__(self, name):
+        """Returns the collection for the specified attribute name.
+        """
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        return self.read_collection(name)
@@ -0,0 +1,403 @@
+"""Streaming export of normalized recipes.
+
+Recipes from BeersmithInterface.iter_bsmx() (or read_bsmx()) are written as
+they arrive, in two layouts:
+
+    ndjson:   <directory>/recipes-00000.ndjson[.gz], one recipe per line.
+    columnar: <directory>/<table>/part-00000/<column>.ndjson[.gz], one value
+              per line, for the recipes, ingredients, mash_steps and
+              ferment_readings tables.
+
+Both layouts are split into chunks of chunk_rows rows and the recipes of a
+.bsmx file are parsed one at a time (see export_bsmx()), so memory holds the
+text of the file, one parsed recipe and one chunk of rows per table, instead
+of the parsed library. On an error, the rows already buffered are written as
+a last, partial chunk, as the ndjson layout does. In the columnar layout, each
+column of a chunk is a separate file and a downstream job reads only the
+columns it needs; the _manifest.json file of each chunk lists its columns
+and row count. Column files are named after the percent-encoded column name
+(see column_filename()), so a key such as 'a/b' stays in its chunk
+directory. Child table rows carry the recipe_id of their recipe.
+"""
+import bz2
+import gzip
+import json
+import lzma
+import os
+from urllib.parse import quote
+
+from beersmith_direct.i_beersmith import BeersmithInterface
+
+# file openers and suffixes of the supported compressions
+COMPRESSIONS = {
+    None: (open, ''),
+    'gzip': (gzip.open, '.gz'),
+    'bz2': (bz2.open, '.bz2'),
+    'xz': (lzma.open, '.xz'),
+}
+
+# default number of rows per chunk
+DEFAULT_CHUNK_ROWS = 10000
+
+# tables of the columnar layout
+TABLES = ('recipes', 'ingredients', 'mash_steps', 'ferment_readings')
+
+# nested recipe objects flattened into the recipes table, with their prefixes
+RECIPE_OBJECTS = ('mash', 'equipment', 'style', 'carb', 'base_grain', 'ferment')
+
+# recipe keys exported as child tables instead of recipe columns
+CHILD_KEYS = ('ingredients', 'ingredients_by_type', 'mashsteps', 'readings', 'agedata')
+
+
+def open_file(filepath, compression=None, mode='wt'):
+    """Opens a text file with optional compression.
+
+    Args:
+        filepath: Path of the file, without the compression suffix.
+        compression: None, 'gzip', 'bz2' or 'xz'.
+        mode: File mode, 'wt' or 'rt'.
+
+    Returns:
+        The file object.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f'unsupported compression: {compression}')
+
+    opener, suffix = COMPRESSIONS[compression]
+
+    return opener(f'{filepath}{suffix}', mode, encoding='UTF-8')
+
+
+def column_filename(column):
+    """Returns the name of the file of a column, without the compression
+    suffix.
+
+    The column name is percent-encoded, including the path separators and a
+    leading dot, so every column file is a plain file of its chunk directory.
+
+    Args:
+        column: Name of the column.
+
+    Returns:
+        The file name.
+    """
+    filename = quote(column, safe='')
+    if filename.startswith('.'):
+        filename = f'%2E{filename[1:]}'
+
+    return f'{filename}.ndjson'
+
+
+def to_json(value):
+    """Returns the JSON text of a value.
+    """
+    return json.dumps(value, default=str, ensure_ascii=False)
+
+
+def _scalar(value):
+    """Returns a scalar column value, encoding nested values as JSON text.
+    """
+    if isinstance(value, (dict, list)):
+        return to_json(value)
+
+    return value
+
+
+def _flatten(props, prefix='', skip=CHILD_KEYS):
+    """Returns the scalar fields of a dictionary as a row.
+    """
+    return {
+        f'{prefix}{key}': _scalar(value)
+        for key, value in props.items() if key not in skip
+    }
+
+
+def flatten_recipe(recipe):
+    """Flattens a normalized recipe into the rows of the columnar tables.
+
+    Args:
+        recipe: Normalized recipe, from read_bsmx() or iter_bsmx().
+
+    Returns:
+        Dictionary of row lists, keyed by table name.
+    """
+    recipe_id = recipe.get('_id', recipe.get('name'))
+
+    row = _flatten(recipe, skip=CHILD_KEYS + RECIPE_OBJECTS)
+    for key in RECIPE_OBJECTS:
+        if isinstance(recipe.get(key), dict):
+            row.update(_flatten(recipe[key], prefix=f'{key}_'))
+
+    mash = recipe.get('mash') or {}
+    ferment = recipe.get('ferment') or {}
+
+    return {
+        'recipes': [row],
+        'ingredients': [
+            {'recipe_id': recipe_id, 'position': position, **_flatten(ingredient)}
+            for position, ingredient in enumerate(recipe.get('ingredients') or [])
+        ],
+        'mash_steps': [
+            {'recipe_id': recipe_id, 'step': step, **_flatten(mashstep)}
+            for step, mashstep in enumerate(mash.get('mashsteps') or [])
+        ],
+        'ferment_readings': [
+            {'recipe_id': recipe_id, 'reading': reading, **_flatten(props)}
+            for reading, props in enumerate(ferment.get('readings') or [])
+        ],
+    }
+
+
+class NdjsonWriter:
+    """Writes records to chunked, optionally compressed NDJSON files.
+
+    Attributes:
+        directory: Directory of the files.
+        name: Base name of the files.
+        chunk_rows: Number of records per file.
+        compression: None, 'gzip', 'bz2' or 'xz'.
+        rows: Number of records written.
+        files: List of the written file paths.
+    """
+    def __init__(self, directory, name='recipes', chunk_rows=DEFAULT_CHUNK_ROWS,
+        compression=None):
+        """Initializes the writer.
+
+        Args:
+            directory: Directory of the files, created if needed.
+            name: Base name of the files.
+            chunk_rows: Number of records per file.
+            compression: None, 'gzip', 'bz2' or 'xz'.
+        """
+        self.directory = directory
+        self.name = name
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.rows = 0
+        self.files = []
+        self._file = None
+        self._chunk_count = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, record):
+        """Writes one record.
+        """
+        if self._file is None or self._chunk_count >= self.chunk_rows:
+            self._next_file()
+
+        self._file.write(to_json(record))
+        self._file.write('\n')
+        self._chunk_count += 1
+        self.rows += 1
+
+    def _next_file(self):
+        """Closes the current file and opens the next chunk.
+        """
+        self.close()
+        filepath = os.path.join(self.directory, f'{self.name}-{len(self.files):05d}.ndjson')
+        self._file = open_file(filepath, self.compression)
+        self.files.append(f'{filepath}{COMPRESSIONS[self.compression][1]}')
+        self._chunk_count = 0
+
+    def close(self):
+        """Closes the current file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+class ColumnarWriter:
+    """Writes recipes to chunked, one file per column tables.
+
+    Rows are buffered per table and written as a chunk when a table reaches
+    chunk_rows rows. The columns of a chunk are the union of the keys of its
+    rows, with null for missing values.
+
+    Attributes:
+        directory: Directory of the tables.
+        chunk_rows: Number of rows per chunk.
+        compression: None, 'gzip', 'bz2' or 'xz'.
+        rows: Dictionary of the number of rows written, keyed by table.
+    """
+    def __init__(self, directory, chunk_rows=DEFAULT_CHUNK_ROWS, compression=None):
+        """Initializes the writer.
+
+        Args:
+            directory: Directory of the tables, created if needed.
+            chunk_rows: Number of rows per chunk.
+            compression: None, 'gzip', 'bz2' or 'xz'.
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'unsupported compression: {compression}')
+
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.rows = {table: 0 for table in TABLES}
+        self._buffers = {table: [] for table in TABLES}
+        self._chunks = {table: 0 for table in TABLES}
+
+    def write(self, recipe):
+        """Writes the rows of one recipe.
+        """
+        for table, rows in flatten_recipe(recipe).items():
+            buffer = self._buffers[table]
+            buffer.extend(rows)
+            if len(buffer) >= self.chunk_rows:
+                self._write_chunk(table)
+
+    def _write_chunk(self, table):
+        """Writes the buffered rows of a table as one chunk.
+        """
+        buffer = self._buffers[table]
+        if not buffer:
+            return
+
+        columns = list(dict.fromkeys(key for row in buffer for key in row))
+        chunk_path = os.path.join(self.directory, table, f'part-{self._chunks[table]:05d}')
+        os.makedirs(chunk_path, exist_ok=True)
+
+        for column in columns:
+            with open_file(os.path.join(chunk_path, column_filename(column)),
+                           self.compression) as column_file:
+                for row in buffer:
+                    column_file.write(to_json(row.get(column)))
+                    column_file.write('\n')
+
+        manifest = {
+            'table': table,
+            'rows': len(buffer),
+            'columns': columns,
+            'compression': self.compression,
+        }
+        with open(os.path.join(chunk_path, '_manifest.json'), 'w',
+                  encoding='UTF-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=4)
+
+        self.rows[table] += len(buffer)
+        self._chunks[table] += 1
+        self._buffers[table] = []
+
+    def close(self):
+        """Writes the remaining buffered rows.
+        """
+        for table in TABLES:
+            self._write_chunk(table)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+def export_recipes(recipes, directory, formats=('ndjson', 'columnar'),
+    chunk_rows=DEFAULT_CHUNK_ROWS, compression=None):
+    """Streams recipes to the export layouts.
+
+    Args:
+        recipes: Iterable of normalized recipes.
+        directory: Output directory. The layouts are written to its ndjson
+            and columnar subdirectories.
+        formats: Layouts to write, 'ndjson' and/or 'columnar'.
+        chunk_rows: Number of rows per chunk.
+        compression: None, 'gzip', 'bz2' or 'xz'.
+
+    Returns:
+        Dictionary of the number of rows written, keyed by table.
+    """
+    ndjson_writer = None
+    columnar_writer = None
+    if 'ndjson' in formats:
+        ndjson_writer = NdjsonWriter(
+            os.path.join(directory, 'ndjson'), chunk_rows=chunk_rows, compression=compression
+        )
+    if 'columnar' in formats:
+        columnar_writer = ColumnarWriter(
+            os.path.join(directory, 'columnar'), chunk_rows=chunk_rows, compression=compression
+        )
+
+    recipe_count = 0
+    try:
+        for recipe in recipes:
+            if ndjson_writer:
+                ndjson_writer.write(recipe)
+            if columnar_writer:
+                columnar_writer.write(recipe)
+            recipe_count += 1
+    finally:
+        if ndjson_writer:
+            ndjson_writer.close()
+        if columnar_writer:
+            columnar_writer.close()
+
+    if columnar_writer:
+        return dict(columnar_writer.rows)
+
+    return {'recipes': recipe_count}
+
+
+def export_bsmx(filename, path, directory, bsm=None, **kwargs):
+    """Streams the recipes of a .bsmx file to the export layouts.
+
+    The recipes are read with iter_bsmx() in the chunked mode, so the parsed
+    tree of the whole file is never built.
+
+    Args:
+        filename: Name of the recipe file.
+        path: Location of the recipe file.
+        directory: Output directory.
+        bsm: BeersmithInterface object, created if not supplied.
+        **kwargs: Arguments of export_recipes().
+
+    Returns:
+        Dictionary of the number of rows written, keyed by table.
+    """
+    if bsm is None:
+        bsm = BeersmithInterface()
+
+    return export_recipes(bsm.iter_bsmx(filename, path, chunked=True), directory, **kwargs)
+
+
+def read_columns(directory, table, columns=None):
+    """Reads columns of a columnar table.
+
+    Args:
+        directory: Directory of the columnar layout.
+        table: Name of the table.
+        columns: Names of the columns to read. Defaults to all columns.
+
+    Returns:
+        Dictionary of value lists, keyed by column name.
+    """
+    table_path = os.path.join(directory, table)
+    values = {}
+    row_count = 0
+    for chunk in sorted(os.listdir(table_path)):
+        chunk_path = os.path.join(table_path, chunk)
+        with open(os.path.join(chunk_path, '_manifest.json'), 'r',
+                  encoding='UTF-8') as manifest_file:
+            manifest = json.load(manifest_file)
+
+        for column in columns or manifest['columns']:
+            column_values = values.setdefault(column, [None] * row_count)
+            if column in manifest['columns']:
+                with open_file(os.path.join(chunk_path, column_filename(column)),
+                               manifest['compression'], 'rt') as column_file:
+                    column_values.extend(json.loads(line) for line in column_file)
+            else:
+                column_values.extend([None] * manifest['rows'])
+
+        row_count += manifest['rows']
+        for column_values in values.values():
+            column_values.extend([None] * (row_count - len(column_values)))
+
+    return values
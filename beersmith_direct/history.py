@@ -0,0 +1,356 @@
+"""Class module for the delta-compressed version history of recipes.
+
+Each recipe write is recorded in a history collection, named after the
+recipe collection (for example recipes_history), as the difference with the
+previous version of the recipe. Every snapshot_interval versions, the full
+recipe is stored instead, so a version is rebuilt from at most that many
+deltas:
+
+    {'_id': 'Pale Ale:3', 'recipe_id': 'Pale Ale', 'seq': 3,
+     'timestamp': datetime(...), 'kind': 'delta',
+     'delta': [['set', ['ingredients', 2, 'amount'], 16.0]]}
+
+A delta is a list of operations on paths of keys and list positions:
+
+    ['set', path, value]   sets the value, appending to a list at its end
+    ['del', path]          removes a key
+    ['resize', path, n]    truncates a list to n items
+
+The kind of an entry is 'snapshot' (with the full 'recipe'), 'delta' or
+'delete'. Writes that do not change the recipe are not recorded, so the
+history is not affected by replaying the same archive actions again.
+"""
+from collections import OrderedDict
+import os
+
+from pymongo import ReplaceOne
+
+# default number of versions between snapshots
+DEFAULT_SNAPSHOT_INTERVAL = 10
+
+# default number of recipe heads kept in memory
+DEFAULT_CACHE_SIZE = 1024
+
+# head of a recipe that has no history
+_NO_HEAD = (0, 0, None)
+
+
+def _same(old, new):
+    """Returns True if two values are equal and of the same type.
+    """
+    return type(old) is type(new) and old == new
+
+
+def diff(old, new, path=()):
+    """Returns the delta that turns one version of a recipe into another.
+
+    Args:
+        old: The previous version.
+        new: The new version.
+        path: Path of the compared values, used by the recursion.
+
+    Returns:
+        List of delta operations, empty if the versions are equal.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        delta = [['del', [*path, key]] for key in old if key not in new]
+        for key, value in new.items():
+            if key in old:
+                delta.extend(diff(old[key], value, (*path, key)))
+            else:
+                delta.append(['set', [*path, key], value])
+        return delta
+
+    if isinstance(old, list) and isinstance(new, list):
+        delta = []
+        for position, (old_item, new_item) in enumerate(zip(old, new)):
+            delta.extend(diff(old_item, new_item, (*path, position)))
+        if len(new) < len(old):
+            delta.append(['resize', list(path), len(new)])
+        for position in range(len(old), len(new)):
+            delta.append(['set', [*path, position], new[position]])
+        return delta
+
+    if _same(old, new):
+        return []
+
+    return [['set', list(path), new]]
+
+
+def patch(doc, delta):
+    """Returns a version of a recipe with a delta applied.
+
+    The containers along the changed paths are copied, the rest of the
+    version is shared with doc, which is not modified.
+
+    Args:
+        doc: The previous version.
+        delta: List of delta operations, from diff().
+
+    Returns:
+        The new version.
+    """
+    copied = {}
+
+    def container(path):
+        """Returns the copied container at a path.
+        """
+        if path in copied:
+            return copied[path]
+
+        value = doc if not path else container(path[:-1])[path[-1]]
+        value = copied[path] = dict(value) if isinstance(value, dict) else list(value)
+        if path:
+            copied[path[:-1]][path[-1]] = value
+
+        return value
+
+    for operation in delta:
+        op, path = operation[0], tuple(operation[1])
+        if not path:
+            return operation[2]
+
+        parent = container(path[:-1])
+        if op == 'set':
+            if isinstance(parent, list) and path[-1] == len(parent):
+                parent.append(operation[2])
+            else:
+                parent[path[-1]] = operation[2]
+        elif op == 'del':
+            del parent[path[-1]]
+        elif op == 'resize':
+            del container(path)[operation[2]:]
+        else:
+            raise ValueError(f'unsupported delta operation: {op}')
+
+    return copied.get((), doc)
+
+
+class RecipeHistory:
+    """Delta-compressed versions of the recipes.
+
+    Versions are queued by record() and written by flush(), with one bulk
+    write. The latest version of recently written recipes (their head) is
+    kept in memory, the others are rebuilt from the history collection with
+    two queries per batch of writes.
+
+    Attributes:
+        collection: The history collection.
+        snapshot_interval: Number of versions between snapshots.
+        cache_size: Number of recipe heads kept in memory.
+    """
+    def __init__(self, mdb, prefix, snapshot_interval=None, cache_size=DEFAULT_CACHE_SIZE):
+        """Initializes the history.
+
+        Args:
+            mdb: The database.
+            prefix: Prefix of the collection name, usually the name of the
+                recipe collection.
+            snapshot_interval: Number of versions between snapshots.
+                Defaults to the BEERSMITH_HISTORY_SNAPSHOT_INTERVAL
+                environment variable, or 10.
+            cache_size: Number of recipe heads kept in memory.
+        """
+        self.collection = mdb.read_collection(f'{prefix}_history')
+        self.snapshot_interval = max(1, int(
+            snapshot_interval or os.environ.get(
+                'BEERSMITH_HISTORY_SNAPSHOT_INTERVAL', DEFAULT_SNAPSHOT_INTERVAL
+            )
+        ))
+        self.cache_size = cache_size
+
+        # (seq, snapshot seq, version) tuples, keyed by recipe identifier
+        self._heads = OrderedDict()
+        self._pending = []
+
+    def record(self, writes, stats=None):
+        """Queues the versions of a batch of recipe writes.
+
+        Args:
+            writes: List of (action, recipe_id, recipe, timestamp) tuples,
+                where action is 'upsert' or 'delete'.
+            stats: SyncStats object that records the reads.
+
+        Returns:
+            The number of queued versions.
+        """
+        self._load_heads(
+            [recipe_id for _, recipe_id, _, _ in writes if recipe_id not in self._heads],
+            stats
+        )
+
+        count = 0
+        for action, recipe_id, recipe, timestamp in writes:
+            seq, snapshot_seq, version = self._heads.get(recipe_id, _NO_HEAD)
+            entry = {
+                '_id': f'{recipe_id}:{seq + 1}',
+                'recipe_id': recipe_id,
+                'seq': seq + 1,
+                'timestamp': timestamp,
+            }
+
+            if action == 'delete':
+                if version is None:
+                    continue
+                entry['kind'] = 'delete'
+                recipe = None
+            elif version is None or seq + 1 - snapshot_seq >= self.snapshot_interval:
+                if version is not None and _same(version, recipe):
+                    continue
+                entry['kind'] = 'snapshot'
+                entry['recipe'] = recipe
+                snapshot_seq = seq + 1
+            else:
+                delta = diff(version, recipe)
+                if not delta:
+                    continue
+                entry['kind'] = 'delta'
+                entry['delta'] = delta
+
+            self._pending.append(entry)
+            self._remember(recipe_id, (seq + 1, snapshot_seq, recipe))
+            count += 1
+
+        return count
+
+    def pending_count(self):
+        """Returns the number of queued versions.
+        """
+        return len(self._pending)
+
+    def flush(self, stats=None):
+        """Writes the queued versions with one bulk write.
+
+        Args:
+            stats: SyncStats object that records the writes.
+
+        Returns:
+            The number of versions written.
+        """
+        if not self._pending:
+            return 0
+
+        pending = self._pending
+        self._pending = []
+        requests = [ReplaceOne({'_id': entry['_id']}, entry, upsert=True) for entry in pending]
+        if stats is not None:
+            with stats.stage('mongodb_write'):
+                self.collection.bulk_write(requests, ordered=False)
+            stats.add('history_written', len(requests))
+        else:
+            self.collection.bulk_write(requests, ordered=False)
+
+        return len(pending)
+
+    def _load_heads(self, recipe_ids, stats=None):
+        """Rebuilds the heads of recipes from the history collection.
+
+        The latest snapshot of each recipe is found with a first query, and
+        the versions since then with a second one.
+        """
+        if not recipe_ids:
+            return
+
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        snapshots = {}
+        for entry in self.collection.find(
+            {'recipe_id': {'$in': recipe_ids}, 'kind': 'snapshot'},
+            projection=['recipe_id', 'seq']
+        ):
+            snapshots[entry['recipe_id']] = max(
+                entry['seq'], snapshots.get(entry['recipe_id'], 0)
+            )
+
+        if stats is not None:
+            stats.add('history_read', len(recipe_ids))
+        if not snapshots:
+            return
+
+        entries = self.collection.find(
+            {'$or': [
+                {'recipe_id': recipe_id, 'seq': {'$gte': seq}}
+                for recipe_id, seq in snapshots.items()
+            ]},
+            sort=[('recipe_id', 1), ('seq', 1)]
+        )
+        for entry in entries:
+            self._remember(entry['recipe_id'], self._apply(
+                self._heads.get(entry['recipe_id'], _NO_HEAD), entry
+            ))
+
+    @staticmethod
+    def _apply(head, entry):
+        """Returns the head of a recipe after a history entry.
+        """
+        _, snapshot_seq, version = head
+        if entry['kind'] == 'snapshot':
+            return entry['seq'], entry['seq'], entry['recipe']
+        if entry['kind'] == 'delete':
+            return entry['seq'], snapshot_seq, None
+
+        return entry['seq'], snapshot_seq, patch(version, entry['delta'])
+
+    def _remember(self, recipe_id, head):
+        """Keeps the head of a recipe in memory, evicting the least recently used.
+        """
+        self._heads[recipe_id] = head
+        self._heads.move_to_end(recipe_id)
+        while len(self._heads) > self.cache_size:
+            self._heads.popitem(last=False)
+
+    def versions(self, recipe_id):
+        """Returns the versions of a recipe, without their contents.
+
+        Args:
+            recipe_id: Beersmith Recipe identifier.
+
+        Returns:
+            List of {'seq', 'timestamp', 'kind'} dictionaries, oldest first.
+        """
+        return list(self.collection.find(
+            {'recipe_id': recipe_id},
+            projection={'_id': 0, 'seq': 1, 'timestamp': 1, 'kind': 1},
+            sort=[('seq', 1)]
+        ))
+
+    def recipe_at(self, recipe_id, timestamp=None):
+        """Returns a recipe as it was at a point in time.
+
+        Args:
+            recipe_id: Beersmith Recipe identifier.
+            timestamp: The point in time, for example the date of an archive
+                action. Defaults to the latest version.
+
+        Returns:
+            The recipe, or None if it did not exist or was deleted.
+        """
+        doc_filter = {'recipe_id': recipe_id}
+        if timestamp is not None:
+            doc_filter['timestamp'] = {'$lte': timestamp}
+
+        latest = list(self.collection.find(
+            doc_filter, projection=['seq', 'kind'], sort=[('seq', -1)], limit=1
+        ))
+        if not latest or latest[0]['kind'] == 'delete':
+            return None
+        seq = latest[0]['seq']
+
+        snapshot = list(self.collection.find(
+            {'recipe_id': recipe_id, 'kind': 'snapshot', 'seq': {'$lte': seq}},
+            sort=[('seq', -1)], limit=1
+        ))[0]
+        head = self._apply(_NO_HEAD, snapshot)
+        for entry in self.collection.find(
+            {'recipe_id': recipe_id, 'seq': {'$gt': snapshot['seq'], '$lte': seq}},
+            sort=[('seq', 1)]
+        ):
+            head = self._apply(head, entry)
+
+        return head[2]
+
+    def drop(self):
+        """Drops the history collection.
+        """
+        self.collection.drop()
+        self._heads.clear()
+        self._pending = []
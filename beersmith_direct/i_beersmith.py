@@ -1,21 +1,37 @@
 """Class module to interface with Beersmith.
 
+The parsing libraries (bs4, hjson, xmltodict) are imported on first use to
+keep the package import fast.
+
 TODO: add function docstrings
 """
 # pylint: disable=logging-fstring-interpolation,missing-function-docstring
+# pylint: disable=import-outside-toplevel
 
+import hashlib
+import html
+import logging
 import os
+import pickle
+import re
 from collections import OrderedDict
 
-from aracnid_logger import Logger
-from bs4 import BeautifulSoup
-import hjson
-import xmltodict
+from beersmith_direct.profiling import profile_settings, profiled
+from beersmith_direct.stats import SyncStats
 
 # from beersmith_direct.recipes import Recipes
 
 # initialize logging
-logger = Logger(__name__).get_logger()
+# equivalent to aracnid_logger's Logger(__name__).get_logger(), without
+# importing aracnid_logger (and slack) at module import
+logger = logging.getLogger(__name__)
+
+# version of the parsed file cache, change when the parsed output changes
+CACHE_VERSION = 2
+
+# tags of the folder structure of a recipe file
+FOLDER_TAGS = re.compile(r'<(/?)(Table|Recipe|Name)>', re.IGNORECASE)
+RECIPE_END = re.compile(r'</Recipe>', re.IGNORECASE)
 
 
 class BeersmithInterface:
@@ -23,25 +39,39 @@ class BeersmithInterface:
 
     Attributes:
         bsm:
+        stats: SyncStats object that records the parsing stages.
+        profile: ProfileSettings object of the profiling mode.
+        cache_dir: Directory of the parsed file cache, None to disable it.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, stats=None, profile=None, cache_dir=None) -> None:
         """Initializes the Beersmith interface.
 
         Args:
-            None.
+            stats: SyncStats object to record into. A new one is created if
+                not supplied.
+            profile: ProfileSettings object, or a boolean to enable profiling.
+                Defaults to the settings from the environment.
+            cache_dir: Directory of the parsed file cache. Defaults to the
+                BEERSMITH_CACHE_DIR environment variable.
         """
         self.default_filename = os.environ.get('BEERSMITH_DEFAULT_FILENAME')
         self.default_path = os.environ.get('BEERSMITH_DEFAULT_PATH')
         self.path = None
         self.filename = None
+        self.stats = stats if stats is not None else SyncStats()
+        self.profile = profile_settings(profile)
+        self.cache_dir = cache_dir or os.environ.get('BEERSMITH_CACHE_DIR')
 
-    def read_bsmx(self, filename=None, path=None):
+    @profiled('read_bsmx')
+    def read_bsmx(self, filename=None, path=None, as_model=False):
         """Reads a .bsmx file and returns a recipe folder of recipes.
 
         Args:
             filename: The supplied filename.
             path: The supplied directory.
+            as_model: If True, returns the recipes as beersmith_direct.model
+                Recipe records. Archive actions are always dictionaries.
 
         Returns:
             A list of recipes.
@@ -52,72 +82,317 @@ class BeersmithInterface:
         # read the file
         filepath = os.path.join(self.path, self.filename)
         if os.path.exists(filepath):
-            with(open(filepath, 'r', encoding='UTF-8')) as bsmx_file:
-                xml_string = bsmx_file.read()
+            cached_list = self.read_cache(filepath)
+            if cached_list is not None:
+                if as_model:
+                    from beersmith_direct.model import to_model
+                    return to_model(cached_list)
+                return cached_list
+
+            with self.stats.stage('read_file'):
+                with(open(filepath, 'r', encoding='UTF-8')) as bsmx_file:
+                    xml_string = bsmx_file.read()
+            self.stats.add('files_read')
+            self.stats.add('bytes_read', len(xml_string))
+
+            parsed_list = self.parse_bsmx(xml_string, as_model=as_model)
+            if not as_model:
+                self.write_cache(filepath, parsed_list)
+
+            return parsed_list
+
+        return []
+
+    def _cache_path(self, filepath):
+        """Returns the cache path of a file, keyed by its path, size and time.
+        """
+        file_stat = os.stat(filepath)
+        key = f'{os.path.abspath(filepath)}:{file_stat.st_mtime_ns}:{file_stat.st_size}'
+        key_hash = hashlib.sha1(f'{key}:{CACHE_VERSION}'.encode()).hexdigest()
+
+        return os.path.join(self.cache_dir, f'{key_hash}.pickle')
+
+    def read_cache(self, filepath):
+        """Returns the cached parse of a file, if the cache is enabled.
+
+        The cache files are pickles, which run code when they are loaded:
+        the cache directory must be trusted, writable by the user of the
+        sync only. It is created with those permissions.
+
+        Args:
+            filepath: Path of the .bsmx file.
 
-                # replace some tag names from bsmx
-                xml_string = xml_string.replace('_MOD_', 'last_modified')
-                xml_string = xml_string.replace('_TExpanded', 'texpanded')
-                xml_string = xml_string.replace('_XName', 'xname')
-                xml_string = xml_string.replace('F_R_NAME', 'name')		# why do this here
+        Returns:
+            The list of recipes or archive actions, or None if not cached.
+        """
+        if not self.cache_dir:
+            return None
+
+        cache_path = self._cache_path(filepath)
+        if not os.path.exists(cache_path):
+            self.stats.add('cache_misses')
+            return None
+
+        with self.stats.stage('cache_read'):
+            with open(cache_path, 'rb') as cache_file:
+                parsed_list = pickle.load(cache_file)
+        self.stats.add('cache_hits')
+
+        return parsed_list
+
+    def write_cache(self, filepath, parsed_list):
+        """Saves the parse of a file, if the cache is enabled.
+
+        Args:
+            filepath: Path of the .bsmx file.
+            parsed_list: The list of recipes or archive actions.
+        """
+        if not self.cache_dir:
+            return
 
-                # replace archive tag names
-                xml_string = xml_string.replace('F_AR_ACTION', 'action')
-                xml_string = xml_string.replace('F_AR_NAME', 'name')		# why do this here
-                xml_string = xml_string.replace('F_AR_DIRECTORY', 'directory')
-                xml_string = xml_string.replace('F_AR_FILE', 'file')
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        cache_path = self._cache_path(filepath)
+        with self.stats.stage('cache_write'):
+            with open(f'{cache_path}.tmp', 'wb') as cache_file:
+                pickle.dump(parsed_list, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f'{cache_path}.tmp', cache_path)
 
-                # process text
-                if xml_string:
-                    xml_beautiful = BeautifulSoup(xml_string, 'html.parser')
+    def parse_bsmx(self, xml_string, as_model=False):
+        """Parses the contents of a .bsmx file.
 
-                    if xml_string.startswith('<Selections>') or xml_string.startswith('<Recipe>'):
-                        parsed_obj = xmltodict.parse(xml_beautiful.prettify())
-                        roottag, dict_items = parsed_obj.popitem()
+        Args:
+            xml_string: The contents of a recipe or archive file.
+            as_model: If True, returns the recipes as Recipe records.
 
-                        if dict_items:
+        Returns:
+            A list of recipes or archive actions.
+        """
+        with self.stats.stage('replace_tags'):
+            xml_string = self.replace_tags(xml_string)
+
+        # process text
+        if xml_string:
+            if xml_string.startswith('<Selections>') or xml_string.startswith('<Recipe>'):
+                dict_items = self.parse_xml(xml_string)
+
+                if dict_items:
+                    with self.stats.stage('normalize'):
+                        if as_model and dict_items['data'] is not None:
+                            from beersmith_direct.model import to_model
+
+                            # convert each recipe as it is normalized
+                            recipe_list = to_model(self.iter_recipes(dict_items))
+                        else:
                             recipe_list = self.process_recipes(dict_items)
+                    self.stats.add('recipes_parsed', len(recipe_list or []))
 
-                            return recipe_list
+                    return recipe_list
 
-                    elif xml_string.startswith('<Archive>'):
-                        parsed_obj = xmltodict.parse(f'<root>{xml_beautiful}</root>')
-                        roottag, dict_items = parsed_obj.popitem()
+            elif xml_string.startswith('<Archive>'):
+                dict_items = self.parse_xml(xml_string)
 
-                        if dict_items:
-                            archive_list = self.process_archive(dict_items)
+                if dict_items:
+                    archive_list = self.process_archive(dict_items)
+                    self.stats.add('archive_actions_parsed', len(archive_list))
 
-                            return archive_list
+                    return archive_list
 
         return []
 
-    def process_recipes(self, dict_items):
-        # To handle the recursive nature of embedded folders
+    @staticmethod
+    def replace_tags(xml_string):
+        """Replaces the .bsmx tag names that are renamed in the output.
 
-        # set the folder name
-        folder_name = dict_items['name']
+        Args:
+            xml_string: The contents of a .bsmx file.
 
-        # bounce out if folder is empty
-        if dict_items['data'] is None:
-            return 0
+        Returns:
+            The contents with the tag names replaced.
+        """
+        # replace some tag names from bsmx
+        xml_string = xml_string.replace('_MOD_', 'last_modified')
+        xml_string = xml_string.replace('_TExpanded', 'texpanded')
+        xml_string = xml_string.replace('_XName', 'xname')
+        xml_string = xml_string.replace('F_R_NAME', 'name')		# why do this here
+
+        # replace archive tag names
+        xml_string = xml_string.replace('F_AR_ACTION', 'action')
+        xml_string = xml_string.replace('F_AR_NAME', 'name')		# why do this here
+        xml_string = xml_string.replace('F_AR_DIRECTORY', 'directory')
+        xml_string = xml_string.replace('F_AR_FILE', 'file')
+
+        return xml_string
+
+    def parse_xml(self, xml_string):
+        """Parses the .bsmx markup into nested dictionaries.
 
-        # get the data key, could be 'table' or 'recipe'
-        data_key = list(dict_items['data'].keys())[0]
+        The markup is first read by BeautifulSoup, which lowercases the tag
+        names and repairs the markup that is not valid XML.
 
-        # process folder data into items list
-        item_dict = self.flatten_data(dict_items, data_key, 'items')
+        Args:
+            xml_string: The contents of a .bsmx file, with tags replaced.
+
+        Returns:
+            The contents of the root element.
+        """
+        from bs4 import BeautifulSoup
+        import xmltodict
 
-        recipe_list = []
-        item_list = item_dict['items']
-        for item in item_list:
-            if 'xname' in item and item['xname'] == 'Folder':
-                folder_recipe_list = self.process_folder(item)
-                recipe_list.extend(folder_recipe_list)
+        with self.stats.stage('beautifulsoup'):
+            xml_beautiful = BeautifulSoup(xml_string, 'html.parser')
+
+            if xml_string.startswith('<Archive>'):
+                xml_string = f'<root>{xml_beautiful}</root>'
             else:
-                recipe = self.process_recipe(item, folder_name=folder_name)
-                recipe_list.append(recipe)
+                xml_string = xml_beautiful.prettify()
+
+            # break the reference cycles of the tree, so that its memory is
+            # released now rather than by the cyclic garbage collector
+            xml_beautiful.decompose()
+            del xml_beautiful
+
+        with self.stats.stage('xmltodict'):
+            parsed_obj = xmltodict.parse(xml_string)
+        _, dict_items = parsed_obj.popitem()
+
+        return dict_items
+
+    @staticmethod
+    def split_recipes(xml_string):
+        """Yields the recipes of a recipe file as separate markup.
+
+        Only the folder structure of the file is scanned, so each recipe can
+        be parsed on its own and the memory of a parse is bounded by the
+        largest recipe instead of the size of the file.
+
+        Args:
+            xml_string: The contents of a recipe file, with tags replaced.
+
+        Yields:
+            Tuples of the folder name of the recipe (the path of its folder,
+            or the name of the root) and the markup of the recipe.
+        """
+        # names of the open folders, starting with the root
+        folders = [None]
+        position = 0
+        while True:
+            match = FOLDER_TAGS.search(xml_string, position)
+            if not match:
+                return
+
+            closing, tag = match.group(1), match.group(2).lower()
+            position = match.end()
+            if tag == 'recipe' and not closing:
+                end = RECIPE_END.search(xml_string, position)
+                if not end:
+                    return
+                position = end.end()
+                folder_name = '/'.join(folders[1:]) if len(folders) > 1 else folders[0]
+                yield folder_name, xml_string[match.start():position]
+            elif tag == 'table':
+                if closing:
+                    if len(folders) > 1:
+                        folders.pop()
+                else:
+                    folders.append(None)
+            elif tag == 'name' and not closing and folders[-1] is None:
+                name_end = xml_string.find('<', position)
+                folders[-1] = html.unescape(xml_string[position:name_end].strip())
+
+    def iter_bsmx(self, filename=None, path=None, as_model=False, chunked=False):
+        """Reads a .bsmx file and yields its recipes one at a time.
+
+        Unlike read_bsmx(), the recipes are normalized as they are consumed
+        and are not kept, so the caller can stream them to another store
+        without holding the normalized library in memory.
+
+        In the chunked mode, each recipe is parsed on its own (see
+        split_recipes()), so the parsed tree of the whole file is never
+        built either.
+
+        Args:
+            filename: The supplied filename.
+            path: The supplied directory.
+            as_model: If True, yields the recipes as Recipe records.
+            chunked: If True, parses the recipes one at a time.
 
-        return recipe_list
+        Yields:
+            The recipes, or the archive actions of an archive file.
+        """
+        self.filename = filename if filename else self.default_filename
+        self.path = path if path else self.default_path
+
+        filepath = os.path.join(self.path, self.filename)
+        if not os.path.exists(filepath):
+            return
+
+        with self.stats.stage('read_file'):
+            with open(filepath, 'r', encoding='UTF-8') as bsmx_file:
+                xml_string = bsmx_file.read()
+        self.stats.add('files_read')
+        self.stats.add('bytes_read', len(xml_string))
+
+        with self.stats.stage('replace_tags'):
+            xml_string = self.replace_tags(xml_string)
+        if not xml_string:
+            return
+
+        is_archive = xml_string.startswith('<Archive>')
+        if not is_archive and not xml_string.startswith(('<Selections>', '<Recipe>')):
+            return
+
+        if as_model:
+            from beersmith_direct.model import Recipe
+            convert = Recipe.from_dict
+        else:
+            convert = None
+
+        if chunked and not is_archive:
+            for folder_name, recipe_xml in self.split_recipes(xml_string):
+                item = self.parse_xml(recipe_xml)
+                with self.stats.stage('normalize'):
+                    recipe = self.process_recipe(item, folder_name=folder_name)
+                self.stats.add('recipes_parsed')
+                yield convert(recipe) if convert else recipe
+            return
+
+        dict_items = self.parse_xml(xml_string)
+        del xml_string
+        if not dict_items:
+            return
+
+        if is_archive:
+            for archive in self.process_archive(dict_items):
+                self.stats.add('archive_actions_parsed')
+                yield archive
+            return
+
+        for recipe in self.iter_recipes(dict_items):
+            self.stats.add('recipes_parsed')
+            yield convert(recipe) if convert else recipe
+
+    def iter_recipes(self, dict_items):
+        """Yields the normalized recipes of a parsed recipe file.
+
+        The folders are walked at any depth (see walk_folders()). The
+        recipes of the root get the name of the root as folder name.
+
+        Args:
+            dict_items: The parsed recipe file, from parse_xml().
+
+        Yields:
+            The normalized recipes.
+        """
+        yield from self.walk_folders(dict_items['data'], (), root_name=dict_items['name'])
+
+    def process_recipes(self, dict_items):
+        # To handle the recursive nature of embedded folders
+
+        # bounce out if folder is empty
+        if dict_items['data'] is None:
+            return 0
+
+        return list(self.iter_recipes(dict_items))
 
     def process_archive(self, dict_items, **kwargs):
         archive_list = dict_items['archive']
@@ -129,30 +404,73 @@ class BeersmithInterface:
         return archive_list
 
     def process_folder(self, props):
-        # initialize return variable
-        recipe_list = []
-        # props_new = props
-        # props_new['_type'] = 'folder'
-
-        folder_name = props['name']
-
-        # flatten sub data structures
-        if 'data' in props:
-            recipes_dict = self.flatten_data(props, 'recipe', 'recipes')
-            # process each recipe
-            recipe_num = 0
-            while recipe_num < len(recipes_dict['recipes']):
-                recipe_props = recipes_dict['recipes'][recipe_num]
-                recipe_props = self.process_recipe(recipe_props, folder_name=folder_name)
-                recipe_list.append(recipe_props)
-                # recipes_dict['recipes'][recipe_num] = recipe_props
-                recipe_num += 1
-
-            # # add recipe props back
-            # props_new.update(recipes_dict)
-
-        # return folder
-        return recipe_list
+        return list(self.iter_folder(props))
+
+    def iter_folder(self, props, path=()):
+        """Yields the normalized recipes of a parsed folder and its subfolders.
+
+        Args:
+            props: The parsed folder.
+            path: Tuple of the names of the parent folders.
+
+        Yields:
+            The normalized recipes.
+        """
+        yield from self.walk_folders(props.get('data'), path + (str(props['name']),))
+
+    def walk_folders(self, data, path, root_name=None):
+        """Yields the normalized recipes of a folder tree, depth first.
+
+        The tree is walked with an explicit stack of the open folders, each
+        with an iterator over its items, so there is no recursion limit on
+        the depth of the folders and no list of the items of a folder is
+        built. Each raw recipe is released from the parsed tree once it is
+        normalized.
+
+        Args:
+            data: The parsed data of the top folder, with its recipes and
+                subfolders.
+            path: Tuple of the names of the top folder and its parents.
+            root_name: Folder name of the recipes outside of any folder.
+
+        Yields:
+            The normalized recipes, with the path of their folder as folder
+            name, for example '/2021/IPA/'.
+        """
+        if not data:
+            return
+
+        # (folder path, item iterator) of the open folders
+        stack = [(path, self._folder_items(data))]
+        while stack:
+            folder_path, items = stack[-1]
+            item = next(items, None)
+            if item is None:
+                stack.pop()
+            elif item.get('xname') == 'Folder':
+                if item.get('data'):
+                    stack.append((
+                        folder_path + (str(item['name']),), self._folder_items(item['data'])
+                    ))
+            else:
+                folder_name = '/'.join(folder_path) if folder_path else root_name
+                yield self.process_recipe(item, folder_name=folder_name)
+
+    @staticmethod
+    def _folder_items(data):
+        """Yields the recipes and subfolders of the parsed data of a folder.
+
+        The items of each tag are yielded in order, and released from the
+        parsed data as they are yielded.
+        """
+        for items in data.values():
+            if isinstance(items, list):
+                for item_num, item in enumerate(items):
+                    items[item_num] = None
+                    if item:
+                        yield item
+            elif type(items) in (dict, OrderedDict):
+                yield items
 
     def process_recipe(self, props, folder_name=None):
         # initialize return variable
@@ -203,7 +521,8 @@ class BeersmithInterface:
         self.strip_key_prefixes('f_r_', props, props_new)
 
         # correct data types
-        props_new = self.correct_type(props_new)
+        with self.stats.stage('correct_type'):
+            props_new = self.correct_type(props_new)
 
         # process notes
         notes = props_new['notes']
@@ -335,13 +654,16 @@ class BeersmithInterface:
         return props_new
 
     def process_notes(self, notes):
+        import hjson
+
         # print('notes: {}'.format(notes))
 
-        try:
-            props = hjson.loads(notes)
-            # print('hjson: {}'.format(props))
-        except hjson.scanner.HjsonDecodeError:
-            props = notes
+        with self.stats.stage('notes'):
+            try:
+                props = hjson.loads(notes)
+                # print('hjson: {}'.format(props))
+            except hjson.scanner.HjsonDecodeError:
+                props = notes
 
         return props
 
@@ -387,10 +709,72 @@ class BeersmithInterface:
 
         return amount, units
 
-    @staticmethod
-    def read_xml():
-        """Reads a BeerXML file and returns a RecipeFolder of recipes
+    @profiled('read_xml')
+    def read_xml(self, filename=None, path=None, as_model=False):
+        """Reads a BeerXML file and returns a list of recipes.
+
+        Args:
+            filename: The supplied filename.
+            path: The supplied directory.
+            as_model: If True, returns the recipes as beersmith_direct.model
+                Recipe records.
+
+        Returns:
+            A list of recipes.
         """
+        return list(self.iter_xml(filename, path, as_model=as_model))
+
+    def iter_xml(self, filename=None, path=None, as_model=False, folder_name=None):
+        """Reads a BeerXML file and yields its recipes one at a time.
+
+        The file is parsed incrementally (see beersmith_direct.beerxml), so
+        the memory of a read is bounded by one recipe. The recipes have the
+        normalized shape of the recipes of read_bsmx().
+
+        Args:
+            filename: The supplied filename.
+            path: The supplied directory.
+            as_model: If True, yields the recipes as Recipe records.
+            folder_name: Name of the folder of the recipes. Defaults to the
+                name of the file, without its extension.
+
+        Yields:
+            The recipes.
+        """
+        from beersmith_direct.beerxml import iter_beerxml
+
+        self.filename = filename if filename else self.default_filename
+        self.path = path if path else self.default_path
+
+        filepath = os.path.join(self.path, self.filename)
+        if not os.path.exists(filepath):
+            return
+        if folder_name is None:
+            folder_name = os.path.splitext(os.path.basename(self.filename))[0]
+
+        if as_model:
+            from beersmith_direct.model import Recipe
+            convert = Recipe.from_dict
+        else:
+            convert = None
+
+        with open(filepath, 'rb') as xml_file:
+            self.stats.add('files_read')
+            self.stats.add('bytes_read', os.path.getsize(filepath))
+            for props in iter_beerxml(xml_file, folder_name):
+                # correct data types
+                with self.stats.stage('correct_type'):
+                    recipe = self.correct_type(props)
+
+                # process notes
+                notes = recipe['notes']
+                if notes:
+                    notes_props = self.process_notes(notes)
+                    if type(notes_props) in (dict, OrderedDict):
+                        recipe.update(notes_props)
+
+                self.stats.add('recipes_parsed')
+                yield convert(recipe) if convert else recipe
 
     def correct_type(self, invar):
         # initialize return variable
@@ -0,0 +1,201 @@
+"""Class module for the managed indexes of the recipe collections.
+
+The sync and the recipe queries read the collections by:
+
+    _id                  existence checks and digest lookups, with _id
+                         projections (the default _id index)
+    folder_name          folder queries
+    last_modified        queries of the recently modified recipes
+    style.name           style queries
+    ingredients.name     ingredient queries (a multikey index)
+    recipe_id, seq       version history heads and versions
+    ingredient_type,     ingredient catalog queries
+    name
+
+An IndexManager declares these indexes per collection and creates the
+missing ones idempotently: an index that exists with the same name and keys
+is left alone, one with the same name and other keys is replaced. The
+indexes of a collection that is bulk loaded, as by a rebuild, are created
+once the load is complete, so the load does not maintain them write by
+write.
+
+The indexes are checked once per process and collection: a connector
+created for a collection whose indexes were already ensured, by an earlier
+connector of this process, does not list them again. A rebuild, which drops
+the collection, checks them again.
+
+usage() reports the number of operations that used each index, from the
+$indexStats aggregation stage, to find the indexes that no query uses.
+"""
+# pylint: disable=logging-fstring-interpolation
+
+import logging
+import os
+import weakref
+
+# initialize logging
+logger = logging.getLogger(__name__)
+
+# (name, keys) of the indexes of the recipe collection
+RECIPE_INDEXES = (
+    ('folder_name', [('folder_name', 1)]),
+    ('last_modified', [('last_modified', -1)]),
+    ('style_name', [('style.name', 1)]),
+    ('ingredients_name', [('ingredients.name', 1)]),
+)
+
+# (name, keys) of the indexes of the version history collection
+HISTORY_INDEXES = (
+    ('recipe_id_seq', [('recipe_id', 1), ('seq', 1)]),
+)
+
+# (name, keys) of the indexes of the ingredient catalog collection
+CATALOG_INDEXES = (
+    ('ingredient_type_name', [('ingredient_type', 1), ('name', 1)]),
+)
+
+
+# names and specifications of the collections whose indexes were ensured in
+# this process, keyed by database (or by collection, for the collections that
+# do not refer to their database)
+_ensured_registry = weakref.WeakKeyDictionary()
+
+
+def _ensured(collection):
+    """Returns the set of the ensured (collection name, specifications) of
+    the database of a collection.
+    """
+    owner = getattr(collection, 'database', collection)
+    try:
+        return _ensured_registry.setdefault(owner, set())
+    except TypeError:
+        # not weakly referenceable, the indexes are checked every time
+        return set()
+
+
+def indexes_enabled():
+    """Returns True unless index management is disabled by the environment.
+
+    Environment Variables:
+        BEERSMITH_INDEXES: Set to 0, false or off to disable the creation of
+            the managed indexes.
+    """
+    return os.environ.get('BEERSMITH_INDEXES', '1').lower() not in ('0', 'false', 'off')
+
+
+def _index_keys(index):
+    """Returns the keys of an index description as a list of tuples.
+    """
+    return [(key, int(direction)) for key, direction in dict(index['key']).items()]
+
+
+class IndexManager:
+    """Declares and creates the indexes of a set of collections.
+
+    Attributes:
+        managed: List of (collection, index specifications) tuples, where the
+            specifications are (name, keys) tuples.
+    """
+    def __init__(self):
+        self.managed = []
+
+    def manage(self, collection, specs):
+        """Declares the indexes of a collection.
+
+        Args:
+            collection: The collection.
+            specs: Tuple of (name, keys) tuples, where keys is a list of
+                (field, direction) tuples.
+        """
+        self.managed.append((collection, specs))
+
+    def ensure(self, stats=None, once=False):
+        """Creates the missing indexes of the managed collections.
+
+        Args:
+            stats: SyncStats object that records the index operations.
+            once: If True, skips the collections whose indexes were already
+                ensured in this process.
+
+        Returns:
+            The list of the names of the created indexes.
+        """
+        created = []
+        for collection, specs in self.managed:
+            ensured = _ensured(collection)
+            key = (collection.name, repr(specs))
+            if once and key in ensured:
+                continue
+
+            if stats is not None:
+                with stats.stage('mongodb_index'):
+                    created.extend(self._ensure_collection(collection, specs))
+            else:
+                created.extend(self._ensure_collection(collection, specs))
+            ensured.add(key)
+
+        if created:
+            logger.debug(f'created indexes: {created}')
+            if stats is not None:
+                stats.add('indexes_created', len(created))
+
+        return created
+
+    def forget(self):
+        """Forgets that the indexes of the managed collections were ensured,
+        as when the collections are dropped.
+        """
+        for collection, specs in self.managed:
+            _ensured(collection).discard((collection.name, repr(specs)))
+
+    @staticmethod
+    def _ensure_collection(collection, specs):
+        """Creates the missing indexes of one collection.
+
+        Returns:
+            The list of the names of the created indexes.
+        """
+        existing = {index['name']: _index_keys(index) for index in collection.list_indexes()}
+
+        created = []
+        for name, keys in specs:
+            if existing.get(name) == list(keys):
+                continue
+            if name in existing:
+                logger.info(f'replacing index {collection.name}.{name}: {existing[name]} -> {keys}')
+                collection.drop_index(name)
+            collection.create_index(keys, name=name)
+            created.append(f'{collection.name}.{name}')
+
+        return created
+
+    def usage(self):
+        """Returns the usage of the indexes of the managed collections.
+
+        Returns:
+            Dictionary of dictionaries of operation counts, keyed by
+            collection name and by index name, including the indexes that
+            are not managed.
+        """
+        report = {}
+        for collection, _ in self.managed:
+            report[collection.name] = {
+                index['name']: int(index.get('accesses', {}).get('ops', 0))
+                for index in collection.aggregate([{'$indexStats': {}}])
+            }
+
+        return report
+
+    def unused(self):
+        """Returns the managed indexes that no operation used.
+
+        Returns:
+            The list of 'collection.index' names.
+        """
+        usage = self.usage()
+
+        return [
+            f'{collection.name}.{name}'
+            for collection, specs in self.managed for name, _ in specs
+            if not usage[collection.name].get(name)
+        ]
@@ -0,0 +1,206 @@
+"""Class module for the concurrent sync of several BeerSmith libraries.
+
+Each brewer keeps a separate BeerSmith library. A LibrarySync syncs a list
+of libraries concurrently in a bounded pool of threads, with one Recipes
+connector per library:
+
+    - the connectors share one MongoDB database object, so one client and
+      its connection pool serve all the runs
+    - each library has its own recipe collection and configuration object,
+      so the checkpoints (last_updated, last_id, rebuild) of a library are
+      isolated from the others, and a failed run does not stop the others
+    - the statistics of the runs are merged into one report
+
+The library definitions can be read from a JSON file with read_libraries().
+"""
+# pylint: disable=logging-fstring-interpolation
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from beersmith_direct.recipes import Recipes
+from beersmith_direct.stats import SyncStats
+
+# initialize logging
+logger = logging.getLogger(__name__)
+
+# default number of libraries synced at the same time
+DEFAULT_LIBRARY_WORKERS = 4
+
+
+class Library:
+    """Definition of a BeerSmith library.
+
+    Attributes:
+        path: Location of the BeerSmith files of the library.
+        collection: Name of the recipe collection.
+        config_name: Name of the configuration object of the checkpoints.
+        archive_filename: Name of the archive file, read by a sync.
+        recipe_filename: Name of the recipe file, read by a rebuild.
+        name: Name of the library in the report, the collection name if not
+            supplied.
+    """
+    def __init__(self, path, collection, config_name=None,
+        archive_filename='Archive.bsmx', recipe_filename='Recipe.bsmx', name=None):
+        self.path = path
+        self.collection = collection
+        self.config_name = config_name or collection
+        self.archive_filename = archive_filename
+        self.recipe_filename = recipe_filename
+        self.name = name or collection
+
+    @classmethod
+    def from_dict(cls, props):
+        """Returns the library of a definition dictionary.
+
+        Args:
+            props: Dictionary with the path and collection keys, and the
+                optional config_name, archive_filename, recipe_filename and
+                name keys.
+        """
+        return cls(**props)
+
+
+def read_libraries(filepath):
+    """Reads the library definitions of a JSON file.
+
+    Args:
+        filepath: Path of a JSON file that holds a list of library
+            definition dictionaries.
+
+    Returns:
+        The list of Library objects.
+    """
+    with open(filepath, 'r', encoding='UTF-8') as libraries_file:
+        return [Library.from_dict(props) for props in json.load(libraries_file)]
+
+
+class LibrarySync:
+    """Syncs several BeerSmith libraries concurrently.
+
+    Environment Variables:
+        BEERSMITH_LIBRARY_WORKERS: Number of libraries synced at the same
+            time.
+
+    Attributes:
+        libraries: List of Library objects.
+        library_workers: Number of libraries synced at the same time.
+        mdb: The database object shared by the connectors.
+        options: Keyword arguments of the Recipes connectors, for example
+            batch_size or workers (the parsing processes of a library).
+        results: Dictionary of the SyncStats objects of the last runs, keyed
+            by library name. A failed run has the error 'library'.
+    """
+    def __init__(self, libraries, mdb=None, library_workers=None, **options):
+        """Initializes the orchestrator.
+
+        Args:
+            libraries: List of Library objects or definition dictionaries.
+            mdb: Database object to use instead of connecting to MongoDB.
+            library_workers: Number of libraries synced at the same time.
+            **options: Keyword arguments of the Recipes connectors.
+
+        Raises:
+            ValueError: Two libraries have the same name, collection or
+                configuration object.
+        """
+        self.libraries = [
+            library if isinstance(library, Library) else Library.from_dict(library)
+            for library in libraries
+        ]
+        for attribute in ('name', 'collection', 'config_name'):
+            values = [getattr(library, attribute) for library in self.libraries]
+            if len(set(values)) != len(values):
+                raise ValueError(f'libraries with the same {attribute}: {values}')
+
+        self.library_workers = max(1, int(library_workers or os.environ.get(
+            'BEERSMITH_LIBRARY_WORKERS', DEFAULT_LIBRARY_WORKERS
+        )))
+        if mdb is None:
+            from i_mongodb import MongoDBInterface  # pylint: disable=import-outside-toplevel
+
+            mdb = MongoDBInterface().get_mdb()
+        self.mdb = mdb
+        self.options = options
+        self.results = {}
+
+    def connector(self, library):
+        """Returns the Recipes connector of a library.
+
+        Args:
+            library: The Library object.
+        """
+        return Recipes(
+            collection_name=library.collection, config_name=library.config_name,
+            mdb=self.mdb, **self.options
+        )
+
+    def run_library(self, library, rebuild=False):
+        """Syncs or rebuilds one library.
+
+        Args:
+            library: The Library object.
+            rebuild: If True, rebuilds the recipe collection.
+
+        Returns:
+            The SyncStats object of the run.
+        """
+        recipes = self.connector(library)
+        recipes.stats.enabled = True
+        if rebuild:
+            return recipes.rebuild(library.recipe_filename, library.path)
+
+        return recipes.pull(library.archive_filename, library.path)
+
+    def run(self, rebuild=False):
+        """Syncs or rebuilds all the libraries.
+
+        Args:
+            rebuild: If True, rebuilds the recipe collections.
+
+        Returns:
+            The SyncStats object that combines the runs.
+        """
+        self.results = {}
+        workers = min(self.library_workers, len(self.libraries)) or 1
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self.run_library, library, rebuild): library
+                for library in self.libraries
+            }
+            for future in as_completed(futures):
+                library = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.error(f'library {library.name} failed: {err!r}')
+                    stats = SyncStats(enabled=True)
+                    stats.error('library', err)
+                self.results[library.name] = stats
+                logger.info(f'library {library.name}: {stats.summary()}')
+
+        return self.combined_stats()
+
+    def combined_stats(self):
+        """Returns the statistics of the last runs, merged into one object.
+
+        The combined statistics count the synced and failed libraries.
+        """
+        combined = SyncStats(enabled=True)
+        for stats in self.results.values():
+            combined.merge(stats)
+            combined.add('libraries_failed' if stats.errors.get('library') else 'libraries_synced')
+
+        return combined
+
+    def report(self):
+        """Returns the report of the last runs, one line per library and a
+        total line.
+        """
+        lines = [f'{name}: {stats.summary()}' for name, stats in sorted(self.results.items())]
+        lines.append(f'total: {self.combined_stats().summary()}')
+
+        return '\n'.join(lines)
@@ -0,0 +1,162 @@
+"""In-memory stand-in for MongoDB databases and collections.
+
+The classes implement the subset of the i_mongodb and pymongo interfaces that
+this package uses, so that the sync code can run without a MongoDB server,
+for example in benchmarks. Documents are copied on write and read, like a
+round-trip through BSON. The filters and updates are the ones of
+beersmith_direct.documents.
+"""
+from copy import deepcopy
+from itertools import islice
+
+from beersmith_direct.documents import (
+    DocumentCollection, DocumentDatabase, WriteResult, _apply_update, match
+)
+
+
+class MemoryCollection(DocumentCollection):
+    """In-memory stand-in for a pymongo collection.
+
+    Attributes:
+        name: Name of the collection.
+        indexes: Dictionary of index specifications, keyed by index name.
+        op_counts: Dictionary of operation counters, keyed by method name.
+    """
+    def __init__(self, name):
+        """Initializes an empty collection.
+
+        Args:
+            name: Name of the collection.
+        """
+        super().__init__(name)
+        self._docs = {}
+        self._next_id = 0
+
+    def _find_ids(self, doc_filter, limit=None):
+        """Returns the ids of the matching documents, in insertion order.
+        """
+        if doc_filter and set(doc_filter) == {'_id'} and not isinstance(doc_filter['_id'], dict):
+            doc_id = doc_filter['_id']
+            return [doc_id] if doc_id in self._docs else []
+
+        ids = (doc_id for doc_id, doc in self._docs.items() if match(doc, doc_filter))
+        return list(islice(ids, limit))
+
+    def _find_docs(self, doc_filter, limit=None):
+        """Returns the matching documents, in insertion order.
+        """
+        return [self._docs[doc_id] for doc_id in self._find_ids(doc_filter, limit=limit)]
+
+    def _new_id(self):
+        """Returns a new document id.
+        """
+        self._next_id += 1
+        return self._next_id
+
+    def _document_count(self):
+        """Returns the number of documents.
+        """
+        return len(self._docs)
+
+    def _insert(self, document):
+        """Inserts a copy of the document.
+        """
+        doc = deepcopy(document)
+        doc_id = doc.setdefault('_id', self._new_id())
+        if doc_id in self._docs:
+            raise KeyError(f'duplicate key: {doc_id}')
+        self._docs[doc_id] = doc
+
+        return WriteResult(inserted=1, inserted_ids=[doc_id])
+
+    def _replace(self, doc_filter, replacement, upsert):
+        """Replaces or upserts a document.
+        """
+        ids = self._find_ids(doc_filter, limit=1)
+        doc = deepcopy(replacement)
+        if ids:
+            doc['_id'] = ids[0]
+            self._docs[ids[0]] = doc
+            return WriteResult(matched=1, modified=1)
+
+        if upsert:
+            if '_id' not in doc:
+                doc['_id'] = doc_filter.get('_id', self._new_id())
+            self._docs[doc['_id']] = doc
+            return WriteResult(upserted_ids={0: doc['_id']})
+
+        return WriteResult()
+
+    def _update(self, doc_filter, update, upsert, limit=None):
+        """Updates or upserts documents.
+        """
+        ids = self._find_ids(doc_filter, limit=limit)
+        for doc_id in ids:
+            _apply_update(self._docs[doc_id], update)
+        if ids:
+            return WriteResult(matched=len(ids), modified=len(ids))
+
+        if upsert:
+            doc = {key: deepcopy(val) for key, val in (doc_filter or {}).items()
+                   if not key.startswith('$') and not isinstance(val, dict)}
+            doc.setdefault('_id', self._new_id())
+            _apply_update(doc, update, inserting=True)
+            self._docs[doc['_id']] = doc
+            return WriteResult(upserted_ids={0: doc['_id']})
+
+        return WriteResult()
+
+    def _delete(self, doc_filter, limit=None):
+        """Deletes documents.
+        """
+        ids = self._find_ids(doc_filter, limit=limit)
+        for doc_id in ids:
+            del self._docs[doc_id]
+
+        return WriteResult(deleted=len(ids))
+
+    def _create_index(self, name, spec):
+        """Records an index specification.
+        """
+        self.indexes[name] = spec
+
+    def _drop_index(self, name):
+        """Removes an index specification.
+        """
+        self.indexes.pop(name, None)
+
+    def _drop(self):
+        """Deletes all documents and indexes.
+        """
+        self._docs = {}
+        self.indexes = {'_id_': {'key': [('_id', 1)]}}
+
+
+class MemoryDatabase(DocumentDatabase):
+    """In-memory stand-in for an i_mongodb MongoDBDatabase.
+
+    Attributes:
+        name: Name of the database.
+        collections: Dictionary of collections, keyed by name.
+    """
+    def __init__(self, name='memory'):
+        """Initializes an empty database.
+
+        Args:
+            name: Name of the database.
+        """
+        self.name = name
+        self.collections = {}
+
+    def read_collection(self, name):
+        """Returns the specified collection, creating it if needed.
+        """
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(name)
+
+        return self.collections[name]
+
+    def delete_collection(self, name):
+        """Deletes the specified collection.
+        """
+        self.collections.pop(name, None)
@@ -0,0 +1,322 @@
+"""Compact object model of normalized recipes.
+
+Normalized recipes are nested dictionaries that repeat the same keys for
+every ingredient, mash step and reading. The model stores each object as a
+frozen, slotted record with a tuple of values and a shared Shape, the
+interned tuple of its keys, so the keys are stored once per distinct key
+set instead of once per object. Enum-like string values (ingredient_type,
+subtype, form_text, units) are interned as well.
+
+Records are read-only mappings, so code written for the dictionary shape
+keeps working:
+
+    recipe = Recipe.from_dict(recipe_dict)
+    recipe.name, recipe['name'], recipe.get('style')['name']
+    recipe.ingredients[0].subtype
+    recipe.to_dict() == recipe_dict
+    recipe == recipe_dict
+
+A record equals the mappings that hold the same items, with its tuples
+compared as the lists of the dictionary shape. Like dictionaries, records
+are not hashable.
+
+Conversion shares the scalar values with the source instead of copying
+them; lists become tuples, and the dictionaries shared by the source (the
+ingredients of 'ingredients' and 'ingredients_by_type') stay shared.
+"""
+from collections.abc import Mapping
+from dataclasses import dataclass
+import sys
+from typing import ClassVar
+
+# string values that are interned, as they repeat across records
+INTERNED_FIELDS = frozenset((
+    '_type', 'ingredient_type', 'subtype', 'form_text', 'units', 'folder_name',
+))
+
+# interned key tuples, keyed by themselves
+_shapes = {}
+
+
+class Shape:
+    """Interned tuple of record keys, with the position of each key.
+
+    Attributes:
+        keys: Tuple of the interned keys.
+        positions: Dictionary of the positions, keyed by key.
+    """
+    __slots__ = ('keys', 'positions')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.positions = {key: position for position, key in enumerate(keys)}
+
+    def __reduce__(self):
+        return (shape_of, (self.keys,))
+
+    def __repr__(self):
+        return f'Shape{self.keys!r}'
+
+
+def shape_of(keys):
+    """Returns the shared Shape of a sequence of keys.
+
+    Args:
+        keys: The record keys, in order.
+    """
+    keys = tuple(keys)
+    shape = _shapes.get(keys)
+    if shape is None:
+        shape = _shapes[keys] = Shape(tuple(sys.intern(key) for key in keys))
+
+    return shape
+
+
+def _field(key, doc):
+    """Returns a read-only property for a record key.
+    """
+    return property(lambda self: self.get(key), doc=doc)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Record(Mapping):
+    """Read-only mapping of values with a shared Shape.
+
+    Subclasses define the record type of their children: children maps a
+    key to the record class of its value (or of the items of its list), and
+    child_default applies to the other keys.
+
+    Attributes:
+        shape: The Shape of the keys.
+        _values: Tuple of the values, in the order of the keys. The name
+            leaves values() to the Mapping interface.
+    """
+    shape: Shape
+    _values: tuple
+
+    children: ClassVar[dict] = {}
+    child_default: ClassVar[type] = None
+
+    def __getitem__(self, key):
+        position = self.shape.positions.get(key)
+        if position is None:
+            raise KeyError(key)
+
+        return self._values[position]
+
+    def __iter__(self):
+        return iter(self.shape.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self.shape.positions
+
+    def get(self, key, default=None):
+        position = self.shape.positions.get(key)
+
+        return default if position is None else self._values[position]
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        elif not isinstance(other, Mapping):
+            return NotImplemented
+
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    @classmethod
+    def from_dict(cls, props, memo=None):
+        """Returns the record of a dictionary.
+
+        Args:
+            props: The dictionary.
+            memo: Dictionary of the records already converted, keyed by the
+                id() of their dictionary, to keep shared objects shared.
+
+        Returns:
+            The record.
+        """
+        if memo is None:
+            memo = {}
+
+        record = memo.get(id(props))
+        if record is not None:
+            return record
+
+        values = []
+        for key, value in props.items():
+            child_cls = cls.children.get(key, cls.child_default or Record)
+            values.append(_from_value(key, value, child_cls, memo))
+
+        record = memo[id(props)] = cls(shape_of(props), tuple(values))
+
+        return record
+
+    def to_dict(self, memo=None):
+        """Returns the record as a dictionary, in the normalized recipe shape.
+
+        Args:
+            memo: Dictionary of the dictionaries already converted, keyed by
+                the id() of their record.
+        """
+        if memo is None:
+            memo = {}
+
+        props = memo.get(id(self))
+        if props is not None:
+            return props
+
+        props = memo[id(self)] = {}
+        for key, value in zip(self.shape.keys, self._values):
+            props[key] = _to_value(value, memo)
+
+        return props
+
+
+def _from_value(key, value, cls, memo):
+    """Converts a dictionary value to its model value.
+    """
+    if isinstance(value, dict):
+        return cls.from_dict(value, memo)
+    if isinstance(value, list):
+        return tuple(_from_value(key, item, cls, memo) for item in value)
+    if key in INTERNED_FIELDS and isinstance(value, str):
+        return sys.intern(value)
+
+    return value
+
+
+def _to_value(value, memo):
+    """Converts a model value to its dictionary value.
+    """
+    if isinstance(value, Record):
+        return value.to_dict(memo)
+    if isinstance(value, tuple):
+        return [_to_value(item, memo) for item in value]
+
+    return value
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Ingredient(Record):
+    """Ingredient of a recipe.
+    """
+    name = _field('name', 'Name of the ingredient.')
+    ingredient_type = _field('ingredient_type', 'Type: grain, hops, yeast, misc or water.')
+    subtype = _field('subtype', 'Subtype, for example pellet hops.')
+    form_text = _field('form_text', 'Form of hops and yeast.')
+    units = _field('units', 'Units of the amount.')
+    amount = _field('amount', 'Amount, in the units.')
+    order = _field('order', 'Position in the recipe.')
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class IngredientGroups(Record):
+    """Ingredients of a recipe, grouped by type.
+    """
+    child_default: ClassVar[type] = Ingredient
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class MashStep(Record):
+    """Step of a mash profile.
+    """
+    name = _field('name', 'Name of the step.')
+    step_temp = _field('step_temp', 'Temperature of the step.')
+    step_time = _field('step_time', 'Duration of the step, in minutes.')
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Mash(Record):
+    """Mash profile of a recipe.
+    """
+    children: ClassVar[dict] = {'mashsteps': MashStep}
+
+    name = _field('name', 'Name of the mash profile.')
+    mashsteps = _field('mashsteps', 'Tuple of the MashStep records.')
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class FermentReading(Record):
+    """Fermentation reading of a recipe.
+    """
+    date = _field('date', 'Date of the reading.')
+    gravity = _field('gravity', 'Specific gravity.')
+    temp = _field('temp', 'Temperature.')
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Ferment(Record):
+    """Fermentation profile of a recipe.
+    """
+    children: ClassVar[dict] = {'readings': FermentReading}
+
+    name = _field('name', 'Name of the fermentation profile.')
+    readings = _field('readings', 'Tuple of the FermentReading records.')
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Equipment(Record):
+    """Equipment profile of a recipe.
+    """
+    name = _field('name', 'Name of the equipment profile.')
+    batch_vol = _field('batch_vol', 'Batch volume, in fluid ounces.')
+    boil_vol = _field('boil_vol', 'Boil volume, in fluid ounces.')
+    efficiency = _field('efficiency', 'Mash efficiency, in percent.')
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Style(Record):
+    """Style of a recipe.
+    """
+    name = _field('name', 'Name of the style.')
+    category = _field('category', 'Category of the style.')
+    guide = _field('guide', 'Style guide.')
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Recipe(Record):
+    """Normalized BeerSmith recipe.
+    """
+    children: ClassVar[dict] = {
+        'ingredients': Ingredient,
+        'ingredients_by_type': IngredientGroups,
+        'mash': Mash,
+        'ferment': Ferment,
+        'equipment': Equipment,
+        'style': Style,
+    }
+
+    name = _field('name', 'Name of the recipe.')
+    recipe_id = _field('_id', 'Identifier of the recipe.')
+    folder_name = _field('folder_name', 'Folder of the recipe, for example /Production/.')
+    ingredients = _field('ingredients', 'Tuple of the Ingredient records.')
+    mash = _field('mash', 'The Mash record.')
+    ferment = _field('ferment', 'The Ferment record.')
+    equipment = _field('equipment', 'The Equipment record.')
+    style = _field('style', 'The Style record.')
+
+    @property
+    def mash_steps(self):
+        """Returns the MashStep records.
+        """
+        return (self.mash or {}).get('mashsteps', ())
+
+    @property
+    def readings(self):
+        """Returns the FermentReading records.
+        """
+        return (self.ferment or {}).get('readings', ())
+
+
+def to_model(recipes):
+    """Returns the Recipe records of normalized recipes.
+
+    Args:
+        recipes: Iterable of normalized recipe dictionaries.
+    """
+    return [Recipe.from_dict(recipe) for recipe in recipes]
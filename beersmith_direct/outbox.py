@@ -0,0 +1,242 @@
+"""Class module for the change feed of a recipe collection.
+
+Each recipe write of a sync is recorded in an outbox collection, named after
+the recipe collection (for example recipes_changes), in the same batches as
+the recipe writes:
+
+    {'_id': 42, 'recipe_id': 'Pale Ale', 'action': 'upsert',
+     'timestamp': datetime(...), 'digest': '5f0c...', 'written': 1612137600.0}
+
+The identifiers are consecutive integers, in the order of the writes, and
+serve as the tokens of the consumers: changes_since(token) returns the
+changes after a token and the token to resume from, so a consumer reads the
+deltas instead of rescanning the recipe collection. The timestamp is the
+date of the archive action (the start of the run for a rebuild) and the
+digest is the content address of the stored document (see
+beersmith_direct.references.content_id()), None for a deletion. written is
+the time of the insert, in seconds since the epoch.
+
+The identifiers are allocated by flush() from a counter document, in the
+<prefix>_changes_seq collection, advanced atomically with $inc, so writers
+never reuse an identifier, even when prune() deleted every change. The
+changes are inserted: a write that collides with an existing change fails
+instead of replacing it. With several writers, a change can be written just
+after a change with a larger identifier, by a writer that allocated first,
+so changes_since() stops at the first missing identifier: the consumer reads
+it on a later call. A gap that is still open settle_seconds after the next
+change was written is taken as permanent (a writer that failed after its
+allocation) and skipped. The identifiers deleted by prune() and drop() are
+recorded in the counter document, as the pruned token, and are not gaps.
+
+A rebuild records a 'reset' change, with no recipe_id, before the upserts
+of the reloaded recipes: the consumers discard what they know of the
+collection and apply the changes that follow.
+"""
+import time
+
+from pymongo import InsertOne
+from pymongo.collection import ReturnDocument
+
+from beersmith_direct.references import content_id
+
+# _id of the counter document of the change identifiers
+SEQUENCE_ID = 'changes'
+
+# default number of seconds after which a gap in the identifiers is skipped
+DEFAULT_SETTLE_SECONDS = 60
+
+
+class ChangeOutbox:
+    """Change feed of the recipe writes.
+
+    Changes are queued by record() and written by flush(), with one bulk
+    write.
+
+    Attributes:
+        collection: The outbox collection.
+        sequence: The collection of the identifier counter.
+        settle_seconds: Number of seconds after which changes_since() skips
+            a gap in the identifiers.
+    """
+    def __init__(self, mdb, prefix, settle_seconds=DEFAULT_SETTLE_SECONDS):
+        """Initializes the outbox.
+
+        Args:
+            mdb: The database.
+            prefix: Prefix of the collection name, usually the name of the
+                recipe collection.
+            settle_seconds: Number of seconds after which changes_since()
+                skips a gap in the identifiers.
+        """
+        self.collection = mdb.read_collection(f'{prefix}_changes')
+        self.sequence = mdb.read_collection(f'{prefix}_changes_seq')
+        self.settle_seconds = settle_seconds
+
+        # the counter is seeded on first flush()
+        self._seeded = False
+        self._pending = []
+
+    def last_token(self):
+        """Returns the token of the last allocated change, 0 if there is none.
+        """
+        counter = self.sequence.find_one({'_id': SEQUENCE_ID})
+        if counter is not None:
+            return counter['seq']
+
+        return self._last_written_id()
+
+    def _last_written_id(self):
+        """Returns the identifier of the last written change, 0 if there is none.
+        """
+        latest = list(self.collection.find({}, projection=['_id'], sort=[('_id', -1)], limit=1))
+
+        return latest[0]['_id'] if latest else 0
+
+    def _pruned_token(self):
+        """Returns the token of the last pruned change, 0 if there is none.
+        """
+        counter = self.sequence.find_one({'_id': SEQUENCE_ID})
+
+        return counter.get('pruned', 0) if counter is not None else 0
+
+    def _seed(self):
+        """Creates the counter document if needed.
+
+        The counter of an outbox written before it existed starts at the
+        identifier of its last change.
+        """
+        if not self._seeded:
+            self.sequence.update_one(
+                {'_id': SEQUENCE_ID}, {'$setOnInsert': {'seq': self._last_written_id()}},
+                upsert=True
+            )
+            self._seeded = True
+
+    def _allocate(self, count):
+        """Allocates consecutive change identifiers.
+
+        Args:
+            count: Number of identifiers.
+
+        Returns:
+            The first allocated identifier.
+        """
+        self._seed()
+        counter = self.sequence.find_one_and_update(
+            {'_id': SEQUENCE_ID}, {'$inc': {'seq': count}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+
+        return counter['seq'] - count + 1
+
+    def record(self, writes):
+        """Queues the changes of a batch of recipe writes.
+
+        Args:
+            writes: List of (action, recipe_id, document, timestamp) tuples,
+                where action is 'upsert', 'delete' or 'reset' and document is
+                the stored recipe document, None for the other actions.
+
+        Returns:
+            The number of queued changes.
+        """
+        for action, recipe_id, document, timestamp in writes:
+            self._pending.append({
+                'recipe_id': recipe_id,
+                'action': action,
+                'timestamp': timestamp,
+                'digest': content_id(document) if document is not None else None,
+            })
+
+        return len(writes)
+
+    def pending_count(self):
+        """Returns the number of queued changes.
+        """
+        return len(self._pending)
+
+    def flush(self, stats=None):
+        """Allocates the identifiers of the queued changes and inserts them
+        with one bulk write.
+
+        Args:
+            stats: SyncStats object that records the writes.
+
+        Returns:
+            The number of changes written.
+        """
+        if not self._pending:
+            return 0
+
+        pending = self._pending
+        self._pending = []
+        first_id = self._allocate(len(pending))
+        written = time.time()
+        requests = [
+            InsertOne({'_id': first_id + num, **entry, 'written': written})
+            for num, entry in enumerate(pending)
+        ]
+        if stats is not None:
+            with stats.stage('mongodb_write'):
+                self.collection.bulk_write(requests, ordered=False)
+            stats.add('changes_written', len(requests))
+        else:
+            self.collection.bulk_write(requests, ordered=False)
+
+        return len(pending)
+
+    def changes_since(self, token=None, limit=None):
+        """Returns the changes after a token.
+
+        The changes stop before the first missing identifier, unless the
+        gap has been open for settle_seconds.
+
+        Args:
+            token: Token returned by a previous call, None to read from the
+                first change.
+            limit: Largest number of changes to return, all if None.
+
+        Returns:
+            Tuple of the list of changes, in order, and the token of the
+            last one, the given token if there is no new change.
+        """
+        token = token or 0
+        kwargs = {'sort': [('_id', 1)]}
+        if limit:
+            kwargs['limit'] = limit
+        changes = list(self.collection.find({'_id': {'$gt': token}}, **kwargs))
+
+        expected = max(token, self._pruned_token()) + 1 if changes else None
+        settled = time.time() - self.settle_seconds
+        for position, change in enumerate(changes):
+            if change['_id'] > expected and change.get('written', settled) > settled:
+                del changes[position:]
+                break
+            expected = change['_id'] + 1
+
+        return changes, changes[-1]['_id'] if changes else token
+
+    def prune(self, token):
+        """Deletes the changes up to a token, read by all the consumers.
+
+        Args:
+            token: Token of the last change to delete.
+
+        Returns:
+            The number of deleted changes.
+        """
+        self._seed()
+        self.sequence.update_one({'_id': SEQUENCE_ID}, {'$max': {'pruned': token}})
+
+        return self.collection.delete_many({'_id': {'$lte': token}}).deleted_count
+
+    def drop(self):
+        """Drops the outbox collection.
+
+        The identifier counter is kept, so the tokens of the consumers stay
+        valid for the changes written after the drop.
+        """
+        self._seed()
+        self.sequence.update_one({'_id': SEQUENCE_ID}, {'$max': {'pruned': self.last_token()}})
+        self.collection.drop()
+        self._pending = []
@@ -0,0 +1,255 @@
+"""Profiling mode for sync runs.
+
+When profiling is enabled, the methods decorated with profiled() (pull,
+rebuild and read_bsmx) run under cProfile and, optionally, tracemalloc. The
+profile and the top allocation sites are written to the profile directory,
+and a summary of the hottest functions in i_beersmith.py and recipes.py is
+logged.
+
+Profiling is enabled with the BEERSMITH_PROFILE environment variable or the
+profile argument of BeersmithInterface, Connector and Recipes. Nested
+profiled calls run under the outermost profiler of their thread, so the
+threads of a LibrarySync do not share it.
+"""
+# pylint: disable=logging-fstring-interpolation
+# pylint: disable=import-outside-toplevel
+
+from dataclasses import dataclass
+from datetime import datetime
+import functools
+import logging
+import os
+import threading
+
+# initialize logging
+logger = logging.getLogger(__name__)
+
+# source files included in the logged summary
+SUMMARY_FILES = ('i_beersmith.py', 'recipes.py')
+
+# the profiler that is running in each thread, in its profiler attribute
+_running = threading.local()
+
+
+@dataclass
+class ProfileSettings:
+    """Settings of the profiling mode.
+
+    Environment Variables:
+        BEERSMITH_PROFILE: Set to 1, true or on to enable profiling.
+        BEERSMITH_PROFILE_DIR: Directory of the profile files.
+        BEERSMITH_PROFILE_TOP: Number of allocation sites to snapshot with
+            tracemalloc, 0 to disable tracemalloc.
+        BEERSMITH_PROFILE_CPROFILE: Set to 0 to disable the cProfile dump.
+
+    Attributes:
+        enabled: Enables profiling.
+        directory: Directory of the profile files. If None, nothing is
+            written and only the summary is logged.
+        cprofile: Writes the cProfile dump.
+        tracemalloc_top: Number of allocation sites in the tracemalloc
+            snapshot, 0 to disable tracemalloc.
+        summary_limit: Number of functions in the logged summary.
+    """
+    enabled: bool = False
+    directory: str = None
+    cprofile: bool = True
+    tracemalloc_top: int = 0
+    summary_limit: int = 10
+
+    @classmethod
+    def from_env(cls):
+        """Returns the settings specified by the environment.
+        """
+        return cls(
+            enabled=os.environ.get('BEERSMITH_PROFILE', '').lower() in ('1', 'true', 'on'),
+            directory=os.environ.get('BEERSMITH_PROFILE_DIR'),
+            cprofile=os.environ.get('BEERSMITH_PROFILE_CPROFILE', '1').lower()
+                not in ('0', 'false', 'off'),
+            tracemalloc_top=int(os.environ.get('BEERSMITH_PROFILE_TOP', '0')),
+        )
+
+
+def active_profiler():
+    """Returns the profiler that is running in the current thread, or None.
+    """
+    return getattr(_running, 'profiler', None)
+
+
+def profile_settings(profile=None):
+    """Returns profile settings from the profile argument of a class.
+
+    Args:
+        profile: ProfileSettings object, a boolean to enable or disable
+            profiling with the settings from the environment, or None to use
+            the settings from the environment.
+
+    Returns:
+        The ProfileSettings object.
+    """
+    if isinstance(profile, ProfileSettings):
+        return profile
+
+    settings = ProfileSettings.from_env()
+    if profile is not None:
+        settings.enabled = bool(profile)
+
+    return settings
+
+
+class Profiler:
+    """Context manager that profiles a run.
+
+    Attributes:
+        name: Name of the profiled run, used in the file names.
+        settings: The ProfileSettings object.
+        profile_path: Path of the written cProfile dump, if any.
+        alloc_path: Path of the written allocation snapshot, if any.
+        summary: List of the hottest functions, as dictionaries.
+        top_allocations: List of the top allocation sites, as strings.
+    """
+    def __init__(self, name, settings):
+        """Initializes the profiler.
+
+        Args:
+            name: Name of the profiled run.
+            settings: The ProfileSettings object.
+        """
+        self.name = name
+        self.settings = settings
+        self.profile_path = None
+        self.alloc_path = None
+        self.summary = []
+        self.top_allocations = []
+        self._profile = None
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        import cProfile
+        import tracemalloc
+
+        _running.profiler = self
+
+        if self.settings.tracemalloc_top and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        import tracemalloc
+
+        self._profile.disable()
+
+        snapshot = None
+        if self.settings.tracemalloc_top:
+            snapshot = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+        _running.profiler = None
+
+        stamp = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        basename = None
+        if self.settings.directory:
+            os.makedirs(self.settings.directory, exist_ok=True)
+            basename = os.path.join(self.settings.directory, f'{self.name}-{stamp}')
+
+        if basename and self.settings.cprofile:
+            self.profile_path = f'{basename}.prof'
+            self._profile.dump_stats(self.profile_path)
+
+        if snapshot is not None:
+            self.top_allocations = [
+                str(stat) for stat in
+                snapshot.statistics('lineno')[:self.settings.tracemalloc_top]
+            ]
+            if basename:
+                self.alloc_path = f'{basename}-alloc.txt'
+                with open(self.alloc_path, 'w', encoding='UTF-8') as alloc_file:
+                    alloc_file.write('\n'.join(self.top_allocations) + '\n')
+
+        self.summary = hot_functions(self._profile, self.settings.summary_limit)
+        self.log_summary()
+
+    def log_summary(self):
+        """Logs the hottest functions of the package.
+        """
+        logger.info(f'profile of {self.name}: {len(self.summary)} hottest functions')
+        for func in self.summary:
+            logger.info(
+                f'  {func["function"]} ({func["file"]}:{func["line"]}) '
+                f'calls={func["calls"]} tottime={func["tottime"]:.4f}s '
+                f'cumtime={func["cumtime"]:.4f}s'
+            )
+        if self.profile_path:
+            logger.info(f'  profile written: {self.profile_path}')
+        if self.alloc_path:
+            logger.info(f'  allocations written: {self.alloc_path}')
+
+
+def hot_functions(profile, limit=10, files=SUMMARY_FILES):
+    """Returns the hottest functions of the given source files.
+
+    Args:
+        profile: cProfile.Profile object.
+        limit: Maximum number of functions.
+        files: Basenames of the source files to include.
+
+    Returns:
+        List of dictionaries, sorted by cumulative time.
+    """
+    import pstats
+
+    stats = pstats.Stats(profile)
+    functions = [
+        {
+            'function': funcname,
+            'file': os.path.basename(filename),
+            'line': lineno,
+            'calls': calls,
+            'tottime': tottime,
+            'cumtime': cumtime,
+        }
+        # pylint: disable=no-member
+        for (filename, lineno, funcname), (_, calls, tottime, cumtime, _)
+        in stats.stats.items()
+        if os.path.basename(filename) in files
+    ]
+    functions.sort(key=lambda func: func['cumtime'], reverse=True)
+
+    return functions[:limit]
+
+
+def profiled(name):
+    """Decorator that profiles a method when profiling is enabled.
+
+    The instance must have a profile attribute with the ProfileSettings.
+    The Profiler object of the last profiled call is stored in the
+    last_profile attribute of the instance.
+
+    Args:
+        name: Name of the profiled run.
+
+    Returns:
+        The decorator.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            settings = getattr(self, 'profile', None)
+            if not settings or not settings.enabled or active_profiler() is not None:
+                return method(self, *args, **kwargs)
+
+            with Profiler(name, settings) as profiler:
+                result = method(self, *args, **kwargs)
+            self.last_profile = profiler
+
+            return result
+
+        return wrapper
+
+    return decorator
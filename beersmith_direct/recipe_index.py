@@ -0,0 +1,346 @@
+"""Class module for the in-memory inverted index of recipes.
+
+A RecipeIndex maps the values of a few recipe fields to the identifiers of
+the recipes that contain them, so questions like "which recipes use Citra
+pellet hops" or "all recipes with style X" are answered without scanning
+the recipe collection or parsing the library:
+
+    index = RecipeIndex.from_recipes(bsm.read_bsmx())
+    index.find(ingredient='Citra', subtype='pellet hops')
+    index.find_ingredient(name='Citra', subtype='pellet hops')
+    index.find_any(style=['American IPA', 'Double IPA'])
+    index.in_folder('/Production/')
+
+Values are matched case-insensitively. The index is kept up to date during a
+sync by registering apply() as a write hook of the Recipes connector, and can
+be saved to disk for a fast warm start.
+"""
+import os
+import pickle
+
+# fields of the inverted index
+FIELDS = ('ingredient', 'ingredient_type', 'subtype', 'folder', 'style', 'equipment')
+
+# version of the saved index format
+INDEX_VERSION = 1
+
+
+def _key(value):
+    """Returns the index key of a value.
+    """
+    if value is None:
+        return None
+
+    return str(value).strip().casefold()
+
+
+def recipe_entry(recipe):
+    """Returns the indexed fields of a normalized recipe.
+
+    Args:
+        recipe: Normalized recipe, as produced by read_bsmx().
+
+    Returns:
+        Dictionary with the folder, style and equipment keys, and the
+        ingredients as (name, ingredient_type, subtype) key tuples.
+    """
+    return {
+        'folder': _key(recipe.get('folder_name')),
+        'style': _key((recipe.get('style') or {}).get('name')),
+        'equipment': _key((recipe.get('equipment') or {}).get('name')),
+        'ingredients': tuple(dict.fromkeys(
+            (
+                _key(ingredient.get('name')),
+                _key(ingredient.get('ingredient_type')),
+                _key(ingredient.get('subtype')),
+            )
+            for ingredient in recipe.get('ingredients') or []
+        )),
+    }
+
+
+def _entry_keys(entry):
+    """Yields the (field, key) pairs of an entry.
+    """
+    for field in ('folder', 'style', 'equipment'):
+        if entry[field] is not None:
+            yield field, entry[field]
+
+    for name, ingredient_type, subtype in entry['ingredients']:
+        for field, key in (
+            ('ingredient', name),
+            ('ingredient_type', ingredient_type),
+            ('subtype', subtype),
+        ):
+            if key is not None:
+                yield field, key
+
+
+class RecipeIndex:
+    """Inverted indexes over ingredient, folder, style and equipment.
+
+    Attributes:
+        postings: Dictionary of {key: set of recipe identifiers}
+            dictionaries, keyed by field.
+        entries: Dictionary of indexed fields, keyed by recipe identifier.
+    """
+    def __init__(self):
+        """Initializes an empty index.
+        """
+        self.postings = {field: {} for field in FIELDS}
+        self.entries = {}
+
+    @classmethod
+    def from_recipes(cls, recipes):
+        """Returns the index of normalized recipes.
+
+        Args:
+            recipes: Iterable of normalized recipes.
+        """
+        index = cls()
+        for recipe in recipes:
+            index.add(recipe)
+
+        return index
+
+    @classmethod
+    def from_collection(cls, collection):
+        """Returns the index of the recipes in a MongoDB collection.
+
+        Args:
+            collection: The recipe collection.
+        """
+        projection = {
+            'name': 1, 'folder_name': 1, 'style.name': 1, 'equipment.name': 1,
+            'ingredients.name': 1, 'ingredients.ingredient_type': 1,
+            'ingredients.subtype': 1,
+        }
+
+        index = cls()
+        for recipe in collection.find({}, projection=projection):
+            index.add(recipe, recipe_id=recipe['_id'])
+
+        return index
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, recipe_id):
+        return recipe_id in self.entries
+
+    def add(self, recipe, recipe_id=None):
+        """Adds or replaces a recipe.
+
+        Args:
+            recipe: Normalized recipe.
+            recipe_id: Identifier of the recipe. Defaults to its name.
+        """
+        if recipe_id is None:
+            recipe_id = recipe['name']
+        if recipe_id in self.entries:
+            self.remove(recipe_id)
+
+        entry = recipe_entry(recipe)
+        self.entries[recipe_id] = entry
+        for field, key in _entry_keys(entry):
+            self.postings[field].setdefault(key, set()).add(recipe_id)
+
+    def remove(self, recipe_id):
+        """Removes a recipe, if indexed.
+
+        Args:
+            recipe_id: Identifier of the recipe.
+        """
+        entry = self.entries.pop(recipe_id, None)
+        if entry is None:
+            return
+
+        for field, key in _entry_keys(entry):
+            recipe_ids = self.postings[field].get(key)
+            if recipe_ids is not None:
+                recipe_ids.discard(recipe_id)
+                if not recipe_ids:
+                    del self.postings[field][key]
+
+    def clear(self):
+        """Removes all recipes.
+        """
+        self.postings = {field: {} for field in FIELDS}
+        self.entries = {}
+
+    def apply(self, action, recipe_id, recipe=None):
+        """Applies a recipe write, as a write hook of the Recipes connector.
+
+        Args:
+            action: 'upsert', 'delete' or 'reset'.
+            recipe_id: Identifier of the recipe.
+            recipe: The upserted recipe.
+        """
+        if action == 'upsert':
+            self.add(recipe, recipe_id)
+        elif action == 'delete':
+            self.remove(recipe_id)
+        elif action == 'reset':
+            self.clear()
+
+    def get(self, field, value):
+        """Returns the recipes with a field value.
+
+        Args:
+            field: Name of the field, one of FIELDS.
+            value: The value, or a list of values to match any of.
+
+        Returns:
+            Set of recipe identifiers.
+        """
+        if field not in self.postings:
+            raise KeyError(f'unknown index field: {field}')
+
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return set().union(*(self.get(field, item) for item in value))
+
+        return set(self.postings[field].get(_key(value), ()))
+
+    def find(self, **criteria):
+        """Returns the recipes that match all criteria (intersection).
+
+        Args:
+            **criteria: Field values, as keyword arguments. A list of values
+                matches any of them.
+
+        Returns:
+            Set of recipe identifiers.
+        """
+        result = None
+        # intersect the smallest sets first
+        for recipe_ids in sorted(
+            (self.get(field, value) for field, value in criteria.items()), key=len
+        ):
+            result = recipe_ids if result is None else result & recipe_ids
+            if not result:
+                break
+
+        return result if result is not None else set(self.entries)
+
+    def find_any(self, **criteria):
+        """Returns the recipes that match any criterion (union).
+
+        Args:
+            **criteria: Field values, as keyword arguments.
+
+        Returns:
+            Set of recipe identifiers.
+        """
+        return set().union(*(self.get(field, value) for field, value in criteria.items()))
+
+    def find_ingredient(self, name=None, ingredient_type=None, subtype=None):
+        """Returns the recipes with one ingredient that matches all values.
+
+        Unlike find(), the values must match the same ingredient.
+
+        Args:
+            name: Name of the ingredient.
+            ingredient_type: Type of the ingredient, for example 'hops'.
+            subtype: Subtype of the ingredient, for example 'pellet hops'.
+
+        Returns:
+            Set of recipe identifiers.
+        """
+        criteria = {
+            field: value for field, value in (
+                ('ingredient', name), ('ingredient_type', ingredient_type),
+                ('subtype', subtype),
+            ) if value is not None
+        }
+        wanted = (_key(name), _key(ingredient_type), _key(subtype))
+
+        def matches(ingredient):
+            return all(
+                want is None or want == have for want, have in zip(wanted, ingredient)
+            )
+
+        return {
+            recipe_id for recipe_id in self.find(**criteria)
+            if any(matches(ingredient) for ingredient in self.entries[recipe_id]['ingredients'])
+        }
+
+    def in_folder(self, folder, recursive=True):
+        """Returns the recipes in a folder.
+
+        Args:
+            folder: Folder name, for example '/Production/'. The trailing
+                slash is optional: '/Prod' does not match '/Production/'.
+            recursive: If True, includes the recipes of the subfolders.
+
+        Returns:
+            Set of recipe identifiers.
+
+        Raises:
+            ValueError: The folder is not set.
+        """
+        if folder is None:
+            raise ValueError('folder not set')
+
+        folder_key = _key(folder)
+        if not folder_key.endswith('/'):
+            folder_key += '/'
+        if not recursive:
+            return self.get('folder', folder_key)
+
+        return set().union(*(
+            recipe_ids for key, recipe_ids in self.postings['folder'].items()
+            if key.startswith(folder_key)
+        ))
+
+    def values(self, field):
+        """Returns the indexed values of a field with their recipe counts.
+
+        Args:
+            field: Name of the field.
+
+        Returns:
+            Dictionary of recipe counts, keyed by value.
+        """
+        return {key: len(recipe_ids) for key, recipe_ids in self.postings[field].items()}
+
+    def save(self, filepath):
+        """Writes the index to a file.
+
+        The file is replaced atomically.
+
+        Args:
+            filepath: Path of the index file.
+        """
+        state = {
+            'version': INDEX_VERSION,
+            'entries': self.entries,
+            'postings': self.postings,
+        }
+        with open(f'{filepath}.tmp', 'wb') as index_file:
+            pickle.dump(state, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{filepath}.tmp', filepath)
+
+    @classmethod
+    def load(cls, filepath):
+        """Reads an index written by save().
+
+        Args:
+            filepath: Path of the index file.
+
+        Returns:
+            The RecipeIndex object.
+
+        Raises:
+            ValueError: The file was written by another index version.
+        """
+        with open(filepath, 'rb') as index_file:
+            state = pickle.load(index_file)
+
+        if state.get('version') != INDEX_VERSION:
+            raise ValueError(f'unsupported index version: {state.get("version")}')
+
+        index = cls()
+        index.entries = state['entries']
+        index.postings = state['postings']
+
+        return index
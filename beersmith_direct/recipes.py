@@ -1,41 +1,219 @@
 """Recipes classes.
+
+Recipe, the record of beersmith_direct.model, is also importable from this
+module.
 """
 # pylint: disable=logging-fstring-interpolation
 
 import os.path
 
-from dataclasses import dataclass
 from datetime import datetime
 
 from aracnid_logger import Logger
-from dateutil.parser import parse
+from pymongo import DeleteOne, ReplaceOne
 from pymongo.collection import ReturnDocument
 
+from beersmith_direct.budget import MemoryBudget
+from beersmith_direct.catalog import IngredientCatalog
 from beersmith_direct.connector import Connector
+from beersmith_direct.history import RecipeHistory
+from beersmith_direct.index_manager import (
+    CATALOG_INDEXES, HISTORY_INDEXES, RECIPE_INDEXES, IndexManager, indexes_enabled
+)
+from beersmith_direct.model import Recipe, Record
+from beersmith_direct.outbox import ChangeOutbox
+from beersmith_direct.profiling import profiled
+from beersmith_direct.references import ReferenceStore
+from beersmith_direct.replay import (
+    BARRIER_ACTIONS, EDIT_ACTIONS, LowWaterMark, plan_replay, run_partitions
+)
 
 # initialize logging
 logger = Logger(__name__).get_logger()
 
+__all__ = ['Recipe', 'Recipes']
+
+# default number of queued writes per bulk_write()
+DEFAULT_BATCH_SIZE = 100
+
 
 class Recipes(Connector):
     """Contains the code to connect and process recipes from Beersmith.
+
+    Recipe writes of update_recipes() and pull() are queued and sent to
+    MongoDB with bulk_write() in batches. At every checkpoint, the queued
+    writes are sent before the configuration properties are written, so the
+    saved last_updated never gets ahead of the recipe collection.
+
+    Environment Variables:
+        BEERSMITH_BATCH_SIZE: Number of queued writes per bulk_write().
+        BEERSMITH_CHECKPOINT_INTERVAL: Number of recipes or archive actions
+            between checkpoints, 0 to checkpoint at the end of the run only.
+        BEERSMITH_WORKERS: Number of processes that parse the recipe files
+            of the archive.
+        BEERSMITH_NORMALIZED: Set to 1, true or on to enable the normalized
+            storage mode.
+        BEERSMITH_HISTORY: Set to 1, true or on to record the version
+            history of the recipes.
+        BEERSMITH_MEMORY_BUDGET: RSS target, in megabytes, that enables the
+            streaming sync mode.
+        BEERSMITH_OUTBOX: Set to 1, true or on to record the change feed of
+            the recipe writes.
+        BEERSMITH_INDEXES: Set to 0, false or off to disable the creation
+            of the managed indexes.
+        BEERSMITH_CATALOG: Set to 1, true or on to maintain the ingredient
+            catalog.
+
+    In the normalized storage mode, the equipment, style, carb, base_grain
+    and mash profiles are stored once in the reference collections (see
+    beersmith_direct.references) and the recipes hold references to them.
+    find_recipes() and get_recipe() return the rehydrated recipes.
+
+    With the version history enabled, every recipe write is also recorded
+    as a delta in the history collection (see beersmith_direct.history), in
+    the same batches as the recipe writes. The archive replay records the
+    date of the archive action as the time of the version, and reset() keeps
+    the history, so a rebuild only records the recipes that changed. In the
+    normalized storage mode, the history stores the documents with their
+    references, and reset() keeps the reference collections too.
+
+    In the streaming sync mode, update_recipes() parses and writes the
+    recipes one at a time instead of reading the whole library first, and
+    the write batches shrink when the RSS of the process gets close to the
+    memory target (see beersmith_direct.budget). The target steers the
+    batch sizes, it is not an enforced ceiling.
+
+    With the change feed enabled, every recipe write is also recorded in the
+    outbox collection (see beersmith_direct.outbox), with the recipe id, the
+    action, the date of the archive action and the digest of the document,
+    in the same batches as the recipe writes and after them. Consumers read
+    the changes since their last token with changes_since().
+
+    With the ingredient catalog enabled, the distinct ingredients of the
+    recipes are maintained in the catalog collection (see
+    beersmith_direct.catalog), with their usage counts and the recipes that
+    use them, from the differences between the stored and the written
+    versions of each batch of recipes. find_ingredients() queries the
+    catalog without reading the recipes.
+
+    The indexes of the sync and query paths (see
+    beersmith_direct.index_manager) are created when missing, on the first
+    init of the collection in the process and at the end of a rebuild, once
+    the recipes are loaded.
+
+    Write hooks are callables that receive every recipe write once it is
+    sent to MongoDB, as hook(action, recipe_id, recipe), where action is
+    'upsert', 'delete' (recipe is None) or 'reset' (when the collection is
+    dropped, recipe_id and recipe are None).
+
+    Attributes:
+        batch_size: Number of queued writes per bulk_write().
+        checkpoint_interval: Number of records between checkpoints.
+        workers: Number of parsing processes.
+        write_hooks: List of write hook callables.
+        references: ReferenceStore object in the normalized storage mode,
+            otherwise None.
+        history: RecipeHistory object if the version history is enabled,
+            otherwise None.
+        memory_budget: MemoryBudget object in the streaming sync mode,
+            otherwise None.
+        outbox: ChangeOutbox object if the change feed is enabled, otherwise
+            None.
+        catalog: IngredientCatalog object if the ingredient catalog is
+            enabled, otherwise None.
+        indexes: IndexManager object of the managed indexes.
+        manage_indexes: If True, the missing indexes are created.
     """
-    def __init__(self) -> None:
+    def __init__(self, collection_name=None, mdb=None, profile=None,
+        batch_size=None, checkpoint_interval=None, workers=None,
+        cache_dir=None, normalized=None, history=None, memory_budget=None,
+        config_name=None, outbox=None, manage_indexes=None, catalog=None) -> None:
         """Initializes the Recipes Connector.
 
         Establishes connections to Beersmith and MongoDB.
         Sets up access to configuration properties.
 
+        Args:
+            collection_name: Name of the recipe collection. Defaults to the
+                BEERSMITH_COLLECTION environment variable.
+            mdb: Database object to use instead of connecting to MongoDB.
+            profile: ProfileSettings object, or a boolean to enable profiling
+                of pull, rebuild and read_bsmx.
+            batch_size: Number of queued writes per bulk_write().
+            checkpoint_interval: Number of records between checkpoints.
+            workers: Number of parsing processes.
+            cache_dir: Directory of the parsed file cache.
+            normalized: Enables the normalized storage mode.
+            history: Enables the version history.
+            memory_budget: RSS target, in megabytes, that enables the
+                streaming sync mode.
+            config_name: Name of the configuration object that holds the
+                checkpoints. Defaults to the collection name.
+            outbox: Enables the change feed.
+            manage_indexes: Enables the creation of the managed indexes.
+                Defaults to the BEERSMITH_INDEXES environment variable,
+                enabled if not set.
+            catalog: Enables the ingredient catalog.
         """
-        self.collection_name = os.environ.get('BEERSMITH_COLLECTION')
+        self.collection_name = collection_name or os.environ.get('BEERSMITH_COLLECTION')
         self.collection_name_raw = f'raw_{self.collection_name}'
         logger.debug(f'collection_name: {self.collection_name}')
-        super().__init__(config_name=self.collection_name)
+        super().__init__(
+            config_name=config_name or self.collection_name, mdb=mdb, profile=profile
+        )
+        if cache_dir:
+            self.bsm.cache_dir = cache_dir
+
+        # initialize sync settings
+        self.batch_size = max(1, int(
+            batch_size or os.environ.get('BEERSMITH_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        ))
+        self.checkpoint_interval = int(
+            checkpoint_interval if checkpoint_interval is not None
+            else os.environ.get('BEERSMITH_CHECKPOINT_INTERVAL', '0')
+        )
+        self.workers = max(1, int(workers or os.environ.get('BEERSMITH_WORKERS', '1')))
+
+        # queued (action, recipe_id, recipe, timestamp) writes, and the
+        # pending state of their recipe identifiers
+        self._write_queue = []
+        self._pending = {}
+        self.write_hooks = []
 
         # initialize MongoDB collection
         self.collection = self.mdb.read_collection(self.collection_name)
         self.collection_raw = self.mdb.read_collection(self.collection_name_raw)
 
+        if normalized is None:
+            normalized = os.environ.get('BEERSMITH_NORMALIZED', '').lower() in ('1', 'true', 'on')
+        self.references = ReferenceStore(self.mdb, self.collection_name) if normalized else None
+
+        if history is None:
+            history = os.environ.get('BEERSMITH_HISTORY', '').lower() in ('1', 'true', 'on')
+        self.history = RecipeHistory(self.mdb, self.collection_name) if history else None
+
+        memory_budget = memory_budget or os.environ.get('BEERSMITH_MEMORY_BUDGET')
+        self.memory_budget = MemoryBudget(memory_budget, self.batch_size) if memory_budget else None
+
+        if outbox is None:
+            outbox = os.environ.get('BEERSMITH_OUTBOX', '').lower() in ('1', 'true', 'on')
+        self.outbox = ChangeOutbox(self.mdb, self.collection_name) if outbox else None
+
+        if catalog is None:
+            catalog = os.environ.get('BEERSMITH_CATALOG', '').lower() in ('1', 'true', 'on')
+        self.catalog = IngredientCatalog(self.mdb, self.collection_name) if catalog else None
+
+        self.indexes = IndexManager()
+        self.indexes.manage(self.collection, RECIPE_INDEXES)
+        if self.history:
+            self.indexes.manage(self.history.collection, HISTORY_INDEXES)
+        if self.catalog:
+            self.indexes.manage(self.catalog.collection, CATALOG_INDEXES)
+        self.manage_indexes = indexes_enabled() if manage_indexes is None else manage_indexes
+        if self.manage_indexes:
+            self.indexes.ensure(self.stats, once=True)
+
+    @profiled('pull')
     def pull(self, filename=None, path=None, save_last=True, **kwargs):
         """Pull updated recipes in MongoDB.
 
@@ -45,20 +223,30 @@ class Recipes(Connector):
             save_last (bool): if set to True (default), details of the last
                 object retrieved is saved in the configuration properties
             **kwargs: keyword arguments that specify the timespan to retrieve.
+
+        Returns:
+            The SyncStats object of the run.
         """
-        start, end = self.timespan(collection='beersmith', **kwargs)
-        logger.debug(f'timespan: {start}, {end}')
+        stats = self.start_stats()
 
-        self.update_recipes_from_archive(
-            filename=filename, basepath=path, start=start, end=end
-        )
+        with stats.stage('pull'):
+            start, end = self.timespan(collection='beersmith', **kwargs)
+            logger.debug(f'timespan: {start}, {end}')
+
+            self.update_recipes_from_archive(
+                filename=filename, basepath=path, start=start, end=end
+            )
 
-        # clear rebuild flag, if set
-        self.props.rebuild = False
-        self.props.update()
+            # clear rebuild flag, if set
+            self.props.rebuild = False
+            with stats.stage('config_write'):
+                self.props.update()
 
         # logger.debug(f'recipes processed: {updated_count}')
 
+        return self.finish_stats()
+
+    @profiled('rebuild')
     def rebuild(self, filename=None, path=None, save_last=True):
         """Rebuild recipes in MongoDB.
 
@@ -67,28 +255,69 @@ class Recipes(Connector):
             path: Location of the recipe file.
             save_last (bool): if set to True (default), details of the last
                 object retrieved is saved in the configuration properties
+
+        Returns:
+            The SyncStats object of the run.
         """
-        # reset the database
-        self.reset()
+        stats = self.start_stats()
 
-        updated_count = self.update_recipes(filename, path, save_last)
+        with stats.stage('rebuild'):
+            # reset the database
+            self.reset()
 
-        # clear rebuild flag, if set
-        self.props.rebuild = False
-        self.props.update()
+            updated_count = self.update_recipes(filename, path, save_last)
 
-        # verify count
-        recipe_count = self.collection.count_documents({})
-        if recipe_count == updated_count:
-            logger.debug(f'Recipe collection rebuilt, count: {recipe_count}')
-        else:
-            logger.warning('Recipe collection rebuilt, discrepancies found')
+            # the indexes of the dropped collection are created after the load
+            if self.manage_indexes:
+                self.indexes.ensure(stats)
+
+            # clear rebuild flag, if set
+            self.props.rebuild = False
+            with stats.stage('config_write'):
+                self.props.update()
+
+            # verify count
+            with stats.stage('mongodb_read'):
+                recipe_count = self.collection.count_documents({})
+            if recipe_count == updated_count:
+                logger.debug(f'Recipe collection rebuilt, count: {recipe_count}')
+            else:
+                stats.error('rebuild_count')
+                logger.warning('Recipe collection rebuilt, discrepancies found')
+
+        return self.finish_stats()
+
+    def add_write_hook(self, hook):
+        """Registers a write hook callable.
+
+        Args:
+            hook: Callable that receives (action, recipe_id, recipe).
+        """
+        self.write_hooks.append(hook)
+
+    def _notify_write(self, action, recipe_id, recipe=None):
+        """Calls the write hooks.
+        """
+        for hook in self.write_hooks:
+            hook(action, recipe_id, recipe)
 
     def reset(self):
         """Reset the recipe collection.
+
+        With the version history enabled, the reference collections are
+        kept with the history, whose versions refer to their profiles.
         """
         logger.debug('resetting recipe collection...')
         self.collection.drop()
+        if self.references and not self.history:
+            self.references.drop()
+        if self.catalog:
+            self.catalog.drop()
+        self.indexes.forget()
+        if self.outbox:
+            self.outbox.record([('reset', None, None, datetime.now().astimezone())])
+            self.outbox.flush(self.stats)
+        self._notify_write('reset', None)
 
         # reset props
         self.props.delete()
@@ -129,32 +358,289 @@ class Recipes(Connector):
         """Update recipes in MongoDB.
 
         Args:
-            filename: Name of the recipe file.
+            filename: Name of the recipe file, a .bsmx file or a BeerXML
+                .xml file.
             path: Location of the recipe file.
             save_last (bool): if set to True (default), details of the last
                 object retrieved is saved in the configuration properties
         """
         # TODO: log recipe name, use progress bar
 
-        # read the recipes from BeerSmith
+        # read the recipes from BeerSmith, one at a time in the
+        # streaming sync mode and from BeerXML files
         logger.info('reading Beersmith recipes...')
-        recipe_list = self.read_recipes(filename, path)
+        if filename and filename.lower().endswith('.xml'):
+            recipe_list = self.bsm.iter_xml(filename=filename, path=path)
+        elif self.memory_budget:
+            recipe_list = self.bsm.iter_bsmx(filename=filename, path=path, chunked=True)
+        else:
+            recipe_list = self.read_recipes(filename, path)
 
         # update each recipe
         update_count = 0
-        for update_count, recipe in enumerate(recipe_list):
-            self.update_recipe(recipe)
+        timestamp = datetime.now().astimezone()
+        try:
+            for update_count, recipe in enumerate(recipe_list):
+                self.queue_recipe(recipe, timestamp)
 
-            logger.info(f'updated recipe: {recipe.get("name")}')
+                logger.info(f'updated recipe: {recipe.get("name")}')
 
-            # update config properties
-            if save_last:
-                self.props.last_updated = datetime.now().astimezone()
-                self.props.last_id = recipe['name']
-                self.props.update()
+                # update config properties, written by checkpoint()
+                if save_last:
+                    self.props.last_updated = datetime.now().astimezone()
+                    self.props.last_id = recipe['name']
+
+                self.checkpoint(update_count + 1)
+
+        finally:
+            self.checkpoint()
 
         return update_count + 1
 
+    def queue_recipe(self, recipe, timestamp=None):
+        """Queues the upsert of a recipe into MongoDB.
+
+        The queue is sent when it reaches batch_size writes.
+
+        Args:
+            recipe: Beersmith Recipe, as a dictionary or a Recipe record.
+            timestamp: Time of the change, for example the date of the
+                archive action. Defaults to now.
+        """
+        if isinstance(recipe, Record):
+            recipe = recipe.to_dict()
+        recipe_id = recipe['name']
+        self._write_queue.append(
+            ('upsert', recipe_id, recipe, timestamp or datetime.now().astimezone())
+        )
+        self._pending[recipe_id] = True
+        if len(self._write_queue) >= self._batch_limit():
+            self.flush_writes()
+
+    def queue_delete(self, recipe_id, timestamp=None):
+        """Queues the deletion of a recipe from MongoDB.
+
+        Args:
+            recipe_id: Beersmith Recipe identifier.
+            timestamp: Time of the change. Defaults to now.
+        """
+        self._write_queue.append(
+            ('delete', recipe_id, None, timestamp or datetime.now().astimezone())
+        )
+        self._pending[recipe_id] = False
+        if len(self._write_queue) >= self._batch_limit():
+            self.flush_writes()
+
+    def _batch_limit(self):
+        """Returns the number of queued writes per bulk_write().
+        """
+        if self.memory_budget:
+            return self.memory_budget.batch_limit(self.stats)
+
+        return self.batch_size
+
+    def flush_writes(self):
+        """Sends the queued writes to MongoDB in one ordered bulk_write().
+
+        Returns:
+            The number of writes sent.
+        """
+        if not self._write_queue:
+            return 0
+
+        write_queue = self._write_queue
+        self._write_queue = []
+        self._pending = {}
+
+        documents = [
+            self._document(recipe) if action == 'upsert' else None
+            for action, _, recipe, _ in write_queue
+        ]
+        requests = [
+            ReplaceOne({'_id': recipe_id}, doc, upsert=True)
+            if action == 'upsert' else DeleteOne({'_id': recipe_id})
+            for (action, recipe_id, _, _), doc in zip(write_queue, documents)
+        ]
+
+        # the references are written first, a recipe never refers to a
+        # missing profile
+        if self.references:
+            self.references.flush(self.stats)
+
+        # the catalog changes are computed from the stored versions, read
+        # before the recipe writes
+        if self.catalog:
+            self.catalog.record(self.collection, [
+                (action, recipe_id, recipe) for action, recipe_id, recipe, _ in write_queue
+            ], self.stats)
+
+        with self.stats.stage('mongodb_write'):
+            self.collection.bulk_write(requests, ordered=True)
+        if self.catalog:
+            self.catalog.flush(self.stats)
+
+        # the history stores the documents, with references in the
+        # normalized storage mode
+        if self.history:
+            with self.stats.stage('mongodb_read'):
+                self.history.record([
+                    (action, recipe_id, doc, timestamp)
+                    for (action, recipe_id, _, timestamp), doc in zip(write_queue, documents)
+                ], self.stats)
+            self.history.flush(self.stats)
+
+        # the changes are written after the recipes, a consumer never reads
+        # a change before the recipe
+        if self.outbox:
+            self.outbox.record([
+                (action, recipe_id, doc, timestamp)
+                for (action, recipe_id, _, timestamp), doc in zip(write_queue, documents)
+            ])
+            self.outbox.flush(self.stats)
+
+        delete_count = sum(action == 'delete' for action, _, _, _ in write_queue)
+        self.stats.add('recipes_upserted', len(write_queue) - delete_count)
+        self.stats.add('recipes_deleted', delete_count)
+        self.stats.add('bulk_writes')
+
+        if self.write_hooks:
+            for action, recipe_id, recipe, _ in write_queue:
+                self._notify_write(action, recipe_id, recipe)
+
+        return len(write_queue)
+
+    def _document(self, recipe):
+        """Returns the MongoDB document of a recipe.
+        """
+        if self.references:
+            return self.references.dehydrate(recipe)
+
+        return recipe
+
+    def get_recipe(self, recipe_id):
+        """Returns a recipe from MongoDB.
+
+        Args:
+            recipe_id: Beersmith Recipe identifier.
+
+        Returns:
+            The recipe, rehydrated in the normalized storage mode, or None.
+        """
+        with self.stats.stage('mongodb_read'):
+            recipe = self.collection.find_one({'_id': recipe_id})
+            if recipe and self.references:
+                self.references.rehydrate([recipe], self.stats)
+
+        return recipe
+
+    def find_recipes(self, filter=None, batch_size=None, **kwargs):
+        """Yields the recipes of a query.
+
+        In the normalized storage mode, the recipes are rehydrated in
+        batches, with one query per reference collection per batch.
+
+        Args:
+            filter: The MongoDB query.
+            batch_size: Number of recipes per batch. Defaults to batch_size.
+            **kwargs: Arguments of the find() method of the collection.
+
+        Yields:
+            The recipes.
+        """
+        # pylint: disable=redefined-builtin
+        batch_size = batch_size or self.batch_size
+        batch = []
+        for recipe in self.collection.find(filter or {}, **kwargs):
+            batch.append(recipe)
+            if len(batch) >= batch_size:
+                yield from self._rehydrate(batch)
+                batch = []
+
+        if batch:
+            yield from self._rehydrate(batch)
+
+    def recipe_at(self, recipe_id, timestamp=None):
+        """Returns a recipe from the version history.
+
+        Args:
+            recipe_id: Beersmith Recipe identifier.
+            timestamp: The point in time, for example the date of an archive
+                action. Defaults to the latest version.
+
+        Returns:
+            The recipe as it was at that time, rehydrated in the normalized
+            storage mode, or None if it did not exist.
+        """
+        if not self.history:
+            raise ValueError('the version history is not enabled')
+
+        with self.stats.stage('mongodb_read'):
+            recipe = self.history.recipe_at(recipe_id, timestamp)
+        if recipe is None:
+            return None
+
+        return self._rehydrate([recipe])[0]
+
+    def changes_since(self, token=None, limit=None):
+        """Returns the recipe changes after a token of the change feed.
+
+        Args:
+            token: Token returned by a previous call, None to read from the
+                first change.
+            limit: Largest number of changes to return, all if None.
+
+        Returns:
+            Tuple of the list of changes, in order, and the token to resume
+            from.
+        """
+        if not self.outbox:
+            raise ValueError('the change feed is not enabled')
+
+        with self.stats.stage('mongodb_read'):
+            return self.outbox.changes_since(token, limit)
+
+    def find_ingredients(self, ingredient_type=None, name=None):
+        """Returns the entries of the ingredient catalog, the most used first.
+
+        Args:
+            ingredient_type: Type of the ingredients (grain, hops, yeast,
+                misc or water), all if None.
+            name: Name of the ingredients, in any case, all if None.
+
+        Returns:
+            List of catalog entries, with the usage count and the
+            identifiers of the recipes of each ingredient.
+        """
+        if not self.catalog:
+            raise ValueError('the ingredient catalog is not enabled')
+
+        with self.stats.stage('mongodb_read'):
+            return self.catalog.find(ingredient_type, name)
+
+    def _rehydrate(self, batch):
+        """Returns a batch of recipes, rehydrated in the normalized mode.
+        """
+        if self.references:
+            with self.stats.stage('mongodb_read'):
+                self.references.rehydrate(batch, self.stats)
+
+        return batch
+
+    def checkpoint(self, count=None):
+        """Sends the queued writes and writes the configuration properties.
+
+        Args:
+            count: Number of records processed so far. If set, the checkpoint
+                is skipped unless count is a multiple of checkpoint_interval.
+        """
+        if count is not None:
+            if not self.checkpoint_interval or count % self.checkpoint_interval:
+                return
+
+        self.flush_writes()
+        with self.stats.stage('config_write'):
+            self.props.flush()
+
     def update_recipe(self, recipe):
         """Save the provided BeerSmith Recipe into MongoDB.
 
@@ -165,12 +651,33 @@ class Recipes(Connector):
             The MongoDB representation of the BeerSmith Recipe object.
         """
         recipe_id = recipe['name']
-        updated_recipe = self.collection.find_one_and_replace(
-            filter={'_id': recipe_id},
-            replacement=recipe,
-            upsert=True,
-            return_document=ReturnDocument.AFTER
-        )
+        replacement = recipe
+        if self.references:
+            replacement = self.references.dehydrate(recipe)
+            self.references.flush(self.stats)
+        if self.catalog:
+            self.catalog.record(self.collection, [('upsert', recipe_id, recipe)], self.stats)
+
+        with self.stats.stage('mongodb_write'):
+            updated_recipe = self.collection.find_one_and_replace(
+                filter={'_id': recipe_id},
+                replacement=replacement,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        if self.catalog:
+            self.catalog.flush(self.stats)
+        self.stats.add('recipes_upserted')
+        timestamp = datetime.now().astimezone()
+        if self.history:
+            self.history.record([('upsert', recipe_id, replacement, timestamp)], self.stats)
+            self.history.flush(self.stats)
+        if self.outbox:
+            self.outbox.record([('upsert', recipe_id, replacement, timestamp)])
+            self.outbox.flush(self.stats)
+        if self.references:
+            self.references.rehydrate([updated_recipe])
+        self._notify_write('upsert', recipe_id, recipe)
 
         return updated_recipe
 
@@ -183,9 +690,23 @@ class Recipes(Connector):
         Returns:
             The MongoDB representation of the BeerSmith Recipe object.
         """
-        self.collection.delete_one(
-            filter={'_id': recipe_id}
-        )
+        if self.catalog:
+            self.catalog.record(self.collection, [('delete', recipe_id, None)], self.stats)
+        with self.stats.stage('mongodb_write'):
+            self.collection.delete_one(
+                filter={'_id': recipe_id}
+            )
+        if self.catalog:
+            self.catalog.flush(self.stats)
+        self.stats.add('recipes_deleted')
+        timestamp = datetime.now().astimezone()
+        if self.history:
+            self.history.record([('delete', recipe_id, None, timestamp)], self.stats)
+            self.history.flush(self.stats)
+        if self.outbox:
+            self.outbox.record([('delete', recipe_id, None, timestamp)])
+            self.outbox.flush(self.stats)
+        self._notify_write('delete', recipe_id)
 
     def update_recipes_from_archive(self,
         filename='Archive.bsmx', basepath=None, start=None, end=None):
@@ -197,8 +718,6 @@ class Recipes(Connector):
             start: Beginning date to process archive records.
             end: End date to process archive records.
         """
-        rebuild_recipes = False
-
         # set default filename
         if not filename:
             filename = 'Archive.bsmx'
@@ -208,87 +727,128 @@ class Recipes(Connector):
         # read the archive
         archive_list = self.read_archive(filename, basepath)
 
-        for archive in archive_list:
-            action_date = parse(archive['date']).astimezone()
-
-            if start and action_date < start:
-                continue
-
-            if end and action_date > end:
-                continue
-
-            action = archive['action']
-            filename = archive['file']
-            directory = archive['directory']
-            archive_date = parse(archive['date']).astimezone()
-            logger.debug(f'[{archive_date}] {archive["name"]}: {action}')
+        try:
+            self._replay_archive(archive_list, basepath, start, end)
+        finally:
+            self.checkpoint()
 
-            # # set recipe file path
-            # if directory.startswith('/'):
-            #     directory = directory[1:]
-            # path = os.path.join(basepath, directory)
+    def _existing_recipes(self, recipe_ids):
+        """Returns the set of the existing recipes, including the queued writes.
+        """
+        existing = {recipe_id for recipe_id in recipe_ids if self._pending.get(recipe_id)}
+        unknown = [recipe_id for recipe_id in recipe_ids if recipe_id not in self._pending]
+        if unknown:
+            with self.stats.stage('mongodb_read'):
+                existing.update(
+                    recipe['_id'] for recipe in self.collection.find(
+                        {'_id': {'$in': unknown}}, projection=['_id']
+                    )
+                )
 
-            if action in ('Add Recipe', 'Insert/Paste'):
-                recipe_list = self.read_recipes(filename, basepath)
-                recipe = recipe_list[0]
-                recipe_id = recipe['name']
-                self.update_recipe(recipe)
+        return existing
 
-                logger.debug(f'\tprocessed: {action}')
+    def _recipe_exists(self, recipe_id):
+        """Returns True if the recipe exists, including the queued writes.
+        """
+        return recipe_id in self._existing_recipes([recipe_id])
 
-            elif action in ('Edit', 'Move'):
-                recipe_list = self.read_recipes(filename, basepath)
-                recipe = recipe_list[0]
+    def _replay_archive(self, archive_list, basepath, start, end):
+        """Applies the archive actions between the start and end dates.
 
-                # confirm the recipe already exists
-                recipe_id = recipe['name']
-                recipe_check = self.collection.find_one({'_id': recipe_id})
-                if recipe_check:
-                    self.update_recipe(recipe)
-                    logger.debug(f'\tprocessed: {action}')
+        The actions are partitioned by recipe and the recipe files of the
+        partitions are parsed concurrently by the workers (see
+        beersmith_direct.replay). The partitions complete out of order, so
+        the parsed actions are held until the actions before them are
+        complete and are queued in archive order, up to the low-water mark.
+        A rename stops the replay at its action: the actions after it, in
+        the partitions that completed earlier, are dropped and never
+        queued. The writes and the configuration properties, assigned the
+        low-water mark, are written at the checkpoints.
 
-                # if recipe was renamed, there is no way to find which was the source recipe
-                # need to reload the entire database
-                # should be able to rebuild automatically, unless renamed recipe is not unique
-                else:
+        Args:
+            archive_list: List of archive actions.
+            basepath: Location of the recipe files.
+            start: Beginning date to process archive records.
+            end: End date to process archive records.
+        """
+        plan = plan_replay(archive_list, start, end, self._existing_recipes)
+        self.stats.add('archive_actions_skipped', plan.skipped_count)
+        self.stats.add('archive_actions_applied', plan.applied_count)
+
+        rebuild_recipes = plan.barrier is not None
+        watermark = LowWaterMark(len(plan.actions))
+        stop_index = len(plan.actions)
+        checkpoint_count = 0
+
+        # parsed actions not queued yet, keyed by index
+        completed = {}
+
+        for recipe_name, results in run_partitions(
+            plan, basepath, self.workers, self.bsm.cache_dir, self.stats
+        ):
+            for index, recipe in results:
+                if index < stop_index:
+                    completed[index] = (recipe_name, recipe)
+
+            while watermark.position + 1 < stop_index and watermark.position + 1 in completed:
+                index = watermark.position + 1
+                recipe_name, recipe = completed.pop(index)
+                archive, archive_date = plan.actions[index]
+                action = archive['action']
+                logger.debug(f'[{archive_date}] {archive["name"]}: {action}')
+
+                if recipe is None:
+                    self.queue_delete(archive['name'], archive_date)
+
+                # a recipe file of another name is a rename, unless that
+                # recipe exists
+                elif action in EDIT_ACTIONS and recipe['name'] != recipe_name \
+                        and not self._recipe_exists(recipe['name']):
                     logger.debug(
                         '\tEditing recipe names cause database inconsistencies. '
                         'The database will be rebuilt.'
                     )
-                    # config.rebuild = True
                     rebuild_recipes = True
+                    stop_index = index
+                    completed.clear()
                     break
 
-            elif action == 'Delete/Cut':
-                recipe_id = archive['name']
-                self.delete_recipe(recipe_id)
+                else:
+                    self.queue_recipe(recipe, archive_date)
+                    logger.debug(f'\tprocessed: {action}')
+
+                watermark.complete(index)
+
+            # update props to the low-water mark
+            position = watermark.position
+            if position >= 0:
+                archive, archive_date = plan.actions[position]
+                self.props.last_updated = archive_date
+                self.props.last_id = archive['name']
+
+                if self.checkpoint_interval \
+                        and (position + 1) // self.checkpoint_interval > checkpoint_count:
+                    checkpoint_count = (position + 1) // self.checkpoint_interval
+                    self.checkpoint()
 
-            elif action == 'Paste':
+        if plan.barrier is not None:
+            archive, _ = plan.barrier
+            if archive['action'] in BARRIER_ACTIONS:
                 # This will create a twin record and there's no way of differentiating it with the
                 # original. Will need to rebuild the entire database.
                 logger.warning(
                     '\tCannot process "Paste" actions. '
                     'Confirm that no duplicate recipes exist and rebuild the database.'
                 )
-                rebuild_recipes = True
-                break
-
-            # update props
-            self.props.last_updated = archive_date
-            self.props.last_id = recipe_id
-            self.props.update()
+            else:
+                # if recipe was renamed, there is no way to find which was the source recipe
+                # need to reload the entire database
+                logger.debug(
+                    '\tEditing recipe names cause database inconsistencies. '
+                    'The database will be rebuilt.'
+                )
 
         # reload the entire database if necessary
         if rebuild_recipes:
+            self.stats.add('rebuild_required')
             self.props.rebuild = True
-            self.props.update()
-
-
-@dataclass
-class Recipe:
-    """Recipe dataclass.
-    """
-    name: str = 'default'
-
-    def __init__(self) -> None:
-        pass
@@ -0,0 +1,227 @@
+"""Class module for the shared reference collections of recipes.
+
+In the normalized storage mode, the equipment, style, carb, base_grain and
+mash profiles of a recipe are stored once in content-addressed collections,
+named after the recipe collection (for example recipes_equipment), and the
+recipe document holds a reference stub in their place:
+
+    'equipment': {'_ref': '3f2a...', 'name': 'Pot (10 Gal)',
+                  'last_modified': '2021-11-16'}
+
+The _id of a profile is the hash of its contents without the volatile keys
+(last_modified), which stay in the stub so the rehydrated recipe is
+identical to the original. The stub also keeps a copy of the queried keys
+(name), so the queries on style.name or equipment.name, their indexes and
+the recipe indexes work on the recipe collection in both storage modes.
+Rehydration looks up the profiles of a batch of recipes with one query per
+collection, and keeps recently used profiles in memory.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+
+from pymongo import UpdateOne
+
+# recipe sub-documents stored in the reference collections
+REFERENCE_KINDS = ('equipment', 'style', 'carb', 'base_grain', 'mash')
+
+# keys that change without changing the profile, kept in the recipe stub
+VOLATILE_KEYS = ('last_modified',)
+
+# keys of the profile copied in the recipe stub, for the queries
+QUERY_KEYS = ('name',)
+
+# key of the profile identifier in the recipe stub
+REF_KEY = '_ref'
+
+# default number of profiles kept in memory
+DEFAULT_CACHE_SIZE = 1024
+
+
+def content_id(props):
+    """Returns the content address of a profile.
+
+    Args:
+        props: The profile dictionary, without the volatile keys.
+
+    Returns:
+        Hexadecimal SHA-1 of the canonical JSON of the profile.
+    """
+    canonical = json.dumps(props, sort_keys=True, default=str, separators=(',', ':'))
+
+    return hashlib.sha1(canonical.encode('UTF-8')).hexdigest()
+
+
+def is_reference(value):
+    """Returns True if a value is a reference stub.
+    """
+    return isinstance(value, dict) and REF_KEY in value
+
+
+class ReferenceStore:
+    """Content-addressed collections of the profiles shared by recipes.
+
+    Attributes:
+        prefix: Prefix of the collection names.
+        kinds: Names of the stored sub-documents.
+        collections: Dictionary of the collections, keyed by kind.
+        cache_size: Number of profiles kept in memory.
+    """
+    def __init__(self, mdb, prefix, kinds=REFERENCE_KINDS, cache_size=DEFAULT_CACHE_SIZE):
+        """Initializes the store.
+
+        Args:
+            mdb: The database.
+            prefix: Prefix of the collection names, usually the name of the
+                recipe collection.
+            kinds: Names of the stored sub-documents.
+            cache_size: Number of profiles kept in memory.
+        """
+        self.prefix = prefix
+        self.kinds = tuple(kinds)
+        self.collections = {
+            kind: mdb.read_collection(f'{prefix}_{kind}') for kind in self.kinds
+        }
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._known = set()
+        self._pending = {kind: {} for kind in self.kinds}
+
+    def dehydrate(self, recipe):
+        """Returns the recipe document with reference stubs.
+
+        The profiles not yet stored are queued for flush().
+
+        Args:
+            recipe: Normalized recipe.
+
+        Returns:
+            A shallow copy of the recipe, with the profiles replaced by stubs.
+        """
+        doc = dict(recipe)
+        for kind in self.kinds:
+            props = doc.get(kind)
+            if not isinstance(props, dict) or is_reference(props):
+                continue
+
+            profile = {key: value for key, value in props.items() if key not in VOLATILE_KEYS}
+            ref_id = content_id(profile)
+            stub = {REF_KEY: ref_id}
+            stub.update((key, props[key]) for key in QUERY_KEYS if key in props)
+            stub.update((key, props[key]) for key in VOLATILE_KEYS if key in props)
+            doc[kind] = stub
+
+            if (kind, ref_id) not in self._known:
+                self._pending[kind][ref_id] = profile
+                self._remember(kind, ref_id, profile)
+
+        return doc
+
+    def pending_count(self):
+        """Returns the number of queued profiles.
+        """
+        return sum(len(pending) for pending in self._pending.values())
+
+    def flush(self, stats=None):
+        """Writes the queued profiles with one bulk write per collection.
+
+        Profiles are inserted only if missing, so the flush is idempotent.
+
+        Args:
+            stats: SyncStats object that records the writes.
+
+        Returns:
+            The number of profiles written.
+        """
+        count = 0
+        for kind, pending in self._pending.items():
+            if not pending:
+                continue
+
+            requests = [
+                UpdateOne({'_id': ref_id}, {'$setOnInsert': profile}, upsert=True)
+                for ref_id, profile in pending.items()
+            ]
+            if stats is not None:
+                with stats.stage('mongodb_write'):
+                    self.collections[kind].bulk_write(requests, ordered=False)
+                stats.add('references_written', len(requests))
+            else:
+                self.collections[kind].bulk_write(requests, ordered=False)
+
+            self._known.update((kind, ref_id) for ref_id in pending)
+            count += len(pending)
+            self._pending[kind] = {}
+
+        return count
+
+    def rehydrate(self, docs, stats=None):
+        """Replaces the reference stubs of recipe documents by the profiles.
+
+        The missing profiles of all documents are read with one query per
+        collection. The nested values of a profile are shared by the
+        documents that reference it, copy them before modifying them.
+
+        Args:
+            docs: List of recipe documents, modified in place.
+            stats: SyncStats object that records the reads.
+
+        Returns:
+            The list of documents.
+        """
+        found = {}
+        missing = {kind: set() for kind in self.kinds}
+        for doc in docs:
+            for kind in self.kinds:
+                stub = doc.get(kind)
+                if not is_reference(stub):
+                    continue
+
+                cache_key = (kind, stub[REF_KEY])
+                if cache_key in self._cache:
+                    found[cache_key] = self._cache[cache_key]
+                else:
+                    missing[kind].add(stub[REF_KEY])
+
+        for kind, ref_ids in missing.items():
+            if not ref_ids:
+                continue
+            if stats is not None:
+                stats.add('references_read', len(ref_ids))
+            for profile in self.collections[kind].find({'_id': {'$in': sorted(ref_ids)}}):
+                ref_id = profile.pop('_id')
+                found[(kind, ref_id)] = profile
+                self._remember(kind, ref_id, profile)
+
+        for doc in docs:
+            for kind in self.kinds:
+                stub = doc.get(kind)
+                if not is_reference(stub):
+                    continue
+
+                profile = found.get((kind, stub[REF_KEY]))
+                if profile is None:
+                    raise KeyError(f'missing {kind} reference: {stub[REF_KEY]}')
+
+                props = {key: stub[key] for key in VOLATILE_KEYS if key in stub}
+                props.update(profile)
+                doc[kind] = props
+
+        return docs
+
+    def _remember(self, kind, ref_id, profile):
+        """Keeps a profile in memory, evicting the least recently used.
+        """
+        self._cache[(kind, ref_id)] = profile
+        self._cache.move_to_end((kind, ref_id))
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def drop(self):
+        """Drops the reference collections.
+        """
+        for collection in self.collections.values():
+            collection.drop()
+        self._cache.clear()
+        self._known.clear()
+        self._pending = {kind: {} for kind in self.kinds}
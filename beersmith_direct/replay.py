@@ -0,0 +1,193 @@
+"""Partitioned parallel replay of the archive actions.
+
+The archive actions of different recipes are independent, only the actions
+of the same recipe must be applied in order. A replay:
+
+1. Plans the actions (plan_replay()): the actions between the start and end
+   dates are numbered in archive order and partitioned by recipe name. The
+   actions that force a rebuild, a Paste or the Edit of a recipe that does
+   not exist (a rename), are barriers: the replay stops before the first
+   one. The existence of the edited recipes is resolved with one query.
+2. Runs the partitions concurrently (run_partitions()). Each partition
+   parses the recipe files of its actions in order, in a pool of processes,
+   and the partitions are yielded as they complete.
+3. Tracks the completed actions with a LowWaterMark, the last action such
+   that it and all the actions before it are complete. Its date is the
+   resume point saved at the checkpoints, so an interrupted sync applies the
+   actions after it again, in order within each recipe.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from beersmith_direct.workers import read_partition
+
+# actions that read a recipe file
+FILE_ACTIONS = ('Add Recipe', 'Insert/Paste', 'Edit', 'Move')
+
+# actions that change an existing recipe
+EDIT_ACTIONS = ('Edit', 'Move')
+
+# actions that delete a recipe
+DELETE_ACTIONS = ('Delete/Cut',)
+
+# actions that force a rebuild
+BARRIER_ACTIONS = ('Paste',)
+
+
+class ReplayPlan:
+    """Archive actions of a replay, partitioned by recipe name.
+
+    Attributes:
+        actions: List of (archive action, action date) tuples, in archive
+            order, without the actions out of the timespan.
+        partitions: Dictionary of (index, action, filename) lists, keyed by
+            recipe name, in the order of their first action. The filename
+            is None for the deletions.
+        barrier: The (archive action, action date) tuple where the replay
+            stops, or None.
+        skipped_count: Number of actions out of the timespan.
+    """
+    def __init__(self):
+        self.actions = []
+        self.partitions = {}
+        self.barrier = None
+        self.skipped_count = 0
+
+    @property
+    def applied_count(self):
+        """Returns the number of applied actions, including the barrier.
+        """
+        return len(self.actions) + (self.barrier is not None)
+
+
+def plan_replay(archive_list, start=None, end=None, existing=None):
+    """Returns the replay plan of archive actions.
+
+    Args:
+        archive_list: List of archive actions.
+        start: Beginning date to process archive records.
+        end: End date to process archive records.
+        existing: Callable that receives a list of recipe names and returns
+            the set of the names of the existing recipes. If None, no recipe
+            exists before the replay.
+
+    Returns:
+        The ReplayPlan object.
+    """
+    from dateutil.parser import parse  # pylint: disable=import-outside-toplevel
+
+    plan = ReplayPlan()
+    timespan_actions = []
+    for archive in archive_list:
+        action_date = parse(archive['date']).astimezone()
+        if (start and action_date < start) or (end and action_date > end):
+            plan.skipped_count += 1
+            continue
+        timespan_actions.append((archive, action_date))
+
+    edited = list(dict.fromkeys(
+        archive['name'] for archive, _ in timespan_actions if archive['action'] in EDIT_ACTIONS
+    ))
+    existing_names = existing(edited) if existing and edited else set()
+
+    # existence of the recipes, as of the planned actions
+    exists = {}
+    for archive, action_date in timespan_actions:
+        action = archive['action']
+        name = archive['name']
+        if action in BARRIER_ACTIONS or (
+            action in EDIT_ACTIONS and not exists.get(name, name in existing_names)
+        ):
+            plan.barrier = (archive, action_date)
+            break
+
+        if action in FILE_ACTIONS:
+            exists[name] = True
+            filename = archive['file']
+        elif action in DELETE_ACTIONS:
+            exists[name] = False
+            filename = None
+        else:
+            continue
+
+        plan.partitions.setdefault(name, []).append((len(plan.actions), action, filename))
+        plan.actions.append((archive, action_date))
+
+    return plan
+
+
+class LowWaterMark:
+    """Tracks the completed actions of a replay.
+
+    Attributes:
+        position: Index of the last action such that it and all the actions
+            before it are complete, -1 if the first action is not complete.
+    """
+    def __init__(self, count):
+        """Initializes the tracker.
+
+        Args:
+            count: Number of actions.
+        """
+        self.position = -1
+        self._complete = [False] * count
+
+    def complete(self, index):
+        """Marks an action as complete.
+
+        Args:
+            index: Index of the action.
+
+        Returns:
+            The position of the low-water mark.
+        """
+        self._complete[index] = True
+        while self.position + 1 < len(self._complete) and self._complete[self.position + 1]:
+            self.position += 1
+
+        return self.position
+
+
+def run_partitions(plan, path, workers=1, cache_dir=None, stats=None):
+    """Parses the recipe files of the partitions of a replay plan.
+
+    With several workers, the partitions are parsed concurrently by a pool
+    of processes, the largest first, and yielded as they complete.
+    Otherwise they are parsed in this process, in the order of their first
+    action.
+
+    Args:
+        plan: The ReplayPlan object.
+        path: Location of the recipe files.
+        workers: Number of processes.
+        cache_dir: Directory of the parsed file cache.
+        stats: SyncStats object that receives the statistics of the workers.
+
+    Yields:
+        Tuples of the recipe name and the list of (index, recipe) tuples of
+        its actions, in order, where recipe is None for the deletions.
+    """
+    stats_enabled = stats.enabled if stats is not None else True
+    workers = min(workers, len(plan.partitions)) or 1
+
+    if workers == 1:
+        for name, actions in plan.partitions.items():
+            _, results, worker_stats = read_partition(
+                name, actions, path, cache_dir, stats_enabled
+            )
+            if stats is not None:
+                stats.merge(worker_stats)
+            yield name, results
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(read_partition, name, actions, path, cache_dir, stats_enabled)
+            for name, actions in sorted(
+                plan.partitions.items(), key=lambda item: len(item[1]), reverse=True
+            )
+        ]
+        for future in as_completed(futures):
+            name, results, worker_stats = future.result()
+            if stats is not None:
+                stats.merge(worker_stats)
+            yield name, results
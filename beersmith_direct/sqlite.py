@@ -0,0 +1,521 @@
+"""Embedded SQLite storage backend.
+
+The classes implement the subset of the i_mongodb and pymongo interfaces that
+this package uses, like beersmith_direct.memory, on an SQLite database file,
+so the sync runs without a MongoDB server, for example on a tablet or a CI
+runner.
+
+Each collection is a table of JSON documents, keyed by _id, in insertion
+order:
+
+    "recipes"          (id PRIMARY KEY, doc TEXT)
+    "recipes__keys"    (field, value, doc_rowid)
+
+The indexes of a collection (create_index()) are extracted columns: the
+values of each indexed field, one row per array element, are written to the
+keys table with the document, and the keys table is indexed by (field,
+value). The filters on _id and on the indexed fields are run by SQLite on
+the indexes. The equality, $in and comparison conditions of the other
+top-level fields are also run by SQLite, with json_extract() on the JSON text
+of each row, without an index. The other conditions, on the nested fields of
+unindexed paths or with other operators, are checked on the candidate
+documents with the filter matching of beersmith_direct.documents, so the
+results are the same as the ones of a MemoryDatabase; a filter without any
+condition that SQLite runs decodes and checks every document of the
+collection.
+
+The database runs in WAL mode, and bulk_write() and insert_many() apply all
+their requests in one transaction. Datetimes are stored as
+{"$date": "<ISO 8601>"} objects and read back as datetime objects.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import os
+import sqlite3
+import threading
+
+from beersmith_direct.documents import (
+    DocumentCollection, DocumentDatabase, WriteResult, _apply_update, _get_field, match
+)
+
+# types of the values that are compared in SQL
+_SQL_TYPES = (str, int, float)
+
+# comparison operators run in SQL
+_SQL_COMPARISONS = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+
+# metadata table of the index specifications
+_INDEX_TABLE = '_indexes'
+
+
+def _encode_default(value):
+    """Returns the JSON representation of the values JSON does not support.
+    """
+    if isinstance(value, datetime):
+        return {'$date': value.isoformat()}
+
+    raise TypeError(f'cannot store {type(value).__name__} values')
+
+
+def _decode_object(props):
+    """Returns the value of a decoded JSON object.
+    """
+    if len(props) == 1 and '$date' in props:
+        return datetime.fromisoformat(props['$date'])
+
+    return props
+
+
+def encode(doc):
+    """Returns the JSON text of a document.
+    """
+    return json.dumps(doc, default=_encode_default, separators=(',', ':'))
+
+
+def decode(text):
+    """Returns the document of a JSON text.
+    """
+    return json.loads(text, object_hook=_decode_object)
+
+
+def _quote(name):
+    """Returns a quoted SQL identifier.
+    """
+    if '"' in name:
+        raise ValueError(f'invalid collection name: {name}')
+
+    return f'"{name}"'
+
+
+def _sql_value(value):
+    """Returns the value stored in SQL, or None for the unsupported types.
+    """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, _SQL_TYPES):
+        return value
+
+    return None
+
+
+class SQLiteCollection(DocumentCollection):
+    """SQLite table that stands in for a pymongo collection.
+
+    Attributes:
+        name: Name of the collection.
+        database: The SQLiteDatabase object.
+        indexes: Dictionary of index specifications, keyed by index name.
+        op_counts: Dictionary of operation counters, keyed by method name.
+        index_ops: Dictionary of the number of queries that used each
+            index, keyed by index name.
+    """
+    def __init__(self, database, name):
+        """Initializes the collection, creating its tables if needed.
+
+        Args:
+            database: The SQLiteDatabase object.
+            name: Name of the collection.
+        """
+        super().__init__(name)
+        self.database = database
+        self.index_ops = {}
+        self._table = _quote(name)
+        self._keys_table = _quote(f'{name}__keys')
+
+        with database.lock, database.connection:
+            database.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {self._table} (id PRIMARY KEY, doc TEXT NOT NULL)'
+            )
+            database.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {self._keys_table} '
+                '(field TEXT NOT NULL, value, doc_rowid INTEGER NOT NULL)'
+            )
+            database.connection.execute(
+                f'CREATE INDEX IF NOT EXISTS {_quote(name + "__keys_value")} '
+                f'ON {self._keys_table} (field, value)'
+            )
+            database.connection.execute(
+                f'CREATE INDEX IF NOT EXISTS {_quote(name + "__keys_doc")} '
+                f'ON {self._keys_table} (doc_rowid)'
+            )
+            rows = database.connection.execute(
+                f'SELECT name, spec FROM {_INDEX_TABLE} WHERE collection = ?', (name,)
+            ).fetchall()
+
+        for index_name, spec in rows:
+            spec = json.loads(spec)
+            spec['key'] = [tuple(key) for key in spec['key']]
+            self.indexes[index_name] = spec
+
+    def _indexed_fields(self):
+        """Returns the fields of the indexes, keyed by field name.
+
+        Returns:
+            Dictionary of index names, keyed by field name.
+        """
+        return {
+            key: name for name, spec in self.indexes.items() if name != '_id_'
+            for key, _ in spec['key']
+        }
+
+    def _condition_sql(self, column, condition):
+        """Returns the SQL condition and parameters of a field condition.
+
+        Returns:
+            Tuple of the SQL text and the list of parameters, or None if the
+            condition is only checked on the documents.
+        """
+        if isinstance(condition, dict) and condition and next(iter(condition)).startswith('$'):
+            clauses = []
+            params = []
+            for op, arg in condition.items():
+                if op == '$in' and isinstance(arg, (list, tuple)) \
+                        and all(isinstance(value, _SQL_TYPES) for value in arg):
+                    clauses.append(f'{column} IN (SELECT value FROM json_each(?))')
+                    params.append(json.dumps(list(arg)))
+                elif op in _SQL_COMPARISONS and isinstance(arg, _SQL_TYPES) \
+                        and not isinstance(arg, bool):
+                    clauses.append(f'{column} {_SQL_COMPARISONS[op]} ?')
+                    params.append(arg)
+            if not clauses:
+                return None
+            return ' AND '.join(clauses), params
+
+        if isinstance(condition, _SQL_TYPES):
+            return f'{column} = ?', [_sql_value(condition)]
+
+        return None
+
+    def _where(self, doc_filter):
+        """Returns the SQL filter of the conditions that SQLite can run.
+
+        The SQL filter selects a superset of the matching documents.
+
+        Returns:
+            Tuple of the SQL text and the list of parameters.
+        """
+        clauses = []
+        params = []
+        indexed_fields = self._indexed_fields()
+        for key, condition in (doc_filter or {}).items():
+            if key == '_id':
+                sql = self._condition_sql('id', condition)
+                index_name = '_id_'
+            elif key in indexed_fields:
+                sql = self._condition_sql('value', condition)
+                if sql is not None:
+                    sql = (
+                        f'rowid IN (SELECT doc_rowid FROM {self._keys_table} '
+                        f'WHERE field = ? AND {sql[0]})', [key, *sql[1]]
+                    )
+                index_name = indexed_fields[key]
+            elif not key.startswith('$') and not set(key) & set('."\''):
+                # a top-level field is read from the JSON text, the arrays
+                # are left to the document check
+                path = f'$."{key}"'
+                sql = self._condition_sql(f"json_extract(doc, '{path}')", condition)
+                if sql is not None:
+                    sql = (f"({sql[0]} OR json_type(doc, '{path}') = 'array')", sql[1])
+                index_name = None
+            else:
+                continue
+
+            if sql is not None:
+                clauses.append(sql[0])
+                params.extend(sql[1])
+                if index_name:
+                    self.index_ops[index_name] = self.index_ops.get(index_name, 0) + 1
+
+        if not clauses:
+            return '', []
+
+        return ' WHERE ' + ' AND '.join(clauses), params
+
+    def _find_rows(self, doc_filter, limit=None, order_by_id=False):
+        """Returns the (rowid, document) tuples of the matching documents.
+        """
+        where, params = self._where(doc_filter)
+        order = 'id' if order_by_id else 'rowid'
+        sql = f'SELECT rowid, doc FROM {self._table}{where} ORDER BY {order}'
+
+        # the documents of the exact _id filters match without a check
+        exact = set(doc_filter or {}) == {'_id'} and not isinstance(doc_filter['_id'], dict)
+
+        rows = []
+        with self.database.lock:
+            for rowid, text in self.database.connection.execute(sql, params):
+                doc = decode(text)
+                if exact or match(doc, doc_filter):
+                    rows.append((rowid, doc))
+                    if limit and len(rows) >= limit:
+                        break
+
+        return rows
+
+    def _write_keys(self, rowid, doc):
+        """Writes the values of the indexed fields of a document.
+        """
+        connection = self.database.connection
+        connection.execute(f'DELETE FROM {self._keys_table} WHERE doc_rowid = ?', (rowid,))
+        rows = []
+        for field in self._indexed_fields():
+            values = []
+            for value in _get_field(doc, field):
+                values.extend(value if isinstance(value, list) else [value])
+            rows.extend(
+                (field, _sql_value(value), rowid) for value in dict.fromkeys(
+                    value for value in values if _sql_value(value) is not None
+                )
+            )
+        if rows:
+            connection.executemany(
+                f'INSERT INTO {self._keys_table} (field, value, doc_rowid) VALUES (?, ?, ?)', rows
+            )
+
+    def _store(self, doc, rowid=None):
+        """Inserts or replaces a document, in the current transaction.
+
+        Args:
+            doc: The document, with its _id.
+            rowid: The rowid of the replaced document, None to insert.
+        """
+        connection = self.database.connection
+        if rowid is None:
+            rowid = connection.execute(
+                f'INSERT INTO {self._table} (id, doc) VALUES (?, ?)', (doc['_id'], encode(doc))
+            ).lastrowid
+        else:
+            connection.execute(
+                f'UPDATE {self._table} SET doc = ? WHERE rowid = ?', (encode(doc), rowid)
+            )
+        if len(self.indexes) > 1:
+            self._write_keys(rowid, doc)
+
+    def _remove(self, rowid):
+        """Deletes a document, in the current transaction.
+        """
+        self.database.connection.execute(f'DELETE FROM {self._table} WHERE rowid = ?', (rowid,))
+        self.database.connection.execute(
+            f'DELETE FROM {self._keys_table} WHERE doc_rowid = ?', (rowid,)
+        )
+
+    def _new_id(self):
+        """Returns a new document id.
+        """
+        last = self.database.connection.execute(
+            f"SELECT MAX(id) FROM {self._table} WHERE typeof(id) = 'integer'"
+        ).fetchone()[0]
+
+        return (last or 0) + 1
+
+    @contextmanager
+    def _transaction(self):
+        """Holds the lock of the connection during a transaction.
+        """
+        with self.database.lock, self.database.connection:
+            yield
+
+    def _find_docs(self, doc_filter, limit=None):
+        """Returns the matching documents, in insertion order.
+        """
+        return [doc for _, doc in self._find_rows(doc_filter, limit=limit)]
+
+    def _find_sorted(self, doc_filter, sort, limit):
+        """Returns the matching documents, sorted and limited.
+
+        The sorts on _id are run by SQLite, with the limit.
+        """
+        if sort and [key for key, _ in sort] == ['_id'] and sort[0][1] > 0:
+            return [doc for _, doc in self._find_rows(doc_filter, limit=limit, order_by_id=True)]
+
+        return super()._find_sorted(doc_filter, sort, limit)
+
+    def _document_count(self):
+        """Returns the number of documents.
+        """
+        with self.database.lock:
+            return self.database.connection.execute(
+                f'SELECT COUNT(*) FROM {self._table}'
+            ).fetchone()[0]
+
+    def _insert(self, document):
+        """Inserts a document, in the current transaction.
+        """
+        doc = dict(document)
+        if '_id' not in doc:
+            doc['_id'] = self._new_id()
+        try:
+            self._store(doc)
+        except sqlite3.IntegrityError as err:
+            raise KeyError(f'duplicate key: {doc["_id"]}') from err
+
+        return WriteResult(inserted=1, inserted_ids=[doc['_id']])
+
+    def _replace(self, doc_filter, replacement, upsert):
+        """Replaces or upserts a document, in the current transaction.
+        """
+        rows = self._find_rows(doc_filter, limit=1)
+        doc = dict(replacement)
+        if rows:
+            rowid, old = rows[0]
+            doc['_id'] = old['_id']
+            self._store(doc, rowid)
+            return WriteResult(matched=1, modified=1)
+
+        if upsert:
+            if '_id' not in doc:
+                doc['_id'] = (doc_filter or {}).get('_id', self._new_id())
+            self._store(doc)
+            return WriteResult(upserted_ids={0: doc['_id']})
+
+        return WriteResult()
+
+    def _update(self, doc_filter, update, upsert, limit=None):
+        """Updates or upserts documents, in the current transaction.
+        """
+        rows = self._find_rows(doc_filter, limit=limit)
+        for rowid, doc in rows:
+            _apply_update(doc, update)
+            self._store(doc, rowid)
+        if rows:
+            return WriteResult(matched=len(rows), modified=len(rows))
+
+        if upsert:
+            doc = {key: val for key, val in (doc_filter or {}).items()
+                   if not key.startswith('$') and not isinstance(val, dict)}
+            if '_id' not in doc:
+                doc['_id'] = self._new_id()
+            _apply_update(doc, update, inserting=True)
+            self._store(doc)
+            return WriteResult(upserted_ids={0: doc['_id']})
+
+        return WriteResult()
+
+    def _delete(self, doc_filter, limit=None):
+        """Deletes documents, in the current transaction.
+        """
+        rows = self._find_rows(doc_filter, limit=limit)
+        for rowid, _ in rows:
+            self._remove(rowid)
+
+        return WriteResult(deleted=len(rows))
+
+    def _create_index(self, name, spec):
+        """Creates an index and extracts the values of its fields.
+        """
+        with self.database.lock, self.database.connection:
+            self.database.connection.execute(
+                f'INSERT OR REPLACE INTO {_INDEX_TABLE} (collection, name, spec) VALUES (?, ?, ?)',
+                (self.name, name, json.dumps(spec))
+            )
+            self.indexes[name] = spec
+            self._rebuild_keys()
+
+    def _drop_index(self, name):
+        """Drops an index.
+        """
+        with self.database.lock, self.database.connection:
+            self.database.connection.execute(
+                f'DELETE FROM {_INDEX_TABLE} WHERE collection = ? AND name = ?',
+                (self.name, name)
+            )
+            self.indexes.pop(name, None)
+            self.index_ops.pop(name, None)
+            self._rebuild_keys()
+
+    def _rebuild_keys(self):
+        """Extracts the values of the indexed fields of all the documents.
+        """
+        connection = self.database.connection
+        connection.execute(f'DELETE FROM {self._keys_table}')
+        if len(self.indexes) > 1:
+            for rowid, text in connection.execute(
+                f'SELECT rowid, doc FROM {self._table}'
+            ).fetchall():
+                self._write_keys(rowid, decode(text))
+
+    def _index_accesses(self, name):
+        """Returns the number of queries of this process that used an index.
+        """
+        return self.index_ops.get(name, 0)
+
+    def _drop(self):
+        """Deletes all documents and indexes.
+        """
+        with self.database.lock, self.database.connection:
+            self.database.connection.execute(f'DELETE FROM {self._table}')
+            self.database.connection.execute(f'DELETE FROM {self._keys_table}')
+            self.database.connection.execute(
+                f'DELETE FROM {_INDEX_TABLE} WHERE collection = ?', (self.name,)
+            )
+        self.indexes = {'_id_': {'key': [('_id', 1)]}}
+        self.index_ops = {}
+
+
+class SQLiteDatabase(DocumentDatabase):
+    """SQLite database that stands in for an i_mongodb MongoDBDatabase.
+
+    The connection is shared by the threads of the process, its operations
+    are serialized by a lock.
+
+    Attributes:
+        name: Name of the database, the name of the file.
+        path: Path of the database file, or ':memory:'.
+        connection: The sqlite3 connection.
+        lock: Lock of the connection.
+        collections: Dictionary of the opened collections, keyed by name.
+    """
+    def __init__(self, path=':memory:'):
+        """Opens or creates a database.
+
+        Args:
+            path: Path of the database file, ':memory:' for a temporary
+                database.
+        """
+        self.path = str(path)
+        self.name = os.path.splitext(os.path.basename(self.path))[0] or 'sqlite'
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.collections = {}
+
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {_INDEX_TABLE} '
+                '(collection TEXT, name TEXT, spec TEXT, PRIMARY KEY (collection, name))'
+            )
+
+    def read_collection(self, name):
+        """Returns the specified collection, creating it if needed.
+
+        Raises:
+            ValueError: The name is not set, as for the configuration
+                collection of aracnid_config without CONFIG_COLLECTION.
+        """
+        if not name:
+            raise ValueError(
+                'collection name not set, set CONFIG_COLLECTION to the name of '
+                'the configuration collection'
+            )
+
+        with self.lock:
+            if name not in self.collections:
+                self.collections[name] = SQLiteCollection(self, name)
+
+        return self.collections[name]
+
+    def delete_collection(self, name):
+        """Deletes the specified collection.
+        """
+        with self.lock, self.connection:
+            self.collections.pop(name, None)
+            self.connection.execute(f'DROP TABLE IF EXISTS {_quote(name)}')
+            self.connection.execute(f'DROP TABLE IF EXISTS {_quote(name + "__keys")}')
+            self.connection.execute(f'DELETE FROM {_INDEX_TABLE} WHERE collection = ?', (name,))
+
+    def close(self):
+        """Closes the connection.
+        """
+        self.connection.close()
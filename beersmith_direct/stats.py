@@ -0,0 +1,277 @@
+"""Class module for sync instrumentation.
+
+A SyncStats object records the time spent in each stage of a sync (file
+read, tag replacement, BeautifulSoup, xmltodict, normalization, notes,
+MongoDB reads and writes), record and byte counters, and error counts.
+Stages can be nested, in which case the time of the inner stage is also
+included in the outer stage.
+
+When disabled, stage() returns a shared no-op context manager and the
+counter methods return immediately, so the instrumentation costs one method
+call per stage.
+"""
+from contextlib import nullcontext
+import os
+import time
+
+# prefix of the Prometheus metric names
+PROMETHEUS_PREFIX = 'beersmith_direct'
+
+_NULL_STAGE = nullcontext()
+
+
+def stats_enabled():
+    """Returns True unless instrumentation is disabled by the environment.
+
+    Environment Variables:
+        BEERSMITH_STATS: Set to 0, false or off to disable instrumentation.
+    """
+    return os.environ.get('BEERSMITH_STATS', '1').lower() not in ('0', 'false', 'off')
+
+
+class _StageTimer:
+    """Context manager that times one stage.
+    """
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stats.record_stage(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.stats.error(self.name, exc)
+
+
+class SyncStats:
+    """Per-stage timers, counters and error counts of a sync run.
+
+    Hooks are callables that receive every recorded value as
+    hook(event, name, value), where event is 'stage' (value in seconds),
+    'count' (increment) or 'error' (the exception, or None).
+
+    Attributes:
+        enabled: If False, nothing is recorded.
+        timers: Dictionary of [calls, seconds] lists, keyed by stage name.
+        counters: Dictionary of counts, keyed by counter name.
+        errors: Dictionary of error counts, keyed by stage name.
+        hooks: List of hook callables.
+    """
+    def __init__(self, enabled=None, hooks=None):
+        """Initializes empty statistics.
+
+        Args:
+            enabled: Enables recording. Defaults to the BEERSMITH_STATS
+                environment variable, enabled if not set.
+            hooks: List of hook callables.
+        """
+        self.enabled = stats_enabled() if enabled is None else enabled
+        self.hooks = list(hooks or [])
+        self.timers = {}
+        self.counters = {}
+        self.errors = {}
+
+    def new_run(self):
+        """Returns new empty statistics with the same settings and hooks.
+        """
+        return SyncStats(enabled=self.enabled, hooks=self.hooks)
+
+    def add_hook(self, hook):
+        """Registers a hook callable.
+
+        Args:
+            hook: Callable that receives (event, name, value).
+        """
+        self.hooks.append(hook)
+
+    def _notify(self, event, name, value):
+        """Calls the hooks.
+        """
+        for hook in self.hooks:
+            hook(event, name, value)
+
+    def stage(self, name):
+        """Returns a context manager that times a stage.
+
+        Args:
+            name: Name of the stage.
+
+        Returns:
+            The context manager.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+
+        return _StageTimer(self, name)
+
+    def record_stage(self, name, seconds):
+        """Records the duration of one stage call.
+
+        Args:
+            name: Name of the stage.
+            seconds: Duration of the call, in seconds.
+        """
+        if not self.enabled:
+            return
+
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = [0, 0.0]
+        timer[0] += 1
+        timer[1] += seconds
+
+        if self.hooks:
+            self._notify('stage', name, seconds)
+
+    def add(self, name, value=1):
+        """Increments a counter.
+
+        Args:
+            name: Name of the counter.
+            value: Increment.
+        """
+        if not self.enabled:
+            return
+
+        self.counters[name] = self.counters.get(name, 0) + value
+
+        if self.hooks:
+            self._notify('count', name, value)
+
+    def error(self, name, exc=None):
+        """Counts an error.
+
+        Args:
+            name: Name of the stage or operation that failed.
+            exc: The exception, if any.
+        """
+        if not self.enabled:
+            return
+
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+        if self.hooks:
+            self._notify('error', name, exc)
+
+    def seconds(self, name):
+        """Returns the total time of a stage, in seconds.
+        """
+        return self.timers.get(name, [0, 0.0])[1]
+
+    def merge(self, other):
+        """Adds the values of other statistics to these statistics.
+
+        Args:
+            other: SyncStats object to merge.
+        """
+        for name, (calls, seconds) in other.timers.items():
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += calls
+            timer[1] += seconds
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        for name, value in other.errors.items():
+            self.errors[name] = self.errors.get(name, 0) + value
+
+    def as_dict(self):
+        """Returns the statistics as a dictionary.
+        """
+        return {
+            'stages': {
+                name: {'calls': calls, 'seconds': seconds}
+                for name, (calls, seconds) in self.timers.items()
+            },
+            'counters': dict(self.counters),
+            'errors': dict(self.errors),
+        }
+
+    def summary(self):
+        """Returns a one-line summary of the statistics.
+        """
+        stages = ', '.join(
+            f'{name}={seconds:.3f}s' for name, (_, seconds) in
+            sorted(self.timers.items(), key=lambda item: -item[1][1])
+        )
+        counters = ', '.join(f'{name}={value}' for name, value in self.counters.items())
+        errors = sum(self.errors.values())
+
+        return f'stages: [{stages}] counters: [{counters}] errors: {errors}'
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX, labels=None):
+        """Returns the statistics in the Prometheus text exposition format.
+
+        Args:
+            prefix: Prefix of the metric names.
+            labels: Dictionary of labels added to every sample.
+
+        Returns:
+            The metrics text.
+        """
+        base_labels = ''.join(
+            f',{key}="{_escape_label(value)}"' for key, value in (labels or {}).items()
+        )
+
+        def sample(metric, label, name, value):
+            return f'{prefix}_{metric}{{{label}="{_escape_label(name)}"{base_labels}}} {value}'
+
+        lines = [
+            f'# HELP {prefix}_stage_seconds_total Time spent in each sync stage.',
+            f'# TYPE {prefix}_stage_seconds_total counter',
+        ]
+        lines.extend(
+            sample('stage_seconds_total', 'stage', name, f'{seconds:.6f}')
+            for name, (_, seconds) in self.timers.items()
+        )
+        lines.extend([
+            f'# HELP {prefix}_stage_calls_total Number of calls of each sync stage.',
+            f'# TYPE {prefix}_stage_calls_total counter',
+        ])
+        lines.extend(
+            sample('stage_calls_total', 'stage', name, calls)
+            for name, (calls, _) in self.timers.items()
+        )
+        lines.extend([
+            f'# HELP {prefix}_records_total Number of records and bytes processed.',
+            f'# TYPE {prefix}_records_total counter',
+        ])
+        lines.extend(
+            sample('records_total', 'name', name, value)
+            for name, value in self.counters.items()
+        )
+        lines.extend([
+            f'# HELP {prefix}_errors_total Number of errors in each sync stage.',
+            f'# TYPE {prefix}_errors_total counter',
+        ])
+        lines.extend(
+            sample('errors_total', 'stage', name, value)
+            for name, value in self.errors.items()
+        )
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, filepath, **kwargs):
+        """Writes the Prometheus metrics text to a file.
+
+        The file is replaced atomically, as expected by the node_exporter
+        textfile collector.
+
+        Args:
+            filepath: Path of the metrics file.
+            **kwargs: Arguments of to_prometheus().
+        """
+        tmp_filepath = f'{filepath}.tmp'
+        with open(tmp_filepath, 'w', encoding='UTF-8') as metrics_file:
+            metrics_file.write(self.to_prometheus(**kwargs))
+        os.replace(tmp_filepath, filepath)
+
+
+def _escape_label(value):
+    """Escapes a Prometheus label value.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,86 @@
+"""Functions to select the storage backend of the recipe collections.
+
+The recipe stores use the subset of the pymongo interface of i_mongodb
+databases, so any database object with that interface can hold the
+collections:
+
+    mongodb or not set          MongoDB, through i_mongodb
+    sqlite:///PATH, PATH.db     embedded SQLite file (beersmith_direct.sqlite)
+    memory:                     in-process MemoryDatabase, lost on exit
+
+i_mongodb connects to the server of the MONGODB_USER_TOKEN and
+MONGODB_HOSTNAME environment variables, so a MongoDB URL, which would name
+another server, is rejected rather than ignored.
+
+The SQLite databases are opened once per path and shared by the connectors
+of the process, for example the libraries of a LibrarySync.
+"""
+# pylint: disable=import-outside-toplevel
+
+import os
+import threading
+
+# SQLite databases opened by the process, keyed by path
+_databases = {}
+_databases_lock = threading.Lock()
+
+# file extensions of the SQLite database paths
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+def database_url():
+    """Returns the database URL of the environment.
+
+    Environment Variables:
+        BEERSMITH_DATABASE: URL or path of the database, MongoDB if not set.
+    """
+    return os.environ.get('BEERSMITH_DATABASE', '')
+
+
+def open_database(url=None):
+    """Returns the database object of a URL.
+
+    Args:
+        url: Database URL or path. Defaults to the BEERSMITH_DATABASE
+            environment variable.
+
+    Returns:
+        A SQLiteDatabase or MemoryDatabase object, or None for MongoDB, which
+        the connectors open through i_mongodb.
+
+    Raises:
+        ValueError: The URL is not supported, or is a MongoDB URL.
+    """
+    url = database_url() if url is None else url
+    if not url or url == 'mongodb':
+        return None
+
+    if url.startswith(('mongodb://', 'mongodb+srv://')):
+        raise ValueError(
+            f'unsupported database url: {url}, set MONGODB_USER_TOKEN and '
+            'MONGODB_HOSTNAME and use mongodb for MongoDB'
+        )
+
+    if url == 'memory:':
+        from beersmith_direct.memory import MemoryDatabase
+        return MemoryDatabase()
+
+    if url.startswith('sqlite://'):
+        path = url[len('sqlite://'):]
+        path = path[1:] if path.startswith('/') else path
+        path = path or ':memory:'
+    elif url.lower().endswith(SQLITE_EXTENSIONS):
+        path = url
+    else:
+        raise ValueError(f'unsupported database url: {url}')
+
+    from beersmith_direct.sqlite import SQLiteDatabase
+    if path == ':memory:':
+        return SQLiteDatabase(path)
+
+    path = os.path.abspath(os.path.expanduser(path))
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = SQLiteDatabase(path)
+
+    return _databases[path]
@@ -0,0 +1,108 @@
+"""Parallel parsing of BeerSmith files.
+
+Parsing a .bsmx file is CPU bound (BeautifulSoup and xmltodict), so the
+recipe files of an archive are parsed by a pool of processes. Each worker
+records its own SyncStats, which are merged into the statistics of the run.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from beersmith_direct.i_beersmith import BeersmithInterface
+from beersmith_direct.stats import SyncStats
+
+
+def read_file(filename, path, cache_dir=None, stats_enabled=True):
+    """Parses one .bsmx file.
+
+    Args:
+        filename: Name of the file.
+        path: Location of the file.
+        cache_dir: Directory of the parsed file cache.
+        stats_enabled: Enables the statistics of the worker.
+
+    Returns:
+        Tuple of the file name, the parsed list and the SyncStats object.
+    """
+    bsm = BeersmithInterface(
+        stats=SyncStats(enabled=stats_enabled), profile=False, cache_dir=cache_dir
+    )
+    parsed_list = bsm.read_bsmx(filename=filename, path=path)
+
+    return filename, parsed_list, bsm.stats
+
+
+def read_files(filenames, path, workers=1, cache_dir=None, stats=None):
+    """Parses .bsmx files with a pool of processes.
+
+    Args:
+        filenames: List of file names.
+        path: Location of the files.
+        workers: Number of processes. With 1 worker, the files are parsed in
+            this process.
+        cache_dir: Directory of the parsed file cache.
+        stats: SyncStats object that receives the statistics of the workers.
+
+    Returns:
+        Dictionary of parsed lists, keyed by file name.
+    """
+    stats_enabled = stats.enabled if stats is not None else True
+    workers = min(workers, len(filenames)) or 1
+
+    if workers == 1:
+        results = [
+            read_file(filename, path, cache_dir, stats_enabled)
+            for filename in filenames
+        ]
+    else:
+        chunksize = max(1, len(filenames) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                read_file, filenames, [path] * len(filenames),
+                [cache_dir] * len(filenames), [stats_enabled] * len(filenames),
+                chunksize=chunksize
+            ))
+
+    parsed = {}
+    for filename, parsed_list, worker_stats in results:
+        parsed[filename] = parsed_list
+        if stats is not None:
+            stats.merge(worker_stats)
+
+    return parsed
+
+
+def read_partition(key, actions, path, cache_dir=None, stats_enabled=True):
+    """Parses the recipe files of a partition of archive actions, in order.
+
+    Args:
+        key: Key of the partition, returned with the results.
+        actions: List of (index, action, filename) tuples. The actions
+            without a recipe file have a None filename.
+        path: Location of the files.
+        cache_dir: Directory of the parsed file cache.
+        stats_enabled: Enables the statistics of the worker.
+
+    Returns:
+        Tuple of the key, the list of (index, recipe) tuples, where recipe
+        is None for the actions without a file, and the SyncStats object.
+    """
+    bsm = BeersmithInterface(
+        stats=SyncStats(enabled=stats_enabled), profile=False, cache_dir=cache_dir
+    )
+    results = []
+    for index, _, filename in actions:
+        recipe = None
+        if filename is not None:
+            recipe = bsm.read_bsmx(filename=filename, path=path)[0]
+        results.append((index, recipe))
+
+    return key, results, bsm.stats
+
+
+def default_workers():
+    """Returns the number of available processors.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
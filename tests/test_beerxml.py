@@ -0,0 +1,108 @@
+"""Tests the BeerXML reader.
+"""
+import io
+import os
+import tracemalloc
+
+import pytest
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct.beerxml import iter_beerxml
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipes import Recipes
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+XML_FILENAME = 'beerxml-two-recipes.xml'
+
+
+@pytest.fixture(name='xml_recipes', scope='module')
+def fixture_xml_recipes():
+    """Pytest fixture to return the recipes of the BeerXML test file.
+    """
+    return BeersmithInterface().read_xml(XML_FILENAME, TESTS_PATH)
+
+def beerxml_bytes(recipe_count):
+    """Returns a BeerXML file of copies of the first test recipe.
+    """
+    with open(os.path.join(TESTS_PATH, XML_FILENAME), 'rb') as xml_file:
+        xml_bytes = xml_file.read()
+    start = xml_bytes.index(b'<RECIPE>')
+    end = xml_bytes.index(b'</RECIPE>') + len(b'</RECIPE>')
+
+    return b'<RECIPES>' + xml_bytes[start:end] * recipe_count + b'</RECIPES>'
+
+def test_read_xml_shape(xml_recipes):
+    """Tests that the BeerXML recipes have the shape of the .bsmx recipes.
+    """
+    bsmx_recipe = BeersmithInterface().read_bsmx('bsm-one-recipe.bsmx', TESTS_PATH)[0]
+
+    assert [recipe['_id'] for recipe in xml_recipes] == ['Burton Ale', 'Dry Stout']
+    for recipe in xml_recipes:
+        assert recipe['_type'] == 'recipe'
+        assert recipe['folder_name'] == '/beerxml-two-recipes/'
+        for key in ('ingredients', 'ingredients_by_type', 'mash', 'equipment',
+                    'style', 'carb', 'base_grain', 'ferment'):
+            assert isinstance(recipe[key], type(bsmx_recipe[key]))
+        assert 'mashsteps' in recipe['mash']
+        for ingredient in recipe['ingredients']:
+            assert set(ingredient) >= {'name', 'amount', 'units', 'ingredient_type', 'order'}
+
+    # the notes are processed like the .bsmx notes
+    assert xml_recipes[0]['yield'] == 5
+
+def test_read_xml_units(xml_recipes):
+    """Tests the conversion of the BeerXML values to the BeerSmith units.
+    """
+    recipe = xml_recipes[0]
+    assert recipe['type'] == 2
+    assert recipe['equipment']['batch_vol'] == pytest.approx(640.1, abs=0.1)
+    assert recipe['equipment']['boil_time'] == 60
+    assert recipe['desired_og'] == pytest.approx(1.055)
+
+    grain, sugar = recipe['ingredients_by_type']['grain']
+    assert grain['amount'] == pytest.approx(160.0)
+    assert grain['units'] == 'oz'
+    assert grain['recommend_mash'] == 1
+    assert sugar['subtype'] == 'sugar'
+    assert recipe['base_grain']['name'] == grain['name']
+
+    boil_hop, dry_hop = recipe['ingredients_by_type']['hops']
+    assert boil_hop['use'] == 0
+    assert boil_hop['boil_time'] == 60
+    assert dry_hop['subtype'] == 'leaf hops'
+    assert dry_hop['dry_hop_time'] == 3
+
+    assert recipe['ingredients_by_type']['yeast'][0]['units'] == 'ml'
+    assert recipe['ingredients_by_type']['misc'][0]['units'] == 'oz'
+    assert recipe['mash']['mashsteps'][0]['step_temp'] == pytest.approx(154.04)
+    assert recipe['mash']['mashsteps'][0]['infusion_temp'] == pytest.approx(168.08)
+    assert recipe['ferment']['prim_temp'] == 68
+
+    yeast = xml_recipes[1]['ingredients_by_type']['yeast'][0]
+    assert (yeast['amount'], yeast['units'], yeast['form_text']) == (11.5, 'g', 'dry')
+
+def test_iter_beerxml_streams():
+    """Tests that the memory of a read does not grow with the recipe count.
+    """
+    peaks = []
+    for recipe_count in (20, 200):
+        source = io.BytesIO(beerxml_bytes(recipe_count))
+        tracemalloc.start()
+        count = sum(1 for _ in iter_beerxml(source))
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert count == recipe_count
+
+    assert peaks[1] < 2 * peaks[0]
+
+def test_update_recipes_from_xml():
+    """Tests that a BeerXML file is imported through the bulk writes.
+    """
+    recipes = Recipes(collection_name='test_beerxml', mdb=MemoryDatabase(), batch_size=1)
+    recipes.stats.enabled = True
+
+    assert recipes.update_recipes(XML_FILENAME, TESTS_PATH) == 2
+    assert recipes.collection.count_documents({}) == 2
+    assert recipes.collection.find_one({'_id': 'Dry Stout'})['type'] == 0
+    assert recipes.stats.counters['recipes_parsed'] == 2
@@ -0,0 +1,103 @@
+"""Tests the synthetic corpus and the benchmark suite.
+
+The throughputs are compared with the stored baselines, which are the
+measures of one machine, only if BEERSMITH_BENCH_CHECK is set to 1. Set
+BEERSMITH_BENCH_SAVE=1 to store the results as the new baselines.
+"""
+import os
+
+import pytest
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct.bench import (
+    check_baselines, load_baselines, run_benchmarks, save_baselines
+)
+from beersmith_direct.corpus import CorpusSpec, folder_paths, write_archive, write_library
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipes import Recipes
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'bench_baselines.json')
+
+BENCH_SPEC = CorpusSpec(
+    recipe_count=40, folder_depth=1, ingredients_per_recipe=12,
+    readings_per_recipe=2, notes_density=0.3, archive_actions=20
+)
+
+
+@pytest.fixture(name='corpus_path', scope='module')
+def fixture_corpus_path(tmp_path_factory):
+    """Pytest fixture to write and return the path of a synthetic corpus.
+    """
+    path = tmp_path_factory.mktemp('corpus')
+    write_library(BENCH_SPEC, path)
+    write_archive(BENCH_SPEC, path)
+
+    return str(path)
+
+def test_corpus_deterministic(tmp_path):
+    """Tests that the same spec generates the same files.
+    """
+    write_library(BENCH_SPEC, tmp_path, 'a.bsmx')
+    write_library(BENCH_SPEC, tmp_path, 'b.bsmx')
+
+    assert (tmp_path / 'a.bsmx').read_text() == (tmp_path / 'b.bsmx').read_text()
+
+def test_corpus_library(corpus_path):
+    """Tests reading a generated library.
+    """
+    recipe_list = BeersmithInterface().read_bsmx('Recipe.bsmx', corpus_path)
+
+    assert len(recipe_list) == BENCH_SPEC.recipe_count
+    assert len(recipe_list[0]['ingredients']) == BENCH_SPEC.ingredients_per_recipe
+    assert len(recipe_list[0]['ferment']['readings']) == BENCH_SPEC.readings_per_recipe
+    assert recipe_list[0]['folder_name'] == '/folder-1-1/'
+
+def test_corpus_folder_paths():
+    """Tests the folder tree of a nested corpus.
+    """
+    spec = CorpusSpec(folder_depth=3, folders_per_level=2)
+
+    assert len(folder_paths(spec)) == 8
+    assert folder_paths(spec)[-1] == ('folder-1-2', 'folder-2-2', 'folder-3-2')
+
+def test_corpus_archive(corpus_path):
+    """Tests reading a generated archive.
+    """
+    archive_list = BeersmithInterface().read_bsmx('Archive.bsmx', corpus_path)
+
+    assert len(archive_list) == BENCH_SPEC.archive_actions
+    assert {archive['action'] for archive in archive_list} <= set(BENCH_SPEC.action_mix)
+
+def test_sync_memory_database(corpus_path):
+    """Tests syncing a generated corpus into the in-memory database.
+    """
+    recipes = Recipes(collection_name='test_recipes', mdb=MemoryDatabase())
+    recipes.update_recipes('Recipe.bsmx', corpus_path)
+    assert recipes.collection.count_documents({}) == BENCH_SPEC.recipe_count
+
+    recipes.update_recipes_from_archive('Archive.bsmx', corpus_path)
+    assert recipes.props.last_id
+    assert recipes.props.last_updated
+
+def test_benchmarks_baselines(corpus_path):
+    """Tests the benchmark results against the stored baselines.
+    """
+    results = run_benchmarks(BENCH_SPEC, corpus_path)
+
+    assert [result.name for result in results] == [
+        'read_bsmx', 'process_recipe', 'correct_type',
+        'update_recipes', 'update_recipes_from_archive',
+    ]
+    assert all(result.items_per_sec > 0 for result in results)
+
+    assert results[0].items == BENCH_SPEC.recipe_count
+
+    if os.environ.get('BEERSMITH_BENCH_SAVE'):
+        save_baselines(results, BASELINES_PATH, BENCH_SPEC)
+
+    if os.environ.get('BEERSMITH_BENCH_CHECK') != '1':
+        pytest.skip('set BEERSMITH_BENCH_CHECK=1 to compare with the baselines')
+
+    # the peak RSS of the process depends on the tests that ran before
+    regressions = check_baselines(results, load_baselines(BASELINES_PATH), check_rss=False)
+    assert not regressions, regressions
@@ -0,0 +1,85 @@
+"""Tests the streaming sync mode.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct.budget import MB, MemoryBudget
+from beersmith_direct.corpus import CorpusSpec, write_library
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+# RSS target of the streaming rebuild, in megabytes: about twice its peak
+# on the generated corpus (about 70 MB)
+BUDGET_MB = 140
+
+# largest ratio of the peak RSS of the streaming rebuild to the one of a
+# rebuild that parses the whole library (about 60 MB to 160 MB)
+PEAK_RATIO = 0.6
+
+BUDGET_SPEC = CorpusSpec(recipe_count=250, folder_depth=1, notes_density=0.5)
+
+REBUILD_SCRIPT = '''
+import sys
+from beersmith_direct.budget import peak_rss
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipes import Recipes
+
+recipes = Recipes(collection_name='test_budget', mdb=MemoryDatabase(),
+                  memory_budget=float(sys.argv[2]) or None)
+recipes.rebuild('Recipe.bsmx', sys.argv[1])
+print(recipes.collection.count_documents({}), peak_rss())
+'''
+
+
+@pytest.mark.parametrize('filename', [
+    'bsm-one-recipe.bsmx', 'bsm-two-recipes.bsmx', 'bsm-two-folders.bsmx',
+    'bsm-one-folder-one-recipe.bsmx',
+])
+def test_chunked_parse(filename):
+    """Tests that parsing the recipes one at a time gives the same recipes.
+    """
+    bsm = BeersmithInterface()
+
+    assert list(bsm.iter_bsmx(filename, TESTS_PATH, chunked=True)) == \
+        bsm.read_bsmx(filename, TESTS_PATH)
+
+def test_batch_limit():
+    """Tests that the batch size shrinks over the budget and grows under it.
+    """
+    budget = MemoryBudget(1, max_batch_size=100)
+    assert budget.batch_limit() == 50
+    while budget.batch_limit() > 1:
+        pass
+
+    budget.limit = 1024 ** 4
+    assert budget.batch_limit() == 2
+    assert budget.peak > 0
+
+def rebuild_peak_rss(path, budget_mb):
+    """Rebuilds a library in a new process and returns the number of recipes
+    and the peak RSS of the process.
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', REBUILD_SCRIPT, str(path), str(budget_mb)],
+        capture_output=True, text=True, check=True, cwd=os.getcwd()
+    )
+    recipe_count, rss = result.stdout.split()
+
+    return int(recipe_count), int(rss)
+
+def test_rebuild_peak_rss(tmp_path):
+    """Tests that the streaming rebuild stays within its budget, and peaks
+    well below a rebuild that parses the whole library.
+    """
+    write_library(BUDGET_SPEC, tmp_path)
+
+    baseline_count, baseline_rss = rebuild_peak_rss(tmp_path, 0)
+    recipe_count, rss = rebuild_peak_rss(tmp_path, BUDGET_MB)
+
+    assert recipe_count == baseline_count == BUDGET_SPEC.recipe_count
+    assert rss < BUDGET_MB * MB
+    assert rss < PEAK_RATIO * baseline_rss
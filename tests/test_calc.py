@@ -0,0 +1,80 @@
+"""Tests the batch brewing calculations.
+"""
+import math
+import os
+
+import pytest
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct.calc import (
+    AGGREGATES, IngredientTable, normalize_amount, recipe_aggregates
+)
+from beersmith_direct.corpus import CorpusSpec, write_library
+
+numpy = pytest.importorskip('numpy')
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+
+@pytest.fixture(name='recipe_list', scope='module')
+def fixture_recipe_list(tmp_path_factory):
+    """Pytest fixture to return the fixture recipes and a generated library.
+    """
+    path = tmp_path_factory.mktemp('calc')
+    write_library(CorpusSpec(recipe_count=30, ingredients_per_recipe=15, notes_density=0.5), path)
+
+    bsm = BeersmithInterface()
+    return bsm.read_bsmx('bsm-two-recipes.bsmx', TESTS_PATH) + bsm.read_bsmx('Recipe.bsmx', path)
+
+def test_normalize_amount():
+    """Tests the grain conversion of get_ingredient_amount.
+    """
+    ingredient = {'amount': 32, 'units': 'oz', 'ingredient_type': 'grain'}
+
+    assert normalize_amount(32, 'oz', 'grain') == \
+        BeersmithInterface.get_ingredient_amount(ingredient) == (2.0, 'lbs')
+    assert normalize_amount(2, 'oz', 'hops') == (2.0, 'oz')
+
+def test_reference_estimates(recipe_list):
+    """Tests the scalar estimates of a known recipe.
+    """
+    totals = recipe_aggregates(recipe_list[0])
+
+    assert totals['grist_lbs'] == 142.0
+    assert totals['hops_oz'] == 46.0
+    assert totals['yeast_count'] == 1
+    assert 1.045 < totals['og'] < 1.060
+    assert 10 < totals['srm'] < 20
+
+def test_table_columns(recipe_list):
+    """Tests the typed columns of the ingredient table.
+    """
+    table = IngredientTable.from_recipes(recipe_list)
+
+    assert len(table) == sum(len(recipe['ingredients']) for recipe in recipe_list)
+    assert table.recipe_index.dtype == numpy.int32
+    assert table.ingredient_type.dtype == numpy.int8
+    assert table.amount.dtype == numpy.float64
+    assert len(table.batch_gallons) == len(recipe_list)
+
+def test_vectorized_matches_reference(recipe_list):
+    """Tests the vectorized aggregates against the scalar implementation.
+    """
+    aggregates = IngredientTable.from_recipes(recipe_list).aggregates_by_recipe()
+
+    for recipe in recipe_list:
+        expected = recipe_aggregates(recipe)
+        for name in AGGREGATES:
+            assert math.isclose(
+                aggregates[recipe['_id']][name], expected[name], rel_tol=1e-9, abs_tol=1e-9
+            ), (recipe['_id'], name)
+
+def test_normalized_amounts(recipe_list):
+    """Tests the vectorized unit normalization.
+    """
+    table = IngredientTable.from_recipes(recipe_list)
+    amounts, units = table.normalized_amounts()
+    grain = table.type_mask('grain')
+
+    assert set(units[grain]) == {table.units_labels.index('lbs')}
+    assert numpy.allclose(amounts[grain], table.amount[grain] / 16)
@@ -0,0 +1,106 @@
+"""Tests the deduplicated ingredient catalog.
+"""
+from collections import Counter
+
+import pytest
+
+from beersmith_direct.catalog import ingredient_key
+from beersmith_direct.cli import main
+from beersmith_direct.corpus import CorpusSpec, write_archive, write_library
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipes import Recipes
+from beersmith_direct.sqlite import SQLiteDatabase
+
+CATALOG_SPEC = CorpusSpec(recipe_count=8, archive_actions=30)
+
+
+@pytest.fixture(name='corpus_path', scope='module')
+def fixture_corpus_path(tmp_path_factory):
+    """Pytest fixture to write and return the path of a synthetic corpus.
+    """
+    path = tmp_path_factory.mktemp('catalog')
+    write_library(CATALOG_SPEC, path)
+    write_archive(CATALOG_SPEC, path)
+
+    return str(path)
+
+def scan_catalog(recipes):
+    """Returns the usage counts and the recipes of each ingredient, from the
+    recipes.
+    """
+    usage = Counter()
+    recipe_ids = {}
+    for recipe in recipes.find_recipes():
+        for ingredient in recipe['ingredients']:
+            key = ingredient_key(ingredient)
+            usage[key] += 1
+            recipe_ids.setdefault(key, set()).add(recipe['_id'])
+
+    return {key: (count, recipe_ids[key]) for key, count in usage.items()}
+
+@pytest.mark.parametrize('database', [MemoryDatabase, SQLiteDatabase])
+def test_catalog_of_a_sync(corpus_path, database, monkeypatch):
+    """Tests that the catalog follows a rebuild and an archive replay.
+    """
+    monkeypatch.setenv('CONFIG_COLLECTION', 'config')
+    recipes = Recipes(collection_name='test_catalog', mdb=database(), batch_size=5, catalog=True)
+    recipes.stats.enabled = True
+    recipes.rebuild('Recipe.bsmx', corpus_path)
+    recipes.update_recipes_from_archive('Archive.bsmx', corpus_path)
+
+    catalog = {
+        (entry['ingredient_type'], entry['name'], entry['form']):
+        (entry['usage_count'], set(entry['recipes']))
+        for entry in recipes.find_ingredients()
+    }
+    assert catalog == scan_catalog(recipes)
+    assert recipes.stats.counters['catalog_updates'] > len(catalog)
+
+    # the catalog queries do not read the recipes
+    op_counts = dict(recipes.collection.op_counts)
+    hops = recipes.find_ingredients('hops', 'CASCADE  hops')
+    assert {entry['name'] for entry in hops} == {'cascade hops'}
+    assert recipes.catalog.recipes_using('Cascade Hops') == \
+        sorted(set().union(*(entry['recipes'] for entry in hops)))
+    assert recipes.collection.op_counts == op_counts
+
+def test_update_and_delete():
+    """Tests the catalog changes of the single recipe writes.
+    """
+    recipes = Recipes(collection_name='test_catalog_writes', mdb=MemoryDatabase(), catalog=True)
+    cascade = {'name': 'Cascade Hops', 'ingredient_type': 'hops', 'form': 0, 'amount': 1.0,
+               'origin': 'US'}
+    malt = {'name': 'Pale Malt', 'ingredient_type': 'grain', 'amount': 160.0}
+    recipes.update_recipe({'name': 'Pale Ale', 'ingredients': [cascade, dict(cascade), malt]})
+    recipes.update_recipe({'name': 'IPA', 'ingredients': [dict(cascade, origin='USA')]})
+
+    entry = recipes.find_ingredients('hops')[0]
+    assert (entry['usage_count'], entry['recipes']) == (3, ['Pale Ale', 'IPA'])
+    assert entry['props'] == {'name': 'Cascade Hops', 'ingredient_type': 'hops', 'form': 0,
+                              'origin': 'USA'}
+
+    recipes.update_recipe({'name': 'Pale Ale', 'ingredients': [malt]})
+    assert recipes.catalog.recipes_using('cascade hops') == ['IPA']
+    recipes.delete_recipe('IPA')
+    assert [entry['name'] for entry in recipes.find_ingredients()] == ['pale malt']
+
+def test_ingredients_command(capsys):
+    """Tests the listing of the ingredient catalog.
+    """
+    mdb = MemoryDatabase()
+    recipes = Recipes(collection_name='test_catalog_cli', mdb=mdb, catalog=True)
+    recipes.update_recipe({'name': 'Stout', 'ingredients': [
+        {'name': 'Roasted Barley', 'ingredient_type': 'grain', 'amount': 16.0},
+    ]})
+
+    assert main(['ingredients', '--collection', 'test_catalog_cli', '--type', 'grain'],
+                mdb=mdb) == 0
+    assert capsys.readouterr().out == 'grain: Roasted Barley: 1 uses in 1 recipes\n'
+
+def test_catalog_disabled():
+    """Tests that the catalog is off unless enabled.
+    """
+    recipes = Recipes(collection_name='test_catalog_off', mdb=MemoryDatabase())
+    assert recipes.catalog is None
+    with pytest.raises(ValueError):
+        recipes.find_ingredients()
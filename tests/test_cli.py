@@ -0,0 +1,103 @@
+"""Tests the command line interface.
+"""
+import os
+
+import pytest
+
+from beersmith_direct.cli import build_parser, main
+from beersmith_direct.corpus import CorpusSpec, write_archive, write_library
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipes import Recipes
+from beersmith_direct.workers import read_files
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+CLI_SPEC = CorpusSpec(recipe_count=10, archive_actions=12)
+
+
+@pytest.fixture(name='corpus_path', scope='module')
+def fixture_corpus_path(tmp_path_factory):
+    """Pytest fixture to write and return the path of a synthetic corpus.
+    """
+    path = tmp_path_factory.mktemp('cli')
+    write_library(CLI_SPEC, path)
+    write_archive(CLI_SPEC, path)
+
+    return str(path)
+
+def test_options_before_and_after_command():
+    """Tests that the shared options are accepted on both sides of the command.
+    """
+    args = build_parser().parse_args(['--workers', '4', 'sync', '--batch-size', '50'])
+
+    assert args.workers == 4
+    assert args.batch_size == 50
+    assert args.checkpoint_interval is None
+
+def test_parse(capsys):
+    """Tests parsing a file.
+    """
+    assert main(['parse', 'bsm-two-recipes.bsmx', '--path', TESTS_PATH]) == 0
+
+    output = capsys.readouterr().out
+    assert 'parse: 1 files, 2 records' in output
+    assert 'recipes/sec' in output and 'MB/sec' in output
+
+def test_sync_dry_run(corpus_path, capsys):
+    """Tests the dry run of a sync with parsing workers.
+    """
+    assert main(['sync', '--dry-run', '--path', corpus_path, '--workers', '2']) == 0
+
+    output = capsys.readouterr().out
+    assert f'archive: 1 files, {CLI_SPEC.archive_actions} records' in output
+    assert 'sync (dry run):' in output
+
+def test_rebuild_memory_database(corpus_path, capsys):
+    """Tests a rebuild with batched writes and checkpoints.
+    """
+    mdb = MemoryDatabase()
+    argv = [
+        'rebuild', '--collection', 'test_cli', '--path', corpus_path,
+        '--batch-size', '4', '--checkpoint-interval', '5',
+    ]
+
+    assert main(argv, mdb=mdb) == 0
+    assert mdb.test_cli.count_documents({}) == CLI_SPEC.recipe_count
+    assert mdb.test_cli.op_counts['bulk_write'] == 4
+    assert 'bulk_writes=4' in capsys.readouterr().out
+
+def test_pull_workers_matches_serial(corpus_path):
+    """Tests that parsing workers and batching do not change the result.
+    """
+    def sync(**kwargs):
+        recipes = Recipes(collection_name='test_cli_pull', mdb=MemoryDatabase(), **kwargs)
+        recipes.update_recipes('Recipe.bsmx', corpus_path)
+        recipes.update_recipes_from_archive('Archive.bsmx', corpus_path)
+        return list(recipes.collection.find({}, sort=[('_id', 1)]))
+
+    assert sync(workers=2, batch_size=3) == sync(workers=1, batch_size=1)
+
+def test_read_files_cache(corpus_path, tmp_path):
+    """Tests the parsed file cache.
+    """
+    first = read_files(['Recipe.bsmx'], corpus_path, cache_dir=str(tmp_path))
+    recipes = Recipes(collection_name='test_cli_cache', mdb=MemoryDatabase(),
+                      cache_dir=str(tmp_path))
+    recipes.stats.enabled = True
+
+    assert recipes.read_recipes('Recipe.bsmx', corpus_path) == first['Recipe.bsmx']
+    assert recipes.stats.counters['cache_hits'] == 1
+
+def test_missing_path_and_file(monkeypatch, capsys):
+    """Tests the usage errors of a missing location or file.
+    """
+    monkeypatch.delenv('BEERSMITH_DEFAULT_PATH', raising=False)
+    with pytest.raises(SystemExit) as exit_info:
+        main(['parse', 'bsm-one-recipe.bsmx'])
+    assert exit_info.value.code == 2
+    assert 'use --path or BEERSMITH_DEFAULT_PATH' in capsys.readouterr().err
+
+    with pytest.raises(SystemExit) as exit_info:
+        main(['sync', '--dry-run', '--path', '/nonexistent'])
+    assert exit_info.value.code == 2
+    assert 'file not found: /nonexistent/Archive.bsmx' in capsys.readouterr().err
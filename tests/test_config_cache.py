@@ -0,0 +1,151 @@
+"""Tests cached configuration properties.
+"""
+import gc
+import weakref
+
+import pytest
+
+from beersmith_direct.config_cache import CachedConfig, cached_config
+from beersmith_direct.memory import MemoryDatabase
+
+
+class CountingConfig:
+    """Configuration object that counts reads and writes.
+    """
+    def __init__(self):
+        self.stored = {'last_id': 'stored'}
+        self.props = dict(self.stored)
+        self.reads = 0
+        self.writes = 0
+
+    def load_properties(self, name):
+        """Reads the stored properties.
+        """
+        assert name
+        self.reads += 1
+        self.props = dict(self.stored)
+
+    def update(self):
+        """Writes the properties.
+        """
+        self.writes += 1
+        self.stored = dict(self.props)
+
+    def delete(self):
+        """Deletes the properties.
+        """
+        self.stored = {}
+        self.props = {}
+
+
+@pytest.fixture(name='config')
+def fixture_config():
+    """Pytest fixture to initialize and return the counting config object.
+    """
+    return CountingConfig()
+
+def test_read_within_ttl(config):
+    """Tests that reads within the time-to-live are served from the cache.
+    """
+    props = CachedConfig('beersmith', ttl=60, config=config)
+
+    assert props.last_id == 'stored'
+    assert props['last_id'] == 'stored'
+    assert config.reads == 0
+    assert props.metrics['hits'] == 2
+
+def test_read_after_ttl(config):
+    """Tests that an expired cache reloads the properties.
+    """
+    props = CachedConfig('beersmith', ttl=0, config=config)
+    config.stored['last_id'] = 'changed'
+    props.invalidate()
+
+    assert props.last_id == 'changed'
+    assert config.reads == 1
+
+def test_write_coalescing(config):
+    """Tests that several assignments are written in one update.
+    """
+    props = CachedConfig('beersmith', ttl=60, config=config)
+
+    props.rebuild = False
+    props.last_updated = '2021-11-01'
+    props.last_id = 'recipe 1'
+    props.last_id = 'recipe 2'
+
+    assert config.writes == 0
+    assert props.dirty == {'rebuild', 'last_updated', 'last_id'}
+
+    assert props.flush()
+    assert not props.flush()
+    assert config.writes == 1
+    assert config.stored['last_id'] == 'recipe 2'
+    assert props.metrics['coalesced'] == 3
+
+def test_reload_keeps_dirty(config):
+    """Tests that unflushed assignments survive a reload.
+    """
+    props = CachedConfig('beersmith', ttl=60, config=config)
+    props.last_id = 'dirty'
+    props.invalidate()
+
+    assert props.last_id == 'dirty'
+
+def test_delete(config):
+    """Tests deleting the configuration set.
+    """
+    props = CachedConfig('beersmith', ttl=60, config=config)
+    props.last_id = 'dirty'
+    props.delete()
+
+    assert not props.dirty
+    assert props.last_id is None
+
+def test_flag_of_another_process(config):
+    """Tests that a property written elsewhere is seen after the
+    time-to-live or an invalidation.
+    """
+    props = CachedConfig('beersmith', ttl=60, config=config)
+    assert props.rebuild is None
+
+    config.stored['rebuild'] = True
+    assert props.rebuild is None
+    props.invalidate()
+    assert props.rebuild is True
+
+def test_shared_per_database():
+    """Tests that the shared caches are keyed by database.
+    """
+    mdb, other_mdb = MemoryDatabase('first'), MemoryDatabase('second')
+
+    props = cached_config('test_shared', mdb=mdb)
+    assert cached_config('test_shared', mdb=mdb) is props
+    assert cached_config('test_shared', mdb=other_mdb) is not props
+
+    # the caches are released with their database
+    mdb_ref = weakref.ref(mdb)
+    del mdb, props
+    gc.collect()
+    assert mdb_ref() is None
+
+def test_flush_writes_dirty_properties(monkeypatch):
+    """Tests that a flush does not overwrite the properties written by another
+    process.
+    """
+    monkeypatch.setenv('CONFIG_COLLECTION', 'config')
+    mdb = MemoryDatabase()
+    props = CachedConfig('beersmith', ttl=60, mdb=mdb)
+    other_props = CachedConfig('beersmith', ttl=60, mdb=mdb)
+    props.last_id = 'first'
+    props.flush()
+
+    # the other cache read the configuration set before this write
+    assert other_props.last_id == 'first'
+    props.rebuild = True
+    props.flush()
+    other_props.last_id = 'second'
+    other_props.flush()
+
+    stored = mdb.read_collection('config').find_one({'_id': 'beersmith'})
+    assert stored['props'] == {'last_id': 'second', 'rebuild': True}
@@ -0,0 +1,143 @@
+"""Tests the streaming export.
+"""
+import json
+import os
+
+import pytest
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct.cli import main
+from beersmith_direct.corpus import CorpusSpec, write_library
+from beersmith_direct.export import (
+    column_filename, export_bsmx, export_recipes, flatten_recipe, open_file, read_columns
+)
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+EXPORT_SPEC = CorpusSpec(recipe_count=7, ingredients_per_recipe=5, readings_per_recipe=3)
+
+
+@pytest.fixture(name='library_path', scope='module')
+def fixture_library_path(tmp_path_factory):
+    """Pytest fixture to write and return the path of a synthetic library.
+    """
+    path = tmp_path_factory.mktemp('export')
+    write_library(EXPORT_SPEC, path)
+
+    return str(path)
+
+def test_iter_bsmx_matches_read_bsmx():
+    """Tests that streaming yields the same recipes as read_bsmx.
+    """
+    bsm = BeersmithInterface()
+
+    assert list(bsm.iter_bsmx('bsm-two-folders.bsmx', TESTS_PATH)) == \
+        bsm.read_bsmx('bsm-two-folders.bsmx', TESTS_PATH)
+
+def test_flatten_recipe():
+    """Tests flattening a recipe into table rows.
+    """
+    recipe = BeersmithInterface().read_bsmx('bsm-one-recipe.bsmx', TESTS_PATH)[0]
+    tables = flatten_recipe(recipe)
+
+    row = tables['recipes'][0]
+    assert row['name'] == recipe['name']
+    assert row['style_name'] == recipe['style']['name']
+    assert 'ingredients' not in row
+    assert len(tables['ingredients']) == len(recipe['ingredients'])
+    assert {ingredient['recipe_id'] for ingredient in tables['ingredients']} == {recipe['_id']}
+    assert len(tables['mash_steps']) == len(recipe['mash']['mashsteps'])
+
+def test_export_ndjson_chunks(library_path, tmp_path):
+    """Tests the chunked and compressed NDJSON layout.
+    """
+    export_bsmx('Recipe.bsmx', library_path, tmp_path, formats=('ndjson',),
+                chunk_rows=3, compression='gzip')
+
+    files = sorted(os.listdir(tmp_path / 'ndjson'))
+    assert files == ['recipes-00000.ndjson.gz', 'recipes-00001.ndjson.gz',
+                     'recipes-00002.ndjson.gz']
+    with open_file(tmp_path / 'ndjson' / 'recipes-00002.ndjson', 'gzip', 'rt') as ndjson_file:
+        assert [json.loads(line)['_type'] for line in ndjson_file] == ['recipe']
+
+def test_export_columnar(library_path, tmp_path):
+    """Tests reading selected columns of the columnar layout.
+    """
+    rows = export_bsmx('Recipe.bsmx', library_path, tmp_path, formats=('columnar',),
+                       chunk_rows=10)
+
+    assert rows == {
+        'recipes': EXPORT_SPEC.recipe_count,
+        'ingredients': EXPORT_SPEC.recipe_count * EXPORT_SPEC.ingredients_per_recipe,
+        'mash_steps': EXPORT_SPEC.recipe_count * EXPORT_SPEC.mash_steps,
+        'ferment_readings': EXPORT_SPEC.recipe_count * EXPORT_SPEC.readings_per_recipe,
+    }
+    columns = read_columns(tmp_path / 'columnar', 'ingredients', ['recipe_id', 'name'])
+    assert list(columns) == ['recipe_id', 'name']
+    assert len(columns['name']) == rows['ingredients']
+    assert len(os.listdir(tmp_path / 'columnar' / 'ingredients')) == 4
+
+def test_export_columnar_unsafe_names(tmp_path):
+    """Tests that column names with path separators and leading dots stay
+    in their chunk directory.
+    """
+    recipe = BeersmithInterface().read_bsmx('bsm-one-recipe.bsmx', TESTS_PATH)[0]
+    recipe['a/b'] = 1
+    recipe['../x'] = 2
+    recipe['.hidden'] = 3
+    export_recipes([recipe], tmp_path, formats=('columnar',))
+
+    chunk_path = tmp_path / 'columnar' / 'recipes' / 'part-00000'
+    with open(chunk_path / '_manifest.json', 'r', encoding='UTF-8') as manifest_file:
+        assert {'a/b', '../x', '.hidden'} <= set(json.load(manifest_file)['columns'])
+    assert {'a%2Fb.ndjson', '%2E.%2Fx.ndjson', '%2Ehidden.ndjson'} <= set(os.listdir(chunk_path))
+    assert not os.path.exists(tmp_path / 'columnar' / 'recipes' / 'x.ndjson')
+    assert column_filename('style_name') == 'style_name.ndjson'
+    assert read_columns(tmp_path / 'columnar', 'recipes', ['a/b', '../x', '.hidden']) == \
+        {'a/b': [1], '../x': [2], '.hidden': [3]}
+
+def test_export_parses_one_recipe_at_a_time(library_path, tmp_path, monkeypatch):
+    """Tests that the export never parses the whole library at once.
+    """
+    bsm = BeersmithInterface()
+    parsed_sizes = []
+    parse_xml = bsm.parse_xml
+    def spy_parse_xml(xml_string):
+        parsed_sizes.append(len(xml_string))
+        return parse_xml(xml_string)
+    monkeypatch.setattr(bsm, 'parse_xml', spy_parse_xml)
+
+    export_bsmx('Recipe.bsmx', library_path, tmp_path, bsm=bsm, formats=('ndjson',))
+
+    file_size = os.path.getsize(os.path.join(library_path, 'Recipe.bsmx'))
+    assert len(parsed_sizes) == EXPORT_SPEC.recipe_count
+    assert max(parsed_sizes) < 2 * file_size / EXPORT_SPEC.recipe_count
+
+def test_export_error_writes_partial_chunk(library_path, tmp_path):
+    """Tests that the rows buffered before an error are written.
+    """
+    def failing_recipes():
+        yield from BeersmithInterface().iter_bsmx('Recipe.bsmx', library_path, chunked=True)
+        raise RuntimeError('source failed')
+
+    with pytest.raises(RuntimeError):
+        export_recipes(failing_recipes(), tmp_path, chunk_rows=100)
+
+    columns = read_columns(tmp_path / 'columnar', 'recipes', ['name'])
+    assert len(columns['name']) == EXPORT_SPEC.recipe_count
+    with open(tmp_path / 'ndjson' / 'recipes-00000.ndjson', 'r', encoding='UTF-8') as ndjson_file:
+        assert len(ndjson_file.readlines()) == EXPORT_SPEC.recipe_count
+
+def test_export_unsupported_compression(tmp_path):
+    """Tests rejecting an unknown compression.
+    """
+    with pytest.raises(ValueError):
+        export_recipes([], tmp_path, compression='zip')
+
+def test_cli_export(library_path, tmp_path, capsys):
+    """Tests the export command.
+    """
+    argv = ['export', 'Recipe.bsmx', '--path', library_path, '--out', str(tmp_path)]
+
+    assert main(argv) == 0
+    assert f'recipes={EXPORT_SPEC.recipe_count}' in capsys.readouterr().out
@@ -0,0 +1,145 @@
+"""Tests the delta-compressed version history of recipes.
+"""
+from copy import deepcopy
+from datetime import datetime, timedelta, timezone
+import os
+
+import pytest
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct.corpus import CorpusSpec, write_archive, write_library
+from beersmith_direct.history import RecipeHistory, diff, patch
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipes import Recipes
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+HISTORY_SPEC = CorpusSpec(recipe_count=12, archive_actions=40)
+
+START = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(name='corpus_path', scope='module')
+def fixture_corpus_path(tmp_path_factory):
+    """Pytest fixture to write and return the path of a synthetic corpus.
+    """
+    path = tmp_path_factory.mktemp('history')
+    write_library(HISTORY_SPEC, path)
+    write_archive(HISTORY_SPEC, path)
+
+    return str(path)
+
+@pytest.fixture(name='recipe')
+def fixture_recipe():
+    """Pytest fixture to return a parsed recipe.
+    """
+    return BeersmithInterface().read_bsmx('bsm-one-recipe.bsmx', TESTS_PATH)[0]
+
+def test_diff_patch(recipe):
+    """Tests that a patched version equals the new version and shares the rest.
+    """
+    new = deepcopy(recipe)
+    new['ingredients'][0]['amount'] = 99.0
+    new['ingredients'].append({'name': 'Extra'})
+    new['notes'] = 'changed'
+    del new['carb']
+
+    delta = diff(recipe, new)
+    assert len(delta) == 4
+    assert patch(recipe, delta) == new
+    assert patch(recipe, delta)['mash'] is recipe['mash']
+
+    shorter = deepcopy(recipe)
+    del shorter['ingredients'][1:]
+    assert patch(recipe, diff(recipe, shorter)) == shorter
+    assert not diff(recipe, deepcopy(recipe))
+
+def test_snapshots_and_reconstruction(recipe):
+    """Tests rebuilding every version from the snapshots and deltas.
+    """
+    history = RecipeHistory(MemoryDatabase(), 'test', snapshot_interval=3)
+    versions = []
+    for num in range(7):
+        version = deepcopy(recipe)
+        version['notes'] = f'version {num}'
+        versions.append(version)
+        history.record([('upsert', 'Recipe', version, START + timedelta(days=num))])
+    history.record([('delete', 'Recipe', None, START + timedelta(days=7))])
+    assert history.flush() == 8
+
+    kinds = [version['kind'] for version in history.versions('Recipe')]
+    assert kinds == ['snapshot', 'delta', 'delta', 'snapshot', 'delta', 'delta',
+                     'snapshot', 'delete']
+
+    for num, version in enumerate(versions):
+        assert history.recipe_at('Recipe', START + timedelta(days=num, hours=1)) == version
+    assert history.recipe_at('Recipe', START - timedelta(days=1)) is None
+    assert history.recipe_at('Recipe') is None
+
+def test_heads_reloaded(recipe):
+    """Tests that a new history object continues from the stored versions.
+    """
+    mdb = MemoryDatabase()
+    history = RecipeHistory(mdb, 'test', snapshot_interval=3)
+    history.record([('upsert', 'Recipe', recipe, START)])
+    history.flush()
+
+    changed = deepcopy(recipe)
+    changed['notes'] = 'changed'
+    history = RecipeHistory(mdb, 'test', snapshot_interval=3)
+    assert history.record([
+        ('upsert', 'Recipe', recipe, START),
+        ('upsert', 'Recipe', changed, START + timedelta(days=1)),
+    ]) == 1
+    history.flush()
+
+    assert [version['kind'] for version in history.versions('Recipe')] == ['snapshot', 'delta']
+    assert history.recipe_at('Recipe') == changed
+
+def test_archive_history(corpus_path):
+    """Tests the history of a sync, at the dates of the archive actions.
+    """
+    mdb = MemoryDatabase()
+    recipes = Recipes(collection_name='test_history', mdb=mdb, history=True, batch_size=7)
+    recipes.stats.enabled = True
+    recipes.rebuild('Recipe.bsmx', corpus_path)
+    recipes.update_recipes_from_archive('Archive.bsmx', corpus_path)
+
+    for recipe in recipes.find_recipes():
+        assert recipes.recipe_at(recipe['_id']) == recipe
+
+    bsm = BeersmithInterface()
+    edit_count = 0
+    for action in bsm.read_bsmx('Archive.bsmx', corpus_path):
+        action_date = datetime.fromisoformat(action['date']).astimezone()
+        if action['action'] == 'Edit':
+            edited = bsm.read_bsmx(action['file'], corpus_path)[0]
+            assert recipes.recipe_at(action['name'], action_date) == edited
+            edit_count += 1
+        elif action['action'] == 'Delete/Cut':
+            assert recipes.recipe_at(action['name'], action_date) is None
+
+    assert edit_count
+    assert recipes.stats.counters['history_written'] > HISTORY_SPEC.recipe_count
+    assert mdb.test_history_history.op_counts['bulk_write'] == \
+        recipes.stats.counters['bulk_writes']
+
+def test_normalized_history_after_reset(recipe):
+    """Tests that the versions of the normalized history stay readable after
+    a reset.
+    """
+    recipes = Recipes(collection_name='test_history_normalized', mdb=MemoryDatabase(),
+                      normalized=True, history=True)
+    first = deepcopy(recipe)
+    first['style']['name'] = 'First Style'
+    recipes.update_recipe(first)
+    between = datetime.now().astimezone()
+    second = deepcopy(recipe)
+    second['style']['name'] = 'Second Style'
+    recipes.update_recipe(second)
+
+    recipes.reset()
+    recipes.update_recipe(second)
+
+    assert recipes.recipe_at(recipe['_id'], between) == first
+    assert recipes.recipe_at(recipe['_id']) == second
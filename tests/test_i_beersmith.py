@@ -1,6 +1,12 @@
 """Tests initializing Beersmith interface.
 """
+import os
+import sys
+
 from beersmith_direct import BeersmithInterface
+from beersmith_direct.corpus import CorpusSpec, write_library
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
 
 
 def test_init_beersmith():
@@ -9,3 +15,38 @@ def test_init_beersmith():
     bsm = BeersmithInterface()
 
     assert bsm
+
+def test_nested_folders():
+    """Tests that the recipes of nested folders get the path of their folder.
+    """
+    bsm = BeersmithInterface()
+    recipe_list = bsm.read_bsmx('bsm-nested-folders.bsmx', TESTS_PATH)
+
+    assert [recipe['folder_name'] for recipe in recipe_list] == ['/active/', '/active/nested/']
+    assert list(bsm.iter_bsmx('bsm-nested-folders.bsmx', TESTS_PATH, chunked=True)) == recipe_list
+
+def test_folder_tree(tmp_path):
+    """Tests reading a library with three levels of folders.
+    """
+    spec = CorpusSpec(recipe_count=8, folder_depth=3)
+    write_library(spec, tmp_path)
+    recipe_list = BeersmithInterface().read_bsmx('Recipe.bsmx', str(tmp_path))
+
+    assert len(recipe_list) == spec.recipe_count
+    assert recipe_list[-1]['folder_name'] == '/folder-1-2/folder-2-2/folder-3-2/'
+
+def test_walk_folders_depth():
+    """Tests walking a folder tree deeper than the recursion limit.
+    """
+    depth = sys.getrecursionlimit() * 2
+    data = {'recipe': {'name': 'leaf'}}
+    for level in reversed(range(depth)):
+        data = {'table': [{'xname': 'Folder', 'name': level, 'data': data}], 'recipe': None}
+
+    bsm = BeersmithInterface()
+    bsm.process_recipe = lambda props, folder_name: (props['name'], folder_name)
+    (name, folder_name), = bsm.walk_folders(data, (), root_name='root')
+
+    assert name == 'leaf'
+    assert folder_name.count('/') == depth - 1
+    assert folder_name.startswith('0/1/2/')
@@ -0,0 +1,79 @@
+"""Tests the managed indexes of the recipe collections.
+"""
+from beersmith_direct.cli import main
+from beersmith_direct.corpus import CorpusSpec, write_library
+from beersmith_direct.index_manager import RECIPE_INDEXES, IndexManager
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipes import Recipes
+
+INDEX_SPEC = CorpusSpec(recipe_count=6)
+
+
+def test_ensure_is_idempotent():
+    """Tests that only the missing or changed indexes are created.
+    """
+    collection = MemoryDatabase().read_collection('test_indexes')
+    indexes = IndexManager()
+    indexes.manage(collection, RECIPE_INDEXES)
+
+    assert len(indexes.ensure()) == len(RECIPE_INDEXES)
+    assert indexes.ensure() == []
+
+    collection.drop_index('style_name')
+    collection.create_index([('style.name', -1)], name='folder_name')
+    assert indexes.ensure() == ['test_indexes.folder_name', 'test_indexes.style_name']
+    assert collection.index_information()['folder_name']['key'] == [('folder_name', 1)]
+
+def test_indexes_after_rebuild_load(tmp_path):
+    """Tests that a rebuild loads the recipes before creating the indexes.
+    """
+    write_library(INDEX_SPEC, tmp_path)
+    recipes = Recipes(collection_name='test_indexes_rebuild', mdb=MemoryDatabase(),
+                      batch_size=2, history=True)
+    assert set(recipes.collection.index_information()) == \
+        {'_id_', *(name for name, _ in RECIPE_INDEXES)}
+    assert 'recipe_id_seq' in recipes.history.collection.index_information()
+
+    indexes_during_load = []
+    recipes.add_write_hook(
+        lambda *_: indexes_during_load.append(set(recipes.collection.index_information()))
+    )
+    stats = recipes.rebuild('Recipe.bsmx', str(tmp_path))
+
+    assert indexes_during_load[0] == {'_id_'}
+    assert len(recipes.collection.index_information()) == 1 + len(RECIPE_INDEXES)
+    assert stats.counters['indexes_created'] == len(RECIPE_INDEXES)
+
+def test_usage_report(capsys):
+    """Tests the usage report of the indexes.
+    """
+    mdb = MemoryDatabase()
+    recipes = Recipes(collection_name='test_indexes_usage', mdb=mdb, manage_indexes=False)
+    assert recipes.collection.index_information().keys() == {'_id_'}
+
+    assert main(['indexes', '--collection', 'test_indexes_usage'], mdb=mdb) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == 'test_indexes_usage._id_: 0 ops'
+    assert 'test_indexes_usage.folder_name: 0 ops (unused)' in lines
+    assert len(lines) == 1 + len(RECIPE_INDEXES)
+
+def test_ensure_once_per_collection():
+    """Tests that the connectors of a collection check its indexes once.
+    """
+    mdb = MemoryDatabase()
+    recipes = Recipes(collection_name='test_indexes_once', mdb=mdb)
+    collection = recipes.collection
+    collection.drop_index('style_name')
+
+    # a later connector of the collection does not list the indexes again
+    Recipes(collection_name='test_indexes_once', mdb=mdb)
+    assert 'style_name' not in collection.index_information()
+
+    # the indexes of another database are checked
+    other_recipes = Recipes(collection_name='test_indexes_once', mdb=MemoryDatabase())
+    assert 'style_name' in other_recipes.collection.index_information()
+
+    # a reset forgets the dropped indexes
+    recipes.reset()
+    Recipes(collection_name='test_indexes_once', mdb=mdb)
+    assert set(collection.index_information()) == {'_id_', *(name for name, _ in RECIPE_INDEXES)}
@@ -1,8 +1,82 @@
 """Test functions for Squaredown import.
 """
+import subprocess
+import sys
+
 import beersmith_direct
 
+# import-time regression budgets, cumulative microseconds of a fresh import
+IMPORT_BUDGET_PACKAGE_US = 50_000
+IMPORT_BUDGET_PARSER_US = 100_000
+
+# dependencies that must only be loaded on first use
+HEAVY_MODULES = [
+    'aracnid_config',
+    'aracnid_logger',
+    'aracnid_utils',
+    'bs4',
+    'dateutil',
+    'hjson',
+    'i_mongodb',
+    'pymongo',
+    'xmltodict',
+]
+
+
+def import_times(module_name):
+    """Helper function to measure the import of a module in a new interpreter.
+
+    Args:
+        module_name: Name of the module to import.
+
+    Returns:
+        Dictionary of cumulative import times in microseconds, keyed by
+        imported module name.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        capture_output=True, check=True, text=True
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+
+    return times
+
 def test_version():
     """Tests that Squaredown was imported successfully.
     """
     assert beersmith_direct.__version__
+
+def test_lazy_attributes():
+    """Tests that the public classes are available from the package.
+    """
+    assert 'Recipes' in dir(beersmith_direct)
+    assert beersmith_direct.BeersmithInterface.__name__ == 'BeersmithInterface'
+
+def test_import_skips_heavy_modules():
+    """Tests that importing the package does not load heavy dependencies.
+    """
+    times = import_times('beersmith_direct')
+
+    assert 'beersmith_direct' in times
+    assert not [name for name in times if name.split('.')[0] in HEAVY_MODULES]
+
+def test_import_time_budget():
+    """Tests the package import time against the regression budget.
+    """
+    times = import_times('beersmith_direct')
+
+    assert times['beersmith_direct'] < IMPORT_BUDGET_PACKAGE_US
+
+def test_import_time_budget_parser():
+    """Tests the Beersmith interface import time against the regression budget.
+    """
+    times = import_times('beersmith_direct.i_beersmith')
+
+    assert times['beersmith_direct.i_beersmith'] < IMPORT_BUDGET_PARSER_US
+    assert 'bs4' not in times
@@ -0,0 +1,94 @@
+"""Tests the concurrent sync of several libraries.
+"""
+import json
+
+import pytest
+
+from beersmith_direct.cli import main
+from beersmith_direct.corpus import ARCHIVE_START, CorpusSpec, write_archive, write_library
+from beersmith_direct.libraries import Library, LibrarySync, read_libraries
+from beersmith_direct.memory import MemoryDatabase
+
+LIBRARY_SPECS = {
+    'brewer_a': CorpusSpec(recipe_count=6, archive_actions=8, seed=1),
+    'brewer_b': CorpusSpec(recipe_count=9, archive_actions=5, seed=2),
+}
+
+
+@pytest.fixture(name='libraries', scope='module')
+def fixture_libraries(tmp_path_factory):
+    """Pytest fixture to write the libraries and return their definitions.
+    """
+    libraries = []
+    for name, spec in LIBRARY_SPECS.items():
+        path = tmp_path_factory.mktemp(name)
+        write_library(spec, path)
+        write_archive(spec, path)
+        libraries.append({
+            'path': str(path), 'collection': f'test_{name}', 'config_name': f'test_config_{name}',
+        })
+
+    return libraries
+
+def test_sync_libraries(libraries):
+    """Tests that the libraries are synced into their own collections.
+    """
+    mdb = MemoryDatabase()
+    library_sync = LibrarySync(libraries, mdb=mdb, library_workers=2, batch_size=4)
+
+    stats = library_sync.run(rebuild=True)
+    assert stats.counters['libraries_synced'] == 2
+    assert stats.counters['recipes_parsed'] == sum(
+        spec.recipe_count for spec in LIBRARY_SPECS.values()
+    )
+    for name, spec in LIBRARY_SPECS.items():
+        assert mdb.read_collection(f'test_{name}').count_documents({}) == spec.recipe_count
+
+    # sync the archive actions since the start of the archive
+    for library in library_sync.libraries:
+        library_sync.connector(library).props.last_updated = ARCHIVE_START.astimezone()
+    stats = library_sync.run()
+    assert not stats.errors
+    assert stats.counters['archive_actions_applied'] == sum(
+        spec.archive_actions for spec in LIBRARY_SPECS.values()
+    )
+    assert set(library_sync.results) == {'test_brewer_a', 'test_brewer_b'}
+    assert library_sync.report().splitlines()[-1].startswith('total: ')
+
+    # each library has its own checkpoint
+    last_ids = {
+        library.name: library_sync.connector(library).props.last_id
+        for library in library_sync.libraries
+    }
+    assert last_ids['test_brewer_a'] != last_ids['test_brewer_b']
+
+def test_failed_library(libraries, tmp_path):
+    """Tests that a failed library does not stop the others.
+    """
+    (tmp_path / 'Recipe.bsmx').write_text('<Selections><Recipe></Recipe></Selections>')
+    library_sync = LibrarySync(
+        [libraries[0], Library(str(tmp_path), 'test_failed')], mdb=MemoryDatabase()
+    )
+
+    stats = library_sync.run(rebuild=True)
+    assert stats.counters == {**stats.counters, 'libraries_synced': 1, 'libraries_failed': 1}
+    assert library_sync.results['test_failed'].errors == {'library': 1}
+
+def test_duplicate_libraries(libraries):
+    """Tests that two libraries cannot share a collection.
+    """
+    with pytest.raises(ValueError):
+        LibrarySync([libraries[0], dict(libraries[0], name='other')], mdb=MemoryDatabase())
+
+def test_cli_libraries(libraries, tmp_path, capsys):
+    """Tests the sync of the libraries of a definitions file.
+    """
+    filepath = tmp_path / 'libraries.json'
+    filepath.write_text(json.dumps(libraries))
+    assert [library.path for library in read_libraries(filepath)] == \
+        [library['path'] for library in libraries]
+
+    mdb = MemoryDatabase()
+    assert main(['rebuild', '--libraries', str(filepath), '--library-workers', '2'], mdb=mdb) == 0
+    assert capsys.readouterr().out.count('\n') == 3
+    assert mdb.test_brewer_b.count_documents({}) == LIBRARY_SPECS['brewer_b'].recipe_count
@@ -0,0 +1,139 @@
+"""Tests the compact recipe object model.
+"""
+import gc
+import os
+import pickle
+import sys
+import tracemalloc
+
+import pytest
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct import recipes as recipes_module
+from beersmith_direct.corpus import CorpusSpec, write_library
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.model import Ingredient, MashStep, Recipe, Style, to_model
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+
+@pytest.fixture(name='recipe_dict')
+def fixture_recipe_dict():
+    """Pytest fixture to return a normalized recipe dictionary.
+    """
+    return BeersmithInterface().read_bsmx('bsm-two-recipes.bsmx', TESTS_PATH)[0]
+
+def test_round_trip(recipe_dict):
+    """Tests converting to the model and back.
+    """
+    recipe = Recipe.from_dict(recipe_dict)
+
+    assert recipe.to_dict() == recipe_dict
+    assert isinstance(recipe.ingredients, tuple)
+    assert isinstance(recipe.ingredients[0], Ingredient)
+    assert isinstance(recipe.mash_steps[0], MashStep)
+    assert isinstance(recipe.style, Style)
+
+def test_mapping_access(recipe_dict):
+    """Tests the attribute and mapping access of the records.
+    """
+    recipe = Recipe.from_dict(recipe_dict)
+
+    assert recipe.name == recipe['name'] == recipe_dict['name']
+    assert recipe.get('style')['name'] == recipe.style.name
+    assert recipe.get('missing', 1) == 1
+    assert list(recipe) == list(recipe_dict)
+    with pytest.raises(KeyError):
+        recipe['missing']  # pylint: disable=pointless-statement
+
+def test_dictionary_interface(recipe_dict):
+    """Tests the Mapping methods and the equality with dictionaries.
+    """
+    recipe = Recipe.from_dict(recipe_dict)
+    ingredient = recipe.ingredients[0]
+
+    assert list(ingredient.values()) == list(recipe_dict['ingredients'][0].values())
+    assert dict(ingredient.items()) == recipe_dict['ingredients'][0]
+    assert recipe == recipe_dict
+    assert recipe_dict == recipe
+    assert recipe == Recipe.from_dict(recipe_dict)
+    assert ingredient != recipe.ingredients[1]
+    assert recipe != dict(recipe_dict, name='other')
+
+def test_frozen_and_slotted(recipe_dict):
+    """Tests that records are immutable and have no instance dictionary.
+    """
+    ingredient = Recipe.from_dict(recipe_dict).ingredients[0]
+
+    assert not hasattr(ingredient, '__dict__')
+    with pytest.raises(AttributeError):
+        ingredient._values = ()  # pylint: disable=protected-access
+
+def test_shared_shapes_and_interning(recipe_dict):
+    """Tests that key tuples and enum-like values are shared.
+    """
+    recipe = Recipe.from_dict(recipe_dict)
+    hops = [ingredient for ingredient in recipe.ingredients
+            if ingredient.ingredient_type == 'hops']
+
+    assert hops[0].shape is hops[1].shape
+    assert hops[0].subtype is sys.intern('pellet hops')
+
+def test_zero_copy_values(recipe_dict):
+    """Tests that the scalar values are shared with the source.
+    """
+    recipe = Recipe.from_dict(recipe_dict)
+
+    assert recipe.ingredients[0]['notes'] is recipe_dict['ingredients'][0]['notes']
+
+def test_pickle(recipe_dict):
+    """Tests that unpickled records share the interned shapes.
+    """
+    recipe = Recipe.from_dict(recipe_dict)
+    loaded = pickle.loads(pickle.dumps(recipe))
+
+    assert loaded == recipe
+    assert loaded.shape is recipe.shape
+
+def test_read_bsmx_model():
+    """Tests reading recipes as the model.
+    """
+    bsm = BeersmithInterface()
+    recipe_list = bsm.read_bsmx('bsm-two-folders.bsmx', TESTS_PATH, as_model=True)
+
+    assert all(isinstance(recipe, Recipe) for recipe in recipe_list)
+    assert [recipe.to_dict() for recipe in recipe_list] == \
+        bsm.read_bsmx('bsm-two-folders.bsmx', TESTS_PATH)
+    assert list(bsm.iter_bsmx('bsm-two-folders.bsmx', TESTS_PATH, as_model=True)) == recipe_list
+
+def test_recipes_of_the_model(recipe_dict):
+    """Tests storing a recipe record, imported from the recipes module.
+    """
+    assert recipes_module.Recipe is Recipe
+
+    store = recipes_module.Recipes(collection_name='test_model', mdb=MemoryDatabase())
+    store.queue_recipe(recipes_module.Recipe.from_dict(recipe_dict))
+    store.flush_writes()
+    assert store.get_recipe(recipe_dict['name'])['name'] == recipe_dict['name']
+
+def test_model_memory(tmp_path):
+    """Tests that a library held as the model uses less memory.
+    """
+    write_library(CorpusSpec(recipe_count=100, ingredients_per_recipe=15), tmp_path)
+    recipe_dicts = BeersmithInterface().read_bsmx('Recipe.bsmx', str(tmp_path))
+
+    def traced_size(build):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            value = build()
+            gc.collect()
+            return tracemalloc.get_traced_memory()[0], value
+        finally:
+            tracemalloc.stop()
+
+    dict_size, copies = traced_size(lambda: pickle.loads(pickle.dumps(recipe_dicts)))
+    model_size, recipes = traced_size(lambda: to_model(pickle.loads(pickle.dumps(recipe_dicts))))
+
+    assert len(copies) == len(recipes)
+    assert model_size < 0.7 * dict_size
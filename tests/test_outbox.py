@@ -0,0 +1,176 @@
+"""Tests the change feed of the recipe writes.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from beersmith_direct.corpus import CorpusSpec, write_archive, write_library
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.outbox import ChangeOutbox
+from beersmith_direct.recipes import Recipes
+from beersmith_direct.references import content_id
+from beersmith_direct.sqlite import SQLiteDatabase
+
+OUTBOX_SPEC = CorpusSpec(recipe_count=8, archive_actions=30)
+
+
+@pytest.fixture(name='corpus_path', scope='module')
+def fixture_corpus_path(tmp_path_factory):
+    """Pytest fixture to write and return the path of a synthetic corpus.
+    """
+    path = tmp_path_factory.mktemp('outbox')
+    write_library(OUTBOX_SPEC, path)
+    write_archive(OUTBOX_SPEC, path)
+
+    return str(path)
+
+def test_changes_of_a_sync(corpus_path):
+    """Tests that the consumers read every write of a rebuild and a replay.
+    """
+    mdb = MemoryDatabase()
+    recipes = Recipes(collection_name='test_outbox', mdb=mdb, batch_size=5, outbox=True)
+    recipes.stats.enabled = True
+    recipes.rebuild('Recipe.bsmx', corpus_path)
+
+    changes, token = recipes.changes_since()
+    assert changes[0]['action'] == 'reset'
+    assert [change['recipe_id'] for change in changes[1:]] == \
+        [recipe['_id'] for recipe in recipes.bsm.read_bsmx('Recipe.bsmx', corpus_path)]
+    for change in changes[1:]:
+        assert change['digest'] == content_id(recipes.get_recipe(change['recipe_id']))
+
+    # the replay changes are read from the token, with the archive dates
+    recipes.update_recipes_from_archive('Archive.bsmx', corpus_path)
+    changes, token = recipes.changes_since(token)
+    archive_list = recipes.bsm.read_bsmx('Archive.bsmx', corpus_path)
+    assert len(changes) == len(archive_list)
+    assert recipes.stats.counters['changes_written'] == 1 + OUTBOX_SPEC.recipe_count + len(changes)
+    for change in changes:
+        action = 'delete' if change['digest'] is None else 'upsert'
+        assert change['action'] == action
+    assert {change['timestamp'].year for change in changes} == {2021}
+
+    # the changes are applied in order to the state known by the consumer
+    state = {}
+    for change in recipes.changes_since(limit=1000)[0]:
+        if change['action'] == 'reset':
+            state = {}
+        elif change['action'] == 'delete':
+            state.pop(change['recipe_id'])
+        else:
+            state[change['recipe_id']] = change['digest']
+    assert state == {recipe['_id']: content_id(recipe) for recipe in recipes.find_recipes()}
+
+    assert recipes.changes_since(token) == ([], token)
+
+def test_token_and_prune():
+    """Tests the tokens of a new outbox object and the pruning of changes.
+    """
+    mdb = MemoryDatabase()
+    recipes = Recipes(collection_name='test_outbox_token', mdb=mdb, outbox=True)
+    recipes.update_recipe({'name': 'Pale Ale', 'og': 1.05})
+    recipes.delete_recipe('Pale Ale')
+
+    recipes = Recipes(collection_name='test_outbox_token', mdb=mdb, outbox=True)
+    recipes.update_recipe({'name': 'Stout', 'og': 1.06})
+    changes, token = recipes.changes_since(1, limit=1)
+    assert (changes[0]['recipe_id'], changes[0]['action'], token) == ('Pale Ale', 'delete', 2)
+
+    assert recipes.outbox.prune(token) == 2
+    assert [change['_id'] for change in recipes.changes_since()[0]] == [3]
+
+def test_outbox_disabled():
+    """Tests that the change feed is off unless enabled.
+    """
+    recipes = Recipes(collection_name='test_outbox_off', mdb=MemoryDatabase())
+    assert recipes.outbox is None
+    with pytest.raises(ValueError):
+        recipes.changes_since()
+
+def test_prune_then_write():
+    """Tests that the identifiers are not reused after a prune of all changes.
+    """
+    mdb = MemoryDatabase()
+    outbox = ChangeOutbox(mdb, 'test_outbox_prune')
+    outbox.record([('upsert', 'a', None, None), ('upsert', 'b', None, None)])
+    outbox.flush()
+    assert outbox.prune(2) == 2
+
+    outbox = ChangeOutbox(mdb, 'test_outbox_prune')
+    outbox.record([('upsert', 'c', None, None)])
+    outbox.flush()
+    changes, token = outbox.changes_since(2)
+    assert ([change['recipe_id'] for change in changes], token) == (['c'], 3)
+
+    # a collision with an existing change fails instead of replacing it
+    outbox.collection.insert_one({'_id': 4, 'recipe_id': 'x'})
+    outbox.record([('upsert', 'd', None, None)])
+    with pytest.raises(KeyError):
+        outbox.flush()
+    assert outbox.collection.find_one({'_id': 4})['recipe_id'] == 'x'
+
+def test_concurrent_writers(tmp_path):
+    """Tests that the writers of an outbox never overwrite each other.
+    """
+    mdb = MemoryDatabase()
+    first = ChangeOutbox(mdb, 'test_outbox_writers')
+    second = ChangeOutbox(mdb, 'test_outbox_writers')
+    first.record([('upsert', 'a', None, None)])
+    first.flush()
+    second.record([('upsert', 'b', None, None)])
+    second.flush()
+    first.record([('upsert', 'c', None, None)])
+    first.flush()
+    assert [(change['_id'], change['recipe_id']) for change in first.changes_since()[0]] == \
+        [(1, 'a'), (2, 'b'), (3, 'c')]
+
+    # threads writing through a shared SQLite database
+    mdb = SQLiteDatabase(tmp_path / 'outbox.db')
+
+    def write_changes(writer):
+        outbox = ChangeOutbox(mdb, 'test_outbox_threads')
+        for num in range(20):
+            outbox.record([('upsert', f'{writer}-{num}', None, None)])
+            outbox.flush()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(write_changes, range(4)))
+
+    changes = ChangeOutbox(mdb, 'test_outbox_threads').changes_since()[0]
+    assert [change['_id'] for change in changes] == list(range(1, 81))
+    assert len({change['recipe_id'] for change in changes}) == 80
+
+def test_interleaved_writers(monkeypatch):
+    """Tests that a consumer does not skip a change written after a change
+    with a larger identifier, and skips a gap once it is settled.
+    """
+    mdb = MemoryDatabase()
+    first = ChangeOutbox(mdb, 'test_outbox_interleaved')
+    second = ChangeOutbox(mdb, 'test_outbox_interleaved')
+    held = []
+    monkeypatch.setattr(first, 'collection', SimpleNamespace(
+        find=first.collection.find, bulk_write=lambda requests, ordered: held.append(requests)
+    ))
+
+    # the first writer allocates first and writes last
+    first.record([('upsert', 'a', None, None)])
+    first.flush()
+    second.record([('upsert', 'b', None, None)])
+    second.flush()
+    assert second.changes_since() == ([], 0)
+
+    second.collection.bulk_write(held.pop(), ordered=False)
+    changes, token = second.changes_since()
+    assert ([change['recipe_id'] for change in changes], token) == (['a', 'b'], 2)
+
+    # the first writer fails after its allocation
+    first.record([('upsert', 'c', None, None)])
+    first.flush()
+    second.record([('upsert', 'd', None, None)])
+    second.flush()
+    assert second.changes_since(token) == ([], token)
+
+    second.settle_seconds = 0
+    changes, token = second.changes_since(token)
+    assert ([change['recipe_id'] for change in changes], token) == (['d'], 4)
@@ -0,0 +1,74 @@
+"""Tests the profiling mode.
+"""
+import os
+import threading
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.profiling import (
+    Profiler, ProfileSettings, active_profiler, profile_settings
+)
+from beersmith_direct.recipes import Recipes
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+
+def test_profile_settings_env(monkeypatch, tmp_path):
+    """Tests reading the profile settings from the environment.
+    """
+    monkeypatch.setenv('BEERSMITH_PROFILE', 'on')
+    monkeypatch.setenv('BEERSMITH_PROFILE_DIR', str(tmp_path))
+    monkeypatch.setenv('BEERSMITH_PROFILE_TOP', '5')
+    settings = profile_settings()
+
+    assert settings.enabled
+    assert settings.directory == str(tmp_path)
+    assert settings.tracemalloc_top == 5
+    assert not profile_settings(False).enabled
+
+def test_profile_disabled():
+    """Tests that nothing is profiled by default.
+    """
+    bsm = BeersmithInterface(profile=False)
+    bsm.read_bsmx('bsm-one-recipe.bsmx', TESTS_PATH)
+
+    assert not hasattr(bsm, 'last_profile')
+
+def test_profile_read_bsmx(tmp_path):
+    """Tests profiling read_bsmx with cProfile and tracemalloc.
+    """
+    settings = ProfileSettings(enabled=True, directory=str(tmp_path), tracemalloc_top=5)
+    bsm = BeersmithInterface(profile=settings)
+    recipe_list = bsm.read_bsmx('bsm-one-recipe.bsmx', TESTS_PATH)
+
+    profiler = bsm.last_profile
+    assert len(recipe_list) == 1
+    assert os.path.exists(profiler.profile_path)
+    assert os.path.exists(profiler.alloc_path)
+    assert len(profiler.top_allocations) == 5
+    assert 'process_recipe' in [func['function'] for func in profiler.summary]
+    assert {func['file'] for func in profiler.summary} <= {'i_beersmith.py', 'recipes.py'}
+
+def test_profile_rebuild_nested(tmp_path):
+    """Tests that nested profiled calls write one profile.
+    """
+    settings = ProfileSettings(enabled=True, directory=str(tmp_path))
+    recipes = Recipes(collection_name='test_profile', mdb=MemoryDatabase(), profile=settings)
+    recipes.rebuild('bsm-one-recipe.bsmx', TESTS_PATH)
+
+    assert recipes.last_profile.name == 'rebuild'
+    assert len(list(tmp_path.glob('*.prof'))) == 1
+    assert 'update_recipes' in [func['function'] for func in recipes.last_profile.summary]
+
+def test_active_profiler_per_thread():
+    """Tests that a running profiler is not seen by the other threads.
+    """
+    seen = []
+    with Profiler('outer', ProfileSettings(enabled=True)) as profiler:
+        assert active_profiler() is profiler
+        thread = threading.Thread(target=lambda: seen.append(active_profiler()))
+        thread.start()
+        thread.join()
+
+    assert seen == [None]
+    assert active_profiler() is None
@@ -0,0 +1,96 @@
+"""Tests the inverted recipe index.
+"""
+import os
+
+import pytest
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct.corpus import CorpusSpec, write_archive, write_library
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipe_index import RecipeIndex
+from beersmith_direct.recipes import Recipes
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+
+@pytest.fixture(name='index')
+def fixture_index():
+    """Pytest fixture to return the index of the two folders library.
+    """
+    recipe_list = BeersmithInterface().read_bsmx('bsm-two-folders.bsmx', TESTS_PATH)
+
+    return RecipeIndex.from_recipes(recipe_list)
+
+def test_find(index):
+    """Tests intersection queries.
+    """
+    assert len(index.find(ingredient='Cascade Hops', subtype='pellet hops')) == 2
+    assert len(index.find(ingredient='cascade hops', folder='/folder1/')) == 1
+    assert not index.find(ingredient='Citra', style='American Amber Ale')
+
+def test_find_any(index):
+    """Tests union queries.
+    """
+    assert len(index.find_any(folder='/folder1/', style='Unknown')) == 1
+    assert len(index.find(folder=['/folder1/', '/folder2/'])) == 2
+
+def test_find_ingredient(index):
+    """Tests that the values of find_ingredient match one ingredient.
+    """
+    assert len(index.find_ingredient(name='Cascade Hops', subtype='pellet hops')) == 2
+    assert not index.find_ingredient(name='Cascade Hops', subtype='dry yeast')
+    assert len(index.find(ingredient='Cascade Hops', subtype='dry yeast')) == 2
+
+def test_in_folder():
+    """Tests folder queries with subfolders.
+    """
+    index = RecipeIndex()
+    index.add({'name': 'a', 'folder_name': '/Production/'})
+    index.add({'name': 'b', 'folder_name': '/Production/IPA/'})
+    index.add({'name': 'c', 'folder_name': '/Trials/'})
+
+    assert index.in_folder('/Production/') == {'a', 'b'}
+    assert index.in_folder('/Production/', recursive=False) == {'a'}
+    assert index.in_folder('/production') == {'a', 'b'}
+    assert index.in_folder('/Production', recursive=False) == {'a'}
+    assert not index.in_folder('/Prod')
+    with pytest.raises(ValueError):
+        index.in_folder(None)
+
+def test_incremental_updates(index):
+    """Tests replacing and removing recipes.
+    """
+    recipe_id = next(iter(index.get('folder', '/folder1/')))
+    index.add({'name': recipe_id, 'folder_name': '/folder3/'})
+
+    assert index.get('folder', '/folder3/') == {recipe_id}
+    assert 'folder1' not in str(index.values('folder'))
+
+    index.remove(recipe_id)
+    assert recipe_id not in index
+    assert len(index.get('ingredient', 'Cascade Hops')) == 1
+
+def test_save_load(index, tmp_path):
+    """Tests the warm start from disk.
+    """
+    filepath = tmp_path / 'recipes.index'
+    index.save(filepath)
+    loaded = RecipeIndex.load(filepath)
+
+    assert loaded.entries == index.entries
+    assert loaded.find(ingredient='Cascade Hops') == index.find(ingredient='Cascade Hops')
+
+def test_sync_write_hook(tmp_path):
+    """Tests that the index follows the writes of a sync.
+    """
+    spec = CorpusSpec(recipe_count=12, archive_actions=30)
+    write_library(spec, tmp_path)
+    write_archive(spec, tmp_path)
+
+    recipes = Recipes(collection_name='test_recipe_index', mdb=MemoryDatabase(), batch_size=5)
+    index = RecipeIndex()
+    recipes.add_write_hook(index.apply)
+    recipes.rebuild('Recipe.bsmx', str(tmp_path))
+    recipes.update_recipes_from_archive('Archive.bsmx', str(tmp_path))
+
+    assert index.entries == RecipeIndex.from_collection(recipes.collection).entries
@@ -61,8 +61,6 @@ def test_read_bsmx_two_folders(recipes):
 
 def test_read_bsmx_nested_folders(recipes):
     """Tests reading BSMX file with nested folders.
-
-    Not currently working.
     """
     filename = 'bsm-nested-folders.bsmx'
     path = os.path.join(os.getcwd(), 'tests')
@@ -71,6 +69,8 @@ def test_read_bsmx_nested_folders(recipes):
     assert recipe_list
     assert len(recipe_list) == 2
     assert recipe_list[0]['name'] == RECIPE_NAME
+    assert recipe_list[1]['name'] == RECIPE_NAME_2
+    assert recipe_list[1]['folder_name'] == '/active/nested/'
 
 def test_reset_recipes(recipes):
     """Helper function to reset recipes object.
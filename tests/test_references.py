@@ -0,0 +1,103 @@
+"""Tests the normalized storage mode with shared reference collections.
+"""
+import os
+
+import pytest
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct.corpus import CorpusSpec, write_archive, write_library
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipe_index import RecipeIndex
+from beersmith_direct.recipes import Recipes
+from beersmith_direct.references import REF_KEY, ReferenceStore, content_id
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+REFERENCE_SPEC = CorpusSpec(
+    recipe_count=24, equipment_profiles=3, style_profiles=4, archive_actions=15
+)
+
+
+@pytest.fixture(name='corpus_path', scope='module')
+def fixture_corpus_path(tmp_path_factory):
+    """Pytest fixture to write and return the path of a synthetic corpus.
+    """
+    path = tmp_path_factory.mktemp('references')
+    write_library(REFERENCE_SPEC, path)
+    write_archive(REFERENCE_SPEC, path)
+
+    return str(path)
+
+def test_content_id_ignores_key_order():
+    """Tests that the content address does not depend on the key order.
+    """
+    assert content_id({'a': 1, 'b': 2}) == content_id({'b': 2, 'a': 1})
+    assert content_id({'a': 1}) != content_id({'a': 2})
+
+def test_dehydrate_rehydrate():
+    """Tests replacing the profiles by references and back.
+    """
+    recipe = BeersmithInterface().read_bsmx('bsm-one-recipe.bsmx', TESTS_PATH)[0]
+    mdb = MemoryDatabase()
+    store = ReferenceStore(mdb, 'test_refs')
+
+    doc = store.dehydrate(recipe)
+    assert REF_KEY in doc['equipment']
+    assert doc['equipment']['last_modified'] == recipe['equipment']['last_modified']
+    assert doc['style']['name'] == recipe['style']['name']
+    assert store.flush() == 5
+
+    # read the profiles back from the database, without the writer cache
+    assert ReferenceStore(mdb, 'test_refs').rehydrate([doc]) == [recipe]
+
+def test_normalized_sync(corpus_path):
+    """Tests that a normalized sync dedupes the profiles and reads back the recipes.
+    """
+    mdb = MemoryDatabase()
+    recipes = Recipes(collection_name='test_normalized', mdb=mdb, normalized=True)
+    recipes.stats.enabled = True
+    recipes.rebuild('Recipe.bsmx', corpus_path)
+    recipes.update_recipes_from_archive('Archive.bsmx', corpus_path)
+
+    assert mdb.test_normalized_equipment.count_documents({}) == REFERENCE_SPEC.equipment_profiles
+    assert mdb.test_normalized_style.count_documents({}) == REFERENCE_SPEC.style_profiles
+
+    plain = Recipes(collection_name='test_plain', mdb=MemoryDatabase())
+    plain.rebuild('Recipe.bsmx', corpus_path)
+    plain.update_recipes_from_archive('Archive.bsmx', corpus_path)
+
+    expected = list(plain.collection.find({}, sort=[('_id', 1)]))
+    assert list(recipes.find_recipes(sort=[('_id', 1)], batch_size=7)) == expected
+    assert recipes.get_recipe(expected[0]['_id']) == expected[0]
+
+def test_rehydrate_batched_reads(corpus_path):
+    """Tests that rehydration reads each collection once per batch.
+    """
+    mdb = MemoryDatabase()
+    writer = Recipes(collection_name='test_batched', mdb=mdb, normalized=True)
+    writer.update_recipes('Recipe.bsmx', corpus_path)
+
+    reader = Recipes(collection_name='test_batched', mdb=mdb, normalized=True)
+    recipe_list = list(reader.find_recipes(batch_size=100))
+
+    assert len(recipe_list) == REFERENCE_SPEC.recipe_count
+    assert mdb.test_batched_equipment.op_counts['find'] == 1
+
+@pytest.mark.parametrize('normalized', [False, True])
+def test_profile_queries(corpus_path, normalized):
+    """Tests the queries on the names of the profiles in both storage modes.
+    """
+    recipes = Recipes(collection_name='test_profile_queries', mdb=MemoryDatabase(),
+                      normalized=normalized)
+    recipes.rebuild('Recipe.bsmx', corpus_path)
+    recipe = next(recipes.find_recipes())
+    style_name = recipe['style']['name']
+    equipment_name = recipe['equipment']['name']
+
+    found = list(recipes.find_recipes({'style.name': style_name}))
+    assert recipe in found
+    assert {found_recipe['style']['name'] for found_recipe in found} == {style_name}
+
+    index = RecipeIndex.from_collection(recipes.collection)
+    assert recipe['_id'] in index.find(style=style_name, equipment=equipment_name)
+
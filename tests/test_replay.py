@@ -0,0 +1,141 @@
+"""Tests the partitioned parallel replay of the archive actions.
+"""
+import pytest
+
+from beersmith_direct.corpus import CorpusSpec, selection_xml, write_archive, write_library
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipes import Recipes
+from beersmith_direct.replay import LowWaterMark, plan_replay
+
+REPLAY_SPEC = CorpusSpec(recipe_count=10, archive_actions=60)
+
+
+@pytest.fixture(name='corpus_path', scope='module')
+def fixture_corpus_path(tmp_path_factory):
+    """Pytest fixture to write and return the path of a synthetic corpus.
+    """
+    path = tmp_path_factory.mktemp('replay')
+    write_library(REPLAY_SPEC, path)
+    write_archive(REPLAY_SPEC, path)
+
+    return str(path)
+
+def archive_action(num, name, action):
+    """Returns an archive action.
+    """
+    return {
+        'name': name,
+        'date': f'2021-01-01 08:{num:02d}:00',
+        'action': action,
+        'directory': '/',
+        'file': f'archive-{num:06d}.bsmx',
+    }
+
+def test_plan_partitions_and_barriers():
+    """Tests partitioning by recipe and stopping at the first barrier.
+    """
+    archive_list = [
+        archive_action(0, 'A', 'Edit'),
+        archive_action(1, 'B', 'Add Recipe'),
+        archive_action(2, 'A', 'Delete/Cut'),
+        archive_action(3, 'B', 'Edit'),
+        archive_action(4, 'A', 'Edit'),
+        archive_action(5, 'B', 'Edit'),
+    ]
+
+    plan = plan_replay(archive_list, existing=lambda names: {'A'} & set(names))
+    assert list(plan.partitions) == ['A', 'B']
+    assert [index for index, _, _ in plan.partitions['A']] == [0, 2]
+    assert plan.partitions['A'][1] == (2, 'Delete/Cut', None)
+    assert [index for index, _, _ in plan.partitions['B']] == [1, 3]
+
+    # the edit of the deleted recipe is a rename
+    assert plan.barrier[0] is archive_list[4]
+    assert plan.applied_count == 5
+
+    archive_list[2]['action'] = 'Paste'
+    plan = plan_replay(archive_list, existing=lambda names: {'A'} & set(names))
+    assert len(plan.actions) == 2
+    assert plan.barrier[0]['action'] == 'Paste'
+
+def test_low_water_mark():
+    """Tests the low-water mark of out of order completions.
+    """
+    watermark = LowWaterMark(5)
+    assert watermark.complete(1) == -1
+    assert watermark.complete(3) == -1
+    assert watermark.complete(0) == 1
+    assert watermark.complete(2) == 3
+    assert watermark.complete(4) == 4
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_replay_matches_serial_order(corpus_path, workers):
+    """Tests that the partitioned replay gives the result of the serial replay.
+    """
+    mdb = MemoryDatabase()
+    recipes = Recipes(
+        collection_name='test_replay', mdb=mdb, workers=workers,
+        batch_size=8, checkpoint_interval=10
+    )
+    recipes.stats.enabled = True
+    recipes.rebuild('Recipe.bsmx', corpus_path)
+    recipes.update_recipes_from_archive('Archive.bsmx', corpus_path)
+
+    # apply the archive serially, each action on the recipe it names
+    expected = {
+        recipe['_id']: recipe for recipe in recipes.bsm.read_bsmx('Recipe.bsmx', corpus_path)
+    }
+    archive_list = recipes.bsm.read_bsmx('Archive.bsmx', corpus_path)
+    for archive in archive_list:
+        if archive['action'] == 'Delete/Cut':
+            del expected[archive['name']]
+        else:
+            expected[archive['name']] = recipes.bsm.read_bsmx(archive['file'], corpus_path)[0]
+
+    assert {recipe['_id']: recipe for recipe in recipes.collection.find({})} == expected
+    assert recipes.stats.counters['archive_actions_applied'] == REPLAY_SPEC.archive_actions
+    assert recipes.stats.counters['recipes_parsed'] >= REPLAY_SPEC.recipe_count
+    assert not recipes.props.rebuild
+    assert recipes.props.last_id == archive_list[-1]['name']
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_rename_drops_later_actions(tmp_path, workers):
+    """Tests that no action after a rename is applied, whichever partition
+    completes first.
+    """
+    write_library(REPLAY_SPEC, tmp_path)
+    archive_list = write_archive(REPLAY_SPEC, tmp_path)
+
+    # rename an edit that comes before the last action of the first partition
+    first_name = archive_list[0]['name']
+    last_first = max(
+        num for num, archive in enumerate(archive_list) if archive['name'] == first_name
+    )
+    rename_index = next(
+        num for num, archive in enumerate(archive_list[:last_first])
+        if archive['name'] != first_name and archive['action'] == 'Edit'
+    )
+    with open(tmp_path / archive_list[rename_index]['file'], 'w', encoding='UTF-8') as bsmx_file:
+        bsmx_file.write(selection_xml(REPLAY_SPEC, 999))
+
+    recipes = Recipes(
+        collection_name='test_replay_rename', mdb=MemoryDatabase(), workers=workers,
+        batch_size=2, checkpoint_interval=3
+    )
+    recipes.rebuild('Recipe.bsmx', str(tmp_path))
+    recipes.update_recipes_from_archive('Archive.bsmx', str(tmp_path))
+
+    # apply the actions before the rename serially
+    expected = {
+        recipe['_id']: recipe for recipe in recipes.bsm.read_bsmx('Recipe.bsmx', str(tmp_path))
+    }
+    for archive in archive_list[:rename_index]:
+        if archive['action'] == 'Delete/Cut':
+            del expected[archive['name']]
+        else:
+            expected[archive['name']] = \
+                recipes.bsm.read_bsmx(archive['file'], str(tmp_path))[0]
+
+    assert {recipe['_id']: recipe for recipe in recipes.collection.find({})} == expected
+    assert recipes.props.rebuild
+    assert recipes.props.last_id == archive_list[rename_index - 1]['name']
@@ -0,0 +1,140 @@
+"""Tests the embedded SQLite storage backend.
+"""
+from datetime import datetime, timezone
+
+import pytest
+from pymongo import InsertOne, ReplaceOne
+
+from beersmith_direct.corpus import CorpusSpec, write_archive, write_library
+from beersmith_direct.index_manager import RECIPE_INDEXES
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipes import Recipes
+from beersmith_direct import sqlite
+from beersmith_direct.sqlite import SQLiteDatabase
+from beersmith_direct.storage import open_database
+
+SQLITE_SPEC = CorpusSpec(recipe_count=8, archive_actions=30)
+
+
+def sync_recipes(mdb, corpus_path):
+    """Rebuilds and replays the corpus into a database and returns the recipes.
+    """
+    recipes = Recipes(collection_name='test_sqlite', mdb=mdb, batch_size=5, history=True)
+    recipes.rebuild('Recipe.bsmx', corpus_path)
+    recipes.update_recipes_from_archive('Archive.bsmx', corpus_path)
+
+    return recipes
+
+def test_sync_matches_memory(tmp_path, monkeypatch):
+    """Tests that a sync into SQLite stores the same recipes as in memory.
+    """
+    monkeypatch.setenv('CONFIG_COLLECTION', 'config')
+    corpus_path = tmp_path / 'corpus'
+    corpus_path.mkdir()
+    write_library(SQLITE_SPEC, corpus_path)
+    write_archive(SQLITE_SPEC, corpus_path)
+
+    memory_recipes = sync_recipes(MemoryDatabase(), str(corpus_path))
+    expected = list(memory_recipes.find_recipes())
+    db_path = tmp_path / 'recipes.db'
+    recipes = sync_recipes(SQLiteDatabase(db_path), str(corpus_path))
+    assert list(recipes.find_recipes()) == expected
+    assert recipes.mdb.connection.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    recipes.mdb.close()
+
+    # the recipes, the indexes and the configuration are read from the file
+    mdb = SQLiteDatabase(db_path)
+    recipes = Recipes(collection_name='test_sqlite', mdb=mdb)
+    assert list(recipes.find_recipes()) == expected
+    assert set(recipes.collection.index_information()) == \
+        {'_id_', *(name for name, _ in RECIPE_INDEXES)}
+    assert recipes.props.last_updated == memory_recipes.props.last_updated
+
+def test_indexed_queries():
+    """Tests the queries on the extracted index columns.
+    """
+    collection = SQLiteDatabase().read_collection('test_queries')
+    collection.insert_many([
+        {'_id': 1, 'ingredients': [{'name': 'Cascade'}, {'name': 'Pale Malt'}], 'og': 1.05},
+        {'_id': 2, 'ingredients': [{'name': 'Saaz'}], 'og': 1.04},
+        {'_id': 'three', 'ingredients': [], 'og': '1.06'},
+    ])
+    collection.create_index([('ingredients.name', 1)], name='ingredients_name')
+
+    assert [doc['_id'] for doc in collection.find({'ingredients.name': 'Cascade'})] == [1]
+    assert collection.count_documents({'ingredients.name': {'$in': ['Saaz', 'Cascade']}}) == 2
+    assert collection.count_documents({'ingredients.name': {'$ne': 'Saaz'}}) == 2
+    assert collection.aggregate([{'$indexStats': {}}])[1]['accesses']['ops'] == 2
+
+    # the conditions of other fields and types are checked on the documents
+    assert [doc['_id'] for doc in collection.find({'og': {'$gt': 1.045}})] == [1]
+    assert [doc['_id'] for doc in collection.find({'ingredients': {'name': 'Saaz'}})] == [2]
+    assert [doc['_id'] for doc in collection.find({'_id': {'$gte': 2}})] == [2]
+    assert collection.find({}, sort=[('_id', 1)], limit=2)[1]['_id'] == 2
+
+    timestamp = datetime(2021, 3, 1, 12, tzinfo=timezone.utc)
+    collection.update_one({'_id': 2}, {'$set': {'last_modified': timestamp}})
+    assert collection.find_one({'_id': 2})['last_modified'] == timestamp
+
+def test_bulk_write_transaction():
+    """Tests that a failed bulk write applies none of its requests.
+    """
+    collection = SQLiteDatabase().read_collection('test_bulk')
+    collection.insert_one({'_id': 'a', 'n': 1})
+
+    with pytest.raises(KeyError):
+        collection.bulk_write([
+            ReplaceOne({'_id': 'b'}, {'n': 2}, upsert=True),
+            InsertOne({'_id': 'a', 'n': 3}),
+        ])
+    assert collection.find({}) == [{'_id': 'a', 'n': 1}]
+
+    result = collection.bulk_write([ReplaceOne({'_id': 'b'}, {'n': 2}, upsert=True)])
+    assert result.upserted_ids == {0: 'b'}
+
+def test_open_database(tmp_path, monkeypatch):
+    """Tests the database URLs.
+    """
+    db_path = tmp_path / 'library.db'
+    mdb = open_database(f'sqlite:///{db_path}')
+    assert isinstance(mdb, SQLiteDatabase)
+    assert open_database(str(db_path)) is mdb
+    assert isinstance(open_database('memory:'), MemoryDatabase)
+
+    monkeypatch.setenv('BEERSMITH_DATABASE', 'mongodb')
+    assert open_database() is None
+    monkeypatch.setenv('BEERSMITH_DATABASE', 'mongodb://localhost:27017')
+    with pytest.raises(ValueError):
+        open_database()
+    with pytest.raises(ValueError):
+        open_database('postgres://localhost/recipes')
+
+def test_config_collection_not_set():
+    """Tests the error of a configuration collection without a name.
+    """
+    with pytest.raises(ValueError, match='CONFIG_COLLECTION'):
+        SQLiteDatabase().read_collection(None)
+
+def test_unindexed_queries(monkeypatch):
+    """Tests that the conditions of the unindexed top-level fields are run by
+    SQLite.
+    """
+    collection = SQLiteDatabase().read_collection('test_unindexed')
+    collection.insert_many([
+        {'_id': 1, 'style': 'IPA', 'tags': ['hoppy', 'pale'], 'og': 1.06, 'keg': True},
+        {'_id': 2, 'style': 'Stout', 'tags': 'dark', 'og': 1.07, 'keg': False},
+        {'_id': 3, 'style': 'IPA', 'tags': [], 'og': 1.05},
+    ])
+
+    decoded = []
+    decode = sqlite.decode
+    monkeypatch.setattr(sqlite, 'decode', lambda text: decoded.append(text) or decode(text))
+
+    assert [doc['_id'] for doc in collection.find({'style': 'IPA', 'og': {'$gte': 1.055}})] == [1]
+    assert len(decoded) == 1
+    assert [doc['_id'] for doc in collection.find({'tags': 'pale'})] == [1]
+    assert [doc['_id'] for doc in collection.find({'tags': {'$in': ['dark', 'hoppy']}})] == [1, 2]
+    assert [doc['_id'] for doc in collection.find({'keg': True})] == [1]
+    assert collection.count_documents({'style': {'$in': ['Stout', 'Porter']}}) == 1
+    assert not collection.index_ops
+
@@ -0,0 +1,121 @@
+"""Tests sync instrumentation.
+"""
+import os
+
+import pytest
+
+from beersmith_direct import BeersmithInterface
+from beersmith_direct.memory import MemoryDatabase
+from beersmith_direct.recipes import Recipes
+from beersmith_direct.stats import SyncStats
+
+TESTS_PATH = os.path.join(os.getcwd(), 'tests')
+
+
+def test_stage_timer():
+    """Tests timing stages and counting records.
+    """
+    stats = SyncStats(enabled=True)
+    with stats.stage('read_file'):
+        pass
+    with stats.stage('read_file'):
+        pass
+    stats.add('bytes_read', 100)
+
+    assert stats.timers['read_file'][0] == 2
+    assert stats.seconds('read_file') >= 0
+    assert stats.counters == {'bytes_read': 100}
+
+def test_stage_error():
+    """Tests counting the errors of a stage.
+    """
+    stats = SyncStats(enabled=True)
+    with pytest.raises(ValueError):
+        with stats.stage('notes'):
+            raise ValueError('bad notes')
+
+    assert stats.errors == {'notes': 1}
+
+def test_disabled():
+    """Tests that disabled statistics record nothing.
+    """
+    stats = SyncStats(enabled=False)
+    with stats.stage('read_file'):
+        stats.add('bytes_read', 100)
+    stats.error('read_file')
+
+    assert stats.as_dict() == {'stages': {}, 'counters': {}, 'errors': {}}
+
+def test_disabled_environment(monkeypatch):
+    """Tests disabling statistics from the environment.
+    """
+    monkeypatch.setenv('BEERSMITH_STATS', 'off')
+
+    assert not SyncStats().enabled
+
+def test_hooks():
+    """Tests that hooks receive the recorded values.
+    """
+    events = []
+    stats = SyncStats(enabled=True, hooks=[lambda *args: events.append(args)])
+    with stats.stage('xmltodict'):
+        pass
+    stats.add('recipes_parsed', 2)
+    stats.error('mongodb_write')
+
+    assert [event[:2] for event in events] == [
+        ('stage', 'xmltodict'), ('count', 'recipes_parsed'), ('error', 'mongodb_write')
+    ]
+    assert stats.new_run().hooks == stats.hooks
+
+def test_prometheus():
+    """Tests the Prometheus text format.
+    """
+    stats = SyncStats(enabled=True)
+    stats.record_stage('read_file', 0.5)
+    stats.add('recipes_parsed', 3)
+    stats.error('notes')
+
+    text = stats.to_prometheus(labels={'config': 'recipes'})
+
+    assert '# TYPE beersmith_direct_stage_seconds_total counter' in text
+    assert 'beersmith_direct_stage_seconds_total{stage="read_file",config="recipes"} 0.500000' \
+        in text
+    assert 'beersmith_direct_records_total{name="recipes_parsed",config="recipes"} 3' in text
+    assert 'beersmith_direct_errors_total{stage="notes",config="recipes"} 1' in text
+
+def test_merge():
+    """Tests merging statistics.
+    """
+    stats = SyncStats(enabled=True)
+    stats.add('recipes_parsed', 1)
+    other = SyncStats(enabled=True)
+    other.add('recipes_parsed', 2)
+    other.record_stage('read_file', 1.0)
+    stats.merge(other)
+
+    assert stats.counters['recipes_parsed'] == 3
+    assert stats.seconds('read_file') == 1.0
+
+def test_read_bsmx_stages():
+    """Tests the stages recorded while reading a file.
+    """
+    bsm = BeersmithInterface(stats=SyncStats(enabled=True))
+    bsm.read_bsmx('bsm-two-recipes.bsmx', TESTS_PATH)
+
+    assert {'read_file', 'replace_tags', 'beautifulsoup', 'xmltodict',
+            'normalize', 'correct_type', 'notes'} <= set(bsm.stats.timers)
+    assert bsm.stats.counters['recipes_parsed'] == 2
+    assert bsm.stats.counters['bytes_read'] > 0
+
+def test_rebuild_stats():
+    """Tests the statistics returned by rebuild.
+    """
+    recipes = Recipes(collection_name='test_stats', mdb=MemoryDatabase())
+    recipes.stats.enabled = True
+    stats = recipes.rebuild('bsm-two-recipes.bsmx', TESTS_PATH)
+
+    assert stats is recipes.stats is recipes.bsm.stats
+    assert stats.counters['recipes_upserted'] == 2
+    assert stats.timers['mongodb_write'][0] == stats.counters['bulk_writes'] == 1
+    assert 'rebuild' in stats.timers